@@ -1,8 +1,19 @@
 from django.contrib import admin
-from .models import Entity, Type, Test, Grade, SubGroup, SubGroupAdmin
+from api.dataset import bump_dataset_version
+from .models import Entity, Type, Test, Grade, SubGroup, Score, SubGroupAdmin
 
-admin.site.register(Entity)
+
+class EntityAdmin(admin.ModelAdmin):
+    # Queryset deletes of entities send no version bump, see api.signals.
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        bump_dataset_version()
+
+
+admin.site.register(Entity, EntityAdmin)
 admin.site.register(Type)
 admin.site.register(Test)
 admin.site.register(Grade)
 admin.site.register(SubGroup, SubGroupAdmin)
+admin.site.register(Score)
@@ -0,0 +1,453 @@
+"""ASGI application answering the read endpoints without blocking on the database.
+
+Django 2.2 has neither an ASGI handler nor an async ORM. `ReadApplication`
+answers GET and HEAD list and retrieve requests to the entity, type, test,
+grade and subgroup endpoints itself. The viewset builds the queryset as
+usual (filters, search, ?fields=, limit and offset), the ORM compiles it to
+SQL without touching the database and the SQL runs on a per-process asyncpg
+pool, so one process keeps serving other clients while queries are in
+flight. Only JSON is answered this way. Other formats, keyset pagination,
+errors and every other request are handed to the WSGI application on a
+thread pool.
+
+The request and response hooks of the `MIDDLEWARE` entries built on
+`MiddlewareMixin` (security, sessions, authentication, CSRF, clickjacking
+and compression) run around the read as they would around the view. A hook
+answering the request itself, or raising, such as `DisallowedHost` for a bad
+Host header, hands the request to the WSGI application too.
+
+Needs the optional asyncpg package; without it every request goes to the
+WSGI application.
+"""
+import asyncio
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import close_old_connections, connections
+from django.http import Http404, HttpResponse
+from django.urls import Resolver404, resolve
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.module_loading import import_string
+from django.views.decorators.http import condition
+from rest_framework.renderers import JSONRenderer
+from api import metrics, replicas
+from api.cache import CachedResponseMixin
+from api.dataset import dataset_etag, dataset_last_modified, get_cache
+from api.middleware import ReplicaRoutingMiddleware
+from api.mixins import ConditionalGetMixin
+from api.timing import RequestTimings, sampled
+from api.views import EntityViewSet, GradeViewSet, SubGroupViewSet, TestViewSet, TypeViewSet
+
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+ASYNC_VIEWSETS = (EntityViewSet, TypeViewSet, TestViewSet, GradeViewSet, SubGroupViewSet)
+
+re_placeholder = re.compile(r'%([s%])')
+
+
+def compile_queryset(queryset, using):
+    """Return the (sql, params) of `queryset` with asyncpg's $n placeholders."""
+    sql, params = queryset.query.get_compiler(using).as_sql()
+    numbers = iter(range(1, len(params) + 1))
+    sql = re_placeholder.sub(
+        lambda match: '${}'.format(next(numbers)) if match.group(1) == 's' else '%', sql
+    )
+    return sql, list(params)
+
+
+def build_environ(scope, body):
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': 'HTTP/{}'.format(scope.get('http_version', '1.1')),
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name not in ('CONTENT_LENGTH', 'CONTENT_TYPE'):
+            name = 'HTTP_' + name
+        if name in environ:
+            value = environ[name] + ',' + value
+        environ[name] = value
+    return environ
+
+
+async def read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+def encode_headers(response):
+    headers = [
+        (name.encode('latin-1'), value.encode('latin-1')) for name, value in response.items()
+    ]
+    for cookie in response.cookies.values():
+        headers.append((b'Set-Cookie', cookie.output(header='').strip().encode('latin-1')))
+    return headers
+
+
+class ReadPlan:
+    """A read request prepared by `ReadApplication.plan()`.
+
+    Either `response` is complete (304 or a cached response) or the rows
+    still have to be fetched with `page_query` (and `count_query` for a
+    paginated list whose count is not cached or estimated) and passed to
+    `finish()`.
+    """
+
+    def __init__(self, request, view, response):
+        self.request = request
+        self.view = view
+        self.response = response
+        self.complete = False
+        self.alias = replicas.PRIMARY
+        self.serializer = None
+        self.paginator = None
+        self.count_query = None
+        self.page_query = None
+        self.cache_key = None
+        self.timings = RequestTimings() if sampled() else None
+
+    def finish(self, rows):
+        if self.view.action == 'retrieve':
+            return self.serializer.to_representation(rows[0])
+        if self.paginator is None:
+            return self.serializer.represent(rows)
+        data = self.serializer.represent(self.paginator.trim_page(rows))
+        return self.paginator.get_paginated_response(data).data
+
+    def render(self, data):
+        request = self.view.request
+        self.response.content = request.accepted_renderer.render(
+            data, request.accepted_media_type, {'request': request, 'view': self.view}
+        )
+
+
+class ReadApplication:
+    """ASGI application serving reads with asyncpg and the rest through `wsgi_application`."""
+
+    def __init__(self, wsgi_application, threads=None):
+        self.wsgi_application = wsgi_application
+        self.threads = threads or settings.ASGI_THREADS
+        self.executor = ThreadPoolExecutor(self.threads)
+        self.middleware = self.load_middleware()
+        self.replica_routing = ReplicaRoutingMiddleware(None)
+        self.pools = {}
+
+    def load_middleware(self):
+        """Return the `MIDDLEWARE` instances whose hooks can run apart from the view.
+
+        Middleware written as a plain callable wraps the whole request and
+        cannot be split around the read, the metrics, timing and replica
+        routing middleware are applied by `ReadApplication` itself instead.
+        """
+        middleware = []
+        for path in settings.MIDDLEWARE:
+            factory = import_string(path)
+            if not issubclass(factory, MiddlewareMixin):
+                continue
+            try:
+                middleware.append(factory())
+            except MiddlewareNotUsed:
+                continue
+        return middleware
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http':
+            raise ValueError('Unsupported ASGI scope type {!r}'.format(scope['type']))
+        started = time.perf_counter()
+        environ = build_environ(scope, await read_body(receive))
+        loop = asyncio.get_event_loop()
+        plan = None
+        if asyncpg is not None and scope['method'] in ('GET', 'HEAD'):
+            plan = await loop.run_in_executor(self.executor, self.plan, environ)
+        if plan is None:
+            return await loop.run_in_executor(self.executor, self.call_wsgi, environ, send, loop)
+        try:
+            if not plan.complete:
+                try:
+                    data = await self.read(plan)
+                except Http404:
+                    # Left to the WSGI application to render the error.
+                    return await loop.run_in_executor(
+                        self.executor, self.call_wsgi, environ, send, loop
+                    )
+                plan.render(data)
+                if plan.cache_key is not None:
+                    await loop.run_in_executor(
+                        self.executor, get_cache().set, plan.cache_key, data,
+                        plan.view.cache_timeout or settings.API_CACHE_TIMEOUT,
+                    )
+        finally:
+            if plan.alias != replicas.PRIMARY:
+                replicas.selector.release(plan.alias)
+        response = await loop.run_in_executor(self.executor, self.process_response, plan)
+        if not response.has_header('Content-Length'):
+            response['Content-Length'] = str(len(response.content))
+        if plan.timings is not None:
+            response['Server-Timing'] = plan.timings.server_timing(plan.timings.metrics())
+        metrics.observe_request(
+            plan.request, response, time.perf_counter() - started,
+            queries=plan.timings.queries if plan.timings is not None else None,
+        )
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': encode_headers(response),
+        })
+        await send({
+            'type': 'http.response.body',
+            'body': b'' if scope['method'] == 'HEAD' else response.content,
+        })
+
+    def plan(self, environ):
+        """Prepare the read in a worker thread, or return None to use WSGI."""
+        try:
+            return self.build_plan(environ)
+        except Exception:
+            # The WSGI application turns the error into its response, for
+            # instance a 400 for a disallowed Host or a 403 for a denied user.
+            return None
+        finally:
+            close_old_connections()
+
+    def process_response(self, plan):
+        """Run the response hooks of the middleware in a worker thread."""
+        try:
+            response = plan.response
+            for middleware in reversed(self.middleware):
+                if hasattr(middleware, 'process_response'):
+                    response = middleware.process_response(plan.request, response)
+            return response
+        finally:
+            close_old_connections()
+
+    def build_plan(self, environ):
+        try:
+            match = resolve(environ['PATH_INFO'])
+        except Resolver404:
+            return None
+        viewset = getattr(match.func, 'cls', None)
+        actions = getattr(match.func, 'actions', None) or {}
+        if viewset not in ASYNC_VIEWSETS or actions.get('get') not in ('list', 'retrieve'):
+            return None
+
+        request = WSGIRequest(environ)
+        request.resolver_match = match
+        for middleware in self.middleware:
+            if (hasattr(middleware, 'process_request')
+                    and middleware.process_request(request) is not None):
+                return None
+        for middleware in self.middleware:
+            if (hasattr(middleware, 'process_view') and middleware.process_view(
+                    request, match.func, match.args, match.kwargs) is not None):
+                return None
+        view = viewset(**match.func.initkwargs)
+        view.action_map = actions
+        view.action = actions['get']
+        view.args, view.kwargs = match.args, match.kwargs
+        view.request = drf_request = view.initialize_request(request, *match.args, **match.kwargs)
+        view.headers = view.default_response_headers
+        view.format_kwarg = view.get_format_suffix(**match.kwargs)
+        view.initial(drf_request, *match.args, **match.kwargs)
+        if not isinstance(drf_request.accepted_renderer, JSONRenderer):
+            return None
+        if view.action == 'retrieve' and view.object_permissions_apply():
+            return None
+        paginator = view.paginator if view.action == 'list' else None
+        if paginator is not None and paginator.use_keyset(drf_request):
+            return None
+
+        def respond(request):
+            return HttpResponse(content_type=drf_request.accepted_renderer.media_type)
+
+        if issubclass(viewset, ConditionalGetMixin):
+            respond = condition(etag_func=dataset_etag, last_modified_func=dataset_last_modified)(
+                respond
+            )
+        plan = ReadPlan(request, view, respond(request))
+        for name, value in view.headers.items():
+            plan.response[name] = value
+        patch_vary_headers(plan.response, ('Accept',))
+        if plan.response.status_code != 200:
+            # 304 Not Modified or 412 Precondition Failed.
+            plan.complete = True
+            return plan
+
+        if issubclass(viewset, CachedResponseMixin):
+            plan.cache_key = view.get_response_cache_key(drf_request)
+            data = get_cache().get(plan.cache_key)
+            metrics.count_cache_lookup(view.basename, data is not None)
+            if data is not None:
+                plan.render(data)
+                plan.cache_key = None
+                plan.complete = True
+                return plan
+
+        if settings.DATABASE_REPLICAS and not self.replica_routing.pinned(request):
+            plan.alias = replicas.selector.acquire(
+                settings.DATABASE_REPLICAS, settings.DB_REPLICA_SELECTION
+            )
+        try:
+            self.plan_queries(plan, paginator)
+        except BaseException:
+            if plan.alias != replicas.PRIMARY:
+                replicas.selector.release(plan.alias)
+            raise
+        return plan
+
+    def plan_queries(self, plan, paginator):
+        view, drf_request = plan.view, plan.view.request
+        plan.serializer = view.get_values_serializer()
+        queryset = plan.serializer.values(view.filter_queryset(view.get_queryset()))
+        if view.action == 'retrieve':
+            lookup_url_kwarg = view.lookup_url_kwarg or view.lookup_field
+            queryset = queryset.filter(**{view.lookup_field: view.kwargs[lookup_url_kwarg]})[:1]
+        elif paginator is not None:
+            paginator.limit = paginator.get_limit(drf_request)
+            if paginator.limit is not None:
+                paginator.offset = paginator.get_offset(drf_request)
+                paginator.request = drf_request
+                plan.paginator = paginator
+                paginator.count = paginator.lookup_count(queryset.using(plan.alias))
+                if paginator.count is None and paginator.count_mode == 'exact':
+                    count_sql, params = compile_queryset(queryset.order_by(), plan.alias)
+                    plan.count_query = (
+                        'SELECT COUNT(*) FROM ({}) subquery'.format(count_sql), params
+                    )
+                queryset = queryset[paginator.offset:paginator.page_stop()]
+        plan.page_query = compile_queryset(queryset, plan.alias)
+
+    async def read(self, plan):
+        pool = await self.get_pool(plan.alias)
+        async with pool.acquire() as connection:
+            if plan.count_query is not None:
+                count = await self.fetch(plan, connection.fetchval, plan.count_query)
+                plan.paginator.count = plan.paginator.store_count(count)
+            if plan.paginator is not None and plan.paginator.page_is_empty():
+                rows = []
+            else:
+                rows = await self.fetch(plan, connection.fetch, plan.page_query)
+        if plan.view.action == 'retrieve' and not rows:
+            raise Http404
+        return plan.finish(rows)
+
+    async def fetch(self, plan, method, query):
+        started = time.perf_counter()
+        try:
+            sql, params = query
+            return await method(sql, *params)
+        finally:
+            if plan.timings is not None:
+                plan.timings.queries += 1
+                plan.timings.db += time.perf_counter() - started
+
+    async def get_pool(self, alias):
+        pool = self.pools.get(alias)
+        if pool is None or (pool.done() and pool.exception() is not None):
+            database = connections.databases[alias]
+            pool = self.pools[alias] = asyncio.ensure_future(asyncpg.create_pool(
+                host=database['HOST'] or None,
+                port=int(database['PORT']) if database['PORT'] else None,
+                user=database['USER'] or None,
+                password=database['PASSWORD'] or None,
+                database=database['NAME'],
+                min_size=1,
+                max_size=database.get('POOL', {}).get('MAX_SIZE', 10),
+                # PgBouncer in transaction pooling mode cannot keep prepared
+                # statements between transactions.
+                statement_cache_size=0 if database.get('DISABLE_SERVER_SIDE_CURSORS') else 100,
+            ))
+        return await pool
+
+    def call_wsgi(self, environ, send, loop):
+        """Run the WSGI application in this worker thread, streaming its response.
+
+        The whole response is iterated in the thread that started it, since
+        Django connections and server side cursors belong to one thread.
+        """
+        def call(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = [
+                (name.encode('latin-1'), value.encode('latin-1')) for name, value in headers
+            ]
+
+        response = self.wsgi_application(environ, start_response)
+        try:
+            call({
+                'type': 'http.response.start',
+                'status': started['status'],
+                'headers': started['headers'],
+            })
+            if environ['REQUEST_METHOD'] != 'HEAD':
+                for chunk in response:
+                    if chunk:
+                        call({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            call({'type': 'http.response.body', 'body': b''})
+        finally:
+            close = getattr(response, 'close', None)
+            if close is not None:
+                close()
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def close(self):
+        """Close the asyncpg pools and the Django connections of the worker threads."""
+        pools, self.pools = self.pools, {}
+        for pool in pools.values():
+            if pool.done() and pool.exception() is None:
+                await pool.result().close()
+        # Every worker thread takes exactly one task, since none returns
+        # before all of them have started.
+        barrier = threading.Barrier(self.threads)
+
+        def close_connections():
+            connections.close_all()
+            barrier.wait()
+
+        loop = asyncio.get_event_loop()
+        await asyncio.gather(*(
+            loop.run_in_executor(self.executor, close_connections) for _ in range(self.threads)
+        ))
@@ -0,0 +1,63 @@
+"""PostgreSQL backend that borrows its connections from a per-process pool.
+
+Select it with ENGINE 'api.backends.postgresql_pool' (DB_ENGINE=pool). Django
+closes the connection at the end of every request when CONN_MAX_AGE is 0;
+here closing hands it back to the pool instead of ending the session, so
+the next request, from any thread, skips the connection and authentication
+handshake. The optional POOL key of the database settings holds:
+
+    MIN_SIZE        connections opened with the pool (default 1)
+    MAX_SIZE        open connections per worker process (default 10)
+    TIMEOUT         seconds to wait for a free connection (default 10)
+    CHECK_INTERVAL  idle seconds after which a connection is pinged before
+                    it is handed out (default 30)
+"""
+import threading
+from django.db.backends.postgresql import base
+from .creation import DatabaseCreation
+from .pool import ConnectionPool
+
+POOL_DEFAULTS = {'MIN_SIZE': 1, 'MAX_SIZE': 10, 'TIMEOUT': 10, 'CHECK_INTERVAL': 30}
+
+# {(alias, database name, connection parameters): ConnectionPool}
+pools = {}
+pools_lock = threading.Lock()
+
+
+def get_pool(wrapper, conn_params):
+    key = (wrapper.alias, conn_params.get('database'), repr(sorted(conn_params.items())))
+    with pools_lock:
+        pool = pools.get(key)
+        if pool is None:
+            options = dict(POOL_DEFAULTS, **wrapper.settings_dict.get('POOL', {}))
+            pool = pools[key] = ConnectionPool(
+                lambda: base.DatabaseWrapper.get_new_connection(wrapper, conn_params),
+                alias=wrapper.alias,
+                min_size=options['MIN_SIZE'],
+                max_size=options['MAX_SIZE'],
+                timeout=options['TIMEOUT'],
+                check_interval=options['CHECK_INTERVAL'],
+            )
+        return pool
+
+
+def close_pools(database=None):
+    """Close the pools of every database, or only those connected to `database`."""
+    with pools_lock:
+        closing = [key for key in pools if database is None or key[1] == database]
+        closing = [pools.pop(key) for key in closing]
+    for pool in closing:
+        pool.closeall()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def get_new_connection(self, conn_params):
+        self.pool = get_pool(self, conn_params)
+        return self.pool.getconn()
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.putconn(self.connection)
@@ -0,0 +1,128 @@
+import threading
+import time
+from collections import deque
+import psycopg2
+from psycopg2 import extensions
+from api import metrics
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    pass
+
+
+class ConnectionPool:
+    """A bounded, thread safe pool of psycopg2 connections for one process.
+
+    At most `max_size` connections are open at once; `getconn()` waits up to
+    `timeout` seconds for one to be returned before raising PoolTimeout.
+    Connections idle for longer than `check_interval` seconds are pinged with
+    SELECT 1 before they are handed out and replaced if the ping fails.
+    """
+
+    def __init__(self, connect, alias='default', min_size=1, max_size=10, timeout=10,
+                 check_interval=30):
+        self.connect = connect
+        self.alias = alias
+        self.max_size = max_size
+        self.timeout = timeout
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.available = threading.BoundedSemaphore(max_size)
+        # (connection, time it was returned), the most recently used last.
+        self.idle = deque()
+        self.size = 0
+        self.closed = False
+        for _ in range(min(min_size, max_size)):
+            self.idle.append((self.connect(), time.monotonic()))
+            self.size += 1
+        self.report()
+
+    def getconn(self):
+        if not self.available.acquire(timeout=self.timeout):
+            raise PoolTimeout(
+                'No free connection in the {!r} pool of {} after {}s'.format(
+                    self.alias, self.max_size, self.timeout
+                )
+            )
+        try:
+            while True:
+                with self.lock:
+                    connection, returned = self.idle.pop() if self.idle else (None, None)
+                    if connection is None:
+                        self.size += 1
+                if connection is None:
+                    try:
+                        connection = self.connect()
+                    except BaseException:
+                        with self.lock:
+                            self.size -= 1
+                        raise
+                    break
+                if self.is_healthy(connection, returned):
+                    break
+                self.discard(connection)
+        except BaseException:
+            self.available.release()
+            raise
+        self.report()
+        return connection
+
+    def putconn(self, connection):
+        reusable = not connection.closed and not self.closed
+        if reusable:
+            try:
+                if connection.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    connection.rollback()
+                # Drop temp tables, SET parameters, advisory locks and other session
+                # state so the next borrower starts clean. Django restores its own
+                # settings (autocommit, time zone) when it borrows the connection.
+                connection.autocommit = True
+                with connection.cursor() as cursor:
+                    cursor.execute('DISCARD ALL')
+            except psycopg2.Error:
+                reusable = False
+        if not reusable:
+            self.discard(connection)
+        else:
+            with self.lock:
+                self.idle.append((connection, time.monotonic()))
+        self.available.release()
+        self.report()
+
+    def is_healthy(self, connection, returned):
+        if connection.closed:
+            return False
+        if time.monotonic() - returned < self.check_interval:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if not connection.autocommit:
+                connection.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    def discard(self, connection):
+        with self.lock:
+            self.size -= 1
+        try:
+            connection.close()
+        except psycopg2.Error:
+            pass
+
+    def closeall(self):
+        """Close the idle connections; borrowed ones are closed when returned."""
+        with self.lock:
+            self.closed = True
+            idle, self.idle = self.idle, deque()
+        for connection, returned in idle:
+            self.discard(connection)
+        self.report()
+
+    def stats(self):
+        with self.lock:
+            return {'in_use': self.size - len(self.idle), 'idle': len(self.idle)}
+
+    def report(self):
+        metrics.set_pool_connections(self.alias, **self.stats())
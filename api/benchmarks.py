@@ -0,0 +1,251 @@
+"""Synthetic data helpers shared by the bench_* management commands."""
+import itertools
+import math
+import queue
+import resource
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from django.core.servers.basehttp import (
+    ThreadedWSGIServer, WSGIRequestHandler, WSGIServer, get_internal_wsgi_application,
+)
+from django.db import connection, connections, transaction
+from api.models import Entity, Grade, SubGroup, Test, Type
+
+TYPES = ((4, 'State'), (5, 'County'), (6, 'District'), (7, 'School'))
+TESTS = ((1, 'SB - English Language Arts/Literacy'), (2, 'SB - Mathematics'))
+GRADES = (
+    ('03', '3rd Grade'), ('04', '4th Grade'), ('05', '5th Grade'),
+    ('06', '6th Grade'), ('07', '7th Grade'), ('08', '8th Grade'),
+    ('11', '11th Grade'), ('13', 'All Grades'),
+)
+SUBGROUPS = (
+    (1, 'All Students', 'All Students'),
+    (3, 'Male', 'Gender'),
+    (4, 'Female', 'Gender'),
+    (31, 'Economically disadvantaged', 'Economic Status'),
+    (74, 'Black or African American', 'Ethnicity'),
+    (78, 'Hispanic or Latino', 'Ethnicity'),
+    (80, 'White', 'Ethnicity'),
+)
+SCORE_HEADER = (
+    'County Code', 'District Code', 'School Code', 'Filler', 'Test Year',
+    'Subgroup ID', 'Test Type', 'Total Tested At Entity Level',
+    'Total Tested with Scores', 'Grade', 'Test Id', 'CAASPP Reported Enrollment',
+    'Students Tested', 'Mean Scale Score', 'Percentage Standard Exceeded',
+    'Percentage Standard Met', 'Percentage Standard Met and Above',
+    'Percentage Standard Nearly Met', 'Percentage Standard Not Met',
+    'Students with Scores',
+)
+
+
+@contextmanager
+def rolled_back():
+    """Run the block inside a transaction that is always rolled back."""
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+@contextmanager
+def scratch_database():
+    """Run the block against a freshly migrated database that is dropped afterwards.
+
+    Unlike `rolled_back()` the data is committed, so other threads and
+    connections such as a local WSGI server can see it.
+    """
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.close()
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FixedThreadsWSGIServer(WSGIServer):
+    """Handle requests on a fixed set of threads, like gunicorn's gthread worker.
+
+    Unlike ThreadedWSGIServer, which starts a thread per request, the threads
+    and their database connections outlive a request, so CONN_MAX_AGE has
+    the same effect as in a deployment.
+    """
+    request_queue_size = 128
+
+    def __init__(self, *args, threads=4, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.requests = queue.Queue()
+        self.workers = [threading.Thread(target=self.work, daemon=True) for _ in range(threads)]
+        for worker in self.workers:
+            worker.start()
+
+    def process_request(self, request, client_address):
+        self.requests.put((request, client_address))
+
+    def work(self):
+        try:
+            while True:
+                item = self.requests.get()
+                if item is None:
+                    return
+                request, client_address = item
+                try:
+                    self.finish_request(request, client_address)
+                except Exception:
+                    self.handle_error(request, client_address)
+                finally:
+                    self.shutdown_request(request)
+        finally:
+            connections.close_all()
+
+    def server_close(self):
+        super().server_close()
+        for _ in self.workers:
+            self.requests.put(None)
+        for worker in self.workers:
+            worker.join()
+
+
+@contextmanager
+def wsgi_server(threads=None):
+    """Serve the project's WSGI application on a free local port.
+
+    Yields the base URL of the server, which handles each request in its
+    own thread, or on `threads` long lived threads.
+    """
+    if threads:
+        server = FixedThreadsWSGIServer(('127.0.0.1', 0), QuietRequestHandler, threads=threads)
+    else:
+        server = ThreadedWSGIServer(('127.0.0.1', 0), QuietRequestHandler)
+    server.set_app(get_internal_wsgi_application())
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield 'http://127.0.0.1:{}'.format(server.server_address[1])
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+@contextmanager
+def asgi_server(application):
+    """Serve an ASGI application with uvicorn on a free local port.
+
+    Needs the optional uvicorn package. Yields the base URL of the server.
+    """
+    import uvicorn
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    server = uvicorn.Server(uvicorn.Config(
+        application, lifespan='on', log_level='warning', access_log=False
+    ))
+    thread = threading.Thread(target=server.run, kwargs={'sockets': [sock]}, daemon=True)
+    thread.start()
+    while not server.started and thread.is_alive():
+        time.sleep(0.01)
+    try:
+        yield 'http://127.0.0.1:{}'.format(sock.getsockname()[1])
+    finally:
+        server.should_exit = True
+        thread.join()
+        sock.close()
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of a non-empty list of numbers."""
+    ordered = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def create_dimensions():
+    for type_id, description in TYPES:
+        Type.objects.get_or_create(type_id=type_id, defaults={'description': description})
+    for test_id, name in TESTS:
+        Test.objects.get_or_create(test_id=test_id, defaults={'name': name})
+    for num, description in GRADES:
+        Grade.objects.get_or_create(num=num, defaults={'description': description})
+    for subgroup_id, description, category in SUBGROUPS:
+        SubGroup.objects.get_or_create(
+            subgroup_id=subgroup_id,
+            defaults={'description': description, 'category': category},
+        )
+
+
+def synthetic_entities(years, counties=10, districts=10, schools=10):
+    """Yield unsaved state, county, district and school entities per year."""
+    for year in years:
+        yield Entity(
+            county_code='00', district_code='00000', school_code='0000000',
+            test_year=year, entity_type_id=4, county_name='State of California',
+        )
+        for c in range(1, counties + 1):
+            county_code = '{:02d}'.format(c)
+            county_name = 'County {}'.format(c)
+            yield Entity(
+                county_code=county_code, district_code='00000',
+                school_code='0000000', test_year=year, entity_type_id=5,
+                county_name=county_name,
+            )
+            for d in range(1, districts + 1):
+                district_code = '{:05d}'.format(c * 1000 + d)
+                district_name = '{} Unified District {}'.format(county_name, d)
+                yield Entity(
+                    county_code=county_code, district_code=district_code,
+                    school_code='0000000', test_year=year, entity_type_id=6,
+                    county_name=county_name, district_name=district_name,
+                )
+                for s in range(1, schools + 1):
+                    yield Entity(
+                        county_code=county_code, district_code=district_code,
+                        school_code='{:07d}'.format(d * 1000 + s), test_year=year,
+                        entity_type_id=7, county_name=county_name,
+                        district_name=district_name,
+                        school_name='School {} of {}'.format(s, district_name),
+                        zipcode='9{:04d}'.format((c * 37 + d) % 10000),
+                    )
+
+
+def create_entities(years, **sizes):
+    entities = list(synthetic_entities(years, **sizes))
+    Entity.objects.bulk_create(entities, batch_size=5000)
+    return len(entities)
+
+
+def synthetic_score_lines(rows, years):
+    """Yield caret delimited score file lines (header first) for `rows` rows."""
+    yield '^'.join(SCORE_HEADER)
+    entities = Entity.objects.filter(test_year__in=years).values_list(
+        'county_code', 'district_code', 'school_code', 'test_year'
+    )
+    combinations = itertools.product(
+        entities, TESTS, GRADES, SUBGROUPS
+    )
+    for i, (entity, test, grade, subgroup) in enumerate(itertools.cycle(combinations)):
+        if i >= rows:
+            return
+        county, district, school, year = entity
+        pct = i % 100
+        yield '^'.join(str(value) for value in (
+            county, district, school, '', year, subgroup[0], 'B', 120, 118,
+            int(grade[0]), test[0], 125, 119, '2431.5', pct / 4, pct / 4,
+            pct / 2, pct / 4, pct / 4, 118,
+        ))
+
+
+def write_score_file(path, rows, years):
+    with open(path, 'w') as f:
+        for line in synthetic_score_lines(rows, years):
+            f.write(line + '\n')
+
+
+def peak_memory_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
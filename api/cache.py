@@ -0,0 +1,40 @@
+import hashlib
+from django.conf import settings
+from rest_framework.response import Response
+from api.dataset import dataset_token, get_cache
+from api.metrics import count_cache_lookup
+
+
+class CachedResponseMixin:
+    """Cache the response data of list and retrieve.
+
+    Keys are built from the absolute URL (path plus query string) and the
+    dataset version, which `api.signals` bumps on every save or delete of an
+    API model.
+    """
+    cache_timeout = None
+
+    def get_response_cache_key(self, request):
+        url = request.build_absolute_uri()
+        digest = hashlib.md5(url.encode('utf-8')).hexdigest()
+        return 'api:response:{}:{}'.format(dataset_token(), digest)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        cache = get_cache()
+        key = self.get_response_cache_key(request)
+        data = cache.get(key)
+        count_cache_lookup(self.basename, data is not None)
+        if data is not None:
+            return Response(data)
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            timeout = self.cache_timeout or settings.API_CACHE_TIMEOUT
+            cache.set(key, response.data, timeout)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
@@ -0,0 +1,86 @@
+"""Dataset version shared by every worker process.
+
+A single `DatasetVersion` row is bumped whenever an API table is written to.
+The current value is kept in the cache for `VERSION_TIMEOUT` seconds so
+conditional requests and cache key lookups do not have to query the database.
+The short timeout bounds how long a process can serve an old version: bumps
+from other processes do not reach a per-process cache, and a reader may put a
+version read before a bump committed back into a shared one.
+"""
+import hashlib
+from functools import partial
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from api.models import DatasetVersion
+from api.replicas import PRIMARY
+
+VERSION_KEY = 'api:dataset-version'
+VERSION_TIMEOUT = 5
+
+# Set for DB_REPLICA_LAG_SECONDS after every bump, see `recently_changed()`.
+CHANGED_KEY = 'api:dataset-changed'
+
+
+def get_cache():
+    return caches[settings.API_CACHE_ALIAS]
+
+
+def get_dataset_version():
+    """Return the current (version, modified) pair."""
+    cache = get_cache()
+    current = cache.get(VERSION_KEY)
+    if current is None:
+        # A plain read on the primary, get_or_create() is routed as a write and
+        # would move the rest of the request off its read replica.
+        current = DatasetVersion.objects.using(PRIMARY).filter(pk=1).values_list(
+            'version', 'modified'
+        ).first()
+        if current is None:
+            row, _ = DatasetVersion.objects.get_or_create(pk=1)
+            current = (row.version, row.modified)
+        cache.set(VERSION_KEY, current, VERSION_TIMEOUT)
+    return current
+
+
+def bump_dataset_version():
+    updated = DatasetVersion.objects.filter(pk=1).update(
+        version=F('version') + 1, modified=timezone.now()
+    )
+    if not updated:
+        DatasetVersion.objects.create(pk=1, version=1)
+    # Forget the cached value now for this connection, and again once the
+    # write is visible to other connections.
+    cache = get_cache()
+    cache.delete(VERSION_KEY)
+    transaction.on_commit(lambda: cache.delete(VERSION_KEY))
+    if settings.DATABASE_REPLICAS:
+        # Again from the commit on, when replicas start to replay the change.
+        mark_changed = partial(cache.set, CHANGED_KEY, True, settings.DB_REPLICA_LAG_SECONDS)
+        mark_changed()
+        transaction.on_commit(mark_changed)
+
+
+def recently_changed():
+    """Whether the dataset changed in the last DB_REPLICA_LAG_SECONDS."""
+    return get_cache().get(CHANGED_KEY) is not None
+
+
+def dataset_token():
+    version, modified = get_dataset_version()
+    return '{}.{}'.format(version, int(modified.timestamp() * 1000000))
+
+
+def dataset_etag(request, *args, **kwargs):
+    """Strong ETag for a representation of the current dataset version."""
+    representation = '{} {}'.format(
+        request.get_full_path(), request.META.get('HTTP_ACCEPT', '')
+    )
+    digest = hashlib.md5(representation.encode('utf-8')).hexdigest()[:16]
+    return '"{}-{}"'.format(dataset_token(), digest)
+
+
+def dataset_last_modified(request, *args, **kwargs):
+    return get_dataset_version()[1]
@@ -0,0 +1,180 @@
+import csv
+import io
+import time
+from itertools import islice
+from django.db import connection, transaction
+from api.lookups import get_registry
+from api.models import Entity, Score
+
+
+ENTITY_COLUMNS = {
+    'County Code': 'county_code',
+    'District Code': 'district_code',
+    'School Code': 'school_code',
+    'Test Year': 'test_year',
+    'Type Id': 'entity_type_id',
+    'County Name': 'county_name',
+    'District Name': 'district_name',
+    'School Name': 'school_name',
+    'Zip Code': 'zipcode',
+}
+
+SCORE_COLUMNS = {
+    'Test Type': 'test_type',
+    'Total Tested At Entity Level': 'total_tested_at_entity',
+    'Total Tested with Scores': 'total_tested_with_scores',
+    'CAASPP Reported Enrollment': 'reported_enrollment',
+    'Students Tested': 'students_tested',
+    'Students with Scores': 'students_with_scores',
+    'Mean Scale Score': 'mean_scale_score',
+    'Percentage Standard Exceeded': 'pct_exceeded',
+    'Percentage Standard Met': 'pct_met',
+    'Percentage Standard Met and Above': 'pct_met_and_above',
+    'Percentage Standard Nearly Met': 'pct_nearly_met',
+    'Percentage Standard Not Met': 'pct_not_met',
+}
+
+# test_type is NOT NULL, rows without one are skipped rather than copied as NULL.
+NULLABLE_SCORE_COLUMNS = [column for column in SCORE_COLUMNS if column != 'Test Type']
+
+SUPPRESSED = ('', '*')
+
+
+def read_research_file(path, encoding='utf-8-sig'):
+    """Stream rows of a caret delimited CAASPP research file as dicts."""
+    with open(path, newline='', encoding=encoding, errors='replace') as f:
+        reader = csv.reader(f, delimiter='^')
+        header = next(reader, None)
+        if header is None:
+            return
+        header = [column.strip() for column in header]
+        for row in reader:
+            if row:
+                yield dict(zip(header, (value.strip() for value in row)))
+
+
+def chunked(iterable, size):
+    """Yield lists of at most `size` items without materializing the input."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class LoadStats:
+    """Row counters and wall clock for a single load run."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.loaded = 0
+        self.skipped = 0
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def rate(self):
+        return self.loaded / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        return '{} rows loaded, {} skipped in {:.2f}s ({:,.0f} rows/sec)'.format(
+            self.loaded, self.skipped, self.elapsed, self.rate
+        )
+
+
+class ScoreLoader:
+    """Load research file score rows through COPY into a staging table.
+
+    Codes are mapped to foreign key ids through the dimension registry and an
+    entity dict built once per test year, rows are streamed into a temporary
+    staging table in fixed size COPY chunks and the staging table is moved into
+    api_score with a single INSERT ... SELECT.
+    """
+    staging_table = 'api_score_staging'
+
+    def __init__(self, batch_size=50000, replace=False):
+        self.batch_size = batch_size
+        self.replace = replace
+        self.stats = LoadStats()
+        self.columns = ['entity_id', 'test_id', 'grade_id', 'subgroup_id', 'test_year']
+        self.columns += list(SCORE_COLUMNS.values())
+        self.entities = {}
+        self.loaded_years = set()
+        self.registry = get_registry()
+
+    def load(self, rows):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute('DROP TABLE IF EXISTS {}'.format(self.staging_table))
+            cursor.execute(
+                'CREATE TEMPORARY TABLE {} AS SELECT {} FROM {} WITH NO DATA'.format(
+                    self.staging_table, ', '.join(self.columns), Score._meta.db_table
+                )
+            )
+            for chunk in chunked(rows, self.batch_size):
+                self.copy_chunk(cursor, chunk)
+            if self.replace:
+                cursor.execute(
+                    'DELETE FROM {} WHERE test_year IN '
+                    '(SELECT DISTINCT test_year FROM {})'.format(
+                        Score._meta.db_table, self.staging_table
+                    )
+                )
+            columns = ', '.join(self.columns)
+            cursor.execute('INSERT INTO {0} ({1}) SELECT {1} FROM {2}'.format(
+                Score._meta.db_table, columns, self.staging_table
+            ))
+            cursor.execute('DROP TABLE {}'.format(self.staging_table))
+        return self.stats
+
+    def copy_chunk(self, cursor, chunk):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in chunk:
+            values = self.map_row(row)
+            if values is None:
+                self.stats.skipped += 1
+                continue
+            writer.writerow(values)
+            self.stats.loaded += 1
+        buffer.seek(0)
+        cursor.copy_expert(
+            'COPY {} ({}) FROM STDIN WITH (FORMAT csv)'.format(
+                self.staging_table, ', '.join(self.columns)
+            ),
+            buffer,
+        )
+
+    def map_row(self, row):
+        try:
+            test_year = int(row['Test Year'])
+            test_id = int(row['Test Id'])
+            subgroup_id = int(row['Subgroup ID'])
+        except (KeyError, ValueError):
+            return None
+        if test_year not in self.loaded_years:
+            self.load_entities(test_year)
+        entity_id = self.entities.get(
+            (row['County Code'], row['District Code'], row['School Code'], test_year)
+        )
+        grade_id = self.registry.pk('grade', row.get('Grade', '').zfill(2))
+        test_type = row.get('Test Type', '')
+        if (entity_id is None or grade_id is None or test_type in SUPPRESSED
+                or self.registry.pk('test', test_id) is None
+                or self.registry.pk('subgroup', subgroup_id) is None):
+            return None
+        values = [entity_id, test_id, grade_id, subgroup_id, test_year, test_type]
+        for column in NULLABLE_SCORE_COLUMNS:
+            value = row.get(column, '')
+            values.append(None if value in SUPPRESSED else value)
+        return values
+
+    def load_entities(self, test_year):
+        self.loaded_years.add(test_year)
+        entities = Entity.objects.filter(test_year=test_year).values_list(
+            'county_code', 'district_code', 'school_code', 'test_year', 'id'
+        )
+        for county, district, school, year, pk in entities.iterator():
+            self.entities[(county, district, school, year)] = pk
@@ -0,0 +1,56 @@
+"""Process local code lookups for the dimension tables.
+
+Each dimension table is loaded once into dicts keyed by its natural code and
+reloaded only when the dataset version changes, so ingest and serializers
+resolve codes without a query per row.
+"""
+import threading
+from api.dataset import dataset_token
+from api.models import Grade, SubGroup, Test, Type
+
+DIMENSIONS = {
+    'type': (Type, 'type_id'),
+    'test': (Test, 'test_id'),
+    'grade': (Grade, 'num'),
+    'subgroup': (SubGroup, 'subgroup_id'),
+}
+
+
+class DimensionRegistry:
+
+    def __init__(self, token):
+        self.token = token
+        self.instances = {}
+        self.pks = {}
+        for dimension, (model, code_field) in DIMENSIONS.items():
+            instances = {getattr(obj, code_field): obj for obj in model.objects.all()}
+            self.instances[dimension] = instances
+            self.pks[dimension] = {code: obj.pk for code, obj in instances.items()}
+
+    def get(self, dimension, code):
+        """Return the instance for `code`, or None if it does not exist."""
+        return self.instances[dimension].get(code)
+
+    def pk(self, dimension, code):
+        """Return the primary key for `code`, or None if it does not exist."""
+        return self.pks[dimension].get(code)
+
+    def codes(self, dimension):
+        return self.pks[dimension].keys()
+
+
+_registry = None
+_lock = threading.Lock()
+
+
+def get_registry():
+    """Return the registry for the current dataset version."""
+    global _registry
+    token = dataset_token()
+    registry = _registry
+    if registry is None or registry.token != token:
+        with _lock:
+            if _registry is None or _registry.token != token:
+                _registry = DimensionRegistry(token)
+            registry = _registry
+    return registry
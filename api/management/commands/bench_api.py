@@ -0,0 +1,262 @@
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from functools import partial
+from http.client import HTTPConnection
+from urllib.parse import urlsplit
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from api import benchmarks, partitions, rollups
+from api.dataset import bump_dataset_version, get_cache
+from api.loaders import ScoreLoader, read_research_file
+from api.models import Entity, RollupState
+
+YEARS = [2015, 2016, 2017, 2018]
+
+# (name, method, path, JSON body). Paths are formatted with the keys returned
+# by Command.scenario_keys().
+SCENARIOS = (
+    ('types', 'GET', '/api/types/', None),
+    ('tests', 'GET', '/api/tests/', None),
+    ('grades', 'GET', '/api/grades/', None),
+    ('subgroups', 'GET', '/api/subgroups/', None),
+    ('rollups state', 'GET', '/api/rollups/?level=state&test_year={rollup_year}', None),
+    ('rollups district', 'GET',
+     '/api/rollups/?level=district&test_year={rollup_year}&limit=1000', None),
+    ('entities', 'GET', '/api/entities/', None),
+    ('entities limit 1000', 'GET', '/api/entities/?limit=1000', None),
+    ('entities deep offset', 'GET', '/api/entities/?offset={deep_offset}', None),
+    ('entities keyset', 'GET', '/api/entities/?pagination=keyset&limit=1000', None),
+    ('entities year', 'GET', '/api/entities/?test_year=2018', None),
+    ('entities year county', 'GET',
+     '/api/entities/?test_year=2018&county_code={county_code}', None),
+    ('entities zipcode', 'GET', '/api/entities/?zipcode={zipcode}', None),
+    ('entities type year', 'GET', '/api/entities/?entity_type=6&test_year=2018', None),
+    ('entities search', 'GET', '/api/entities/?search=unified+district+3', None),
+    ('entities fields', 'GET',
+     '/api/entities/?limit=1000&fields=county_code,district_code,school_code,zipcode', None),
+    ('entity detail', 'GET', '/api/entities/{entity_id}/', None),
+    ('entity natural key', 'GET', '/api/entities/2018/{cds_code}/', None),
+    ('entities batch 500', 'POST', '/api/entities/batch/', 'batch'),
+    ('entities export year', 'GET', '/api/entities/export/?test_year=2018', None),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure latency, queries per request and rows/sec of every API endpoint '
+        'against a synthetic dataset, in process and through a local WSGI server.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', choices=('inprocess', 'wsgi', 'both'), default='both')
+        parser.add_argument('--requests', type=int, default=50, help='Timed requests per scenario')
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--threads', type=int, default=4, help='WSGI server threads')
+        parser.add_argument('--only', help='Run scenarios whose name contains this text')
+        parser.add_argument(
+            '--scale',
+            type=int,
+            default=20,
+            help='Districts per county and schools per district (default 20, ~42k entities)',
+        )
+        parser.add_argument('--scores', type=int, default=200000, help='Score rows to load')
+        parser.add_argument(
+            '--no-scratch',
+            action='store_false',
+            dest='scratch',
+            help='Use the configured database inside a rolled back transaction '
+                 '(in process mode only)',
+        )
+        parser.add_argument('--save-baseline', metavar='PATH')
+        parser.add_argument('--baseline', metavar='PATH', help='Compare with a saved baseline')
+        parser.add_argument(
+            '--max-regression',
+            type=float,
+            default=1.25,
+            help='Fail when a p95 exceeds the baseline by this factor (default 1.25)',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('bench_api requires PostgreSQL.')
+        modes = ('inprocess', 'wsgi') if options['mode'] == 'both' else (options['mode'],)
+        if not options['scratch'] and 'wsgi' in modes:
+            raise CommandError('The WSGI mode needs the scratch database, use --mode inprocess.')
+        scenarios = [
+            scenario for scenario in SCENARIOS
+            if not options['only'] or options['only'] in scenario[0]
+        ]
+
+        database = benchmarks.scratch_database() if options['scratch'] else benchmarks.rolled_back()
+        with override_settings(ALLOWED_HOSTS=['*']), database:
+            self.create_dataset(options['scale'], options['scores'])
+            keys = self.scenario_keys()
+            results = {}
+            for mode in modes:
+                self.stdout.write(self.style.MIGRATE_HEADING(mode))
+                self.stdout.write('{:<24} {:>8} {:>8} {:>8} {:>8} {:>12}'.format(
+                    'scenario', 'p50 ms', 'p95 ms', 'p99 ms', 'queries', 'rows/sec'
+                ))
+                results[mode] = {}
+                with self.sender(mode, options['threads']) as send:
+                    for name, method, path, body in scenarios:
+                        request = (method, path.format(**keys), keys.get(body))
+                        result = self.run_scenario(
+                            send, request, options['warmup'], options['requests']
+                        )
+                        results[mode][name] = result
+                        self.stdout.write(
+                            '{:<24} {:>8.2f} {:>8.2f} {:>8.2f} {:>8} {:>12,.0f}'.format(
+                                name, result['p50'], result['p95'], result['p99'],
+                                '-' if result['queries'] is None
+                                else '{:.1f}'.format(result['queries']),
+                                result['rows_per_sec'],
+                            )
+                        )
+            # Before the database is dropped, so an error there keeps the results.
+            self.report(results, options)
+
+    def report(self, results, options):
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w') as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+            self.stdout.write('Saved baseline to {}'.format(options['save_baseline']))
+        if options['baseline']:
+            self.compare(results, options['baseline'], options['max_regression'])
+
+    def create_dataset(self, scale, scores):
+        started = time.perf_counter()
+        for year in YEARS:
+            partitions.create_partition(year)
+        benchmarks.create_dimensions()
+        entities = benchmarks.create_entities(YEARS, counties=25, districts=scale, schools=scale)
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'scores.txt')
+        try:
+            benchmarks.write_score_file(path, scores, YEARS)
+            ScoreLoader().load(read_research_file(path))
+        finally:
+            os.remove(path)
+            os.rmdir(directory)
+        for year in rollups.stale_years():
+            rollups.refresh_year(year)
+        bump_dataset_version()
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.stdout.write('{:,} entities and {:,} scores over {} in {:.1f}s'.format(
+            entities, scores, ', '.join(str(year) for year in YEARS),
+            time.perf_counter() - started,
+        ))
+
+    def scenario_keys(self):
+        schools = Entity.objects.filter(test_year=2018, entity_type_id=7).order_by('pk')
+        school = schools.values('id', 'county_code', 'district_code', 'school_code', 'zipcode')[0]
+        codes = [
+            county + district + school_code
+            for county, district, school_code in schools.values_list(
+                'county_code', 'district_code', 'school_code'
+            )[:500]
+        ]
+        return {
+            'rollup_year': RollupState.objects.order_by('test_year').values_list(
+                'test_year', flat=True
+            ).first(),
+            'entity_id': school['id'],
+            'cds_code': school['county_code'] + school['district_code'] + school['school_code'],
+            'county_code': school['county_code'],
+            'zipcode': school['zipcode'],
+            'deep_offset': Entity.objects.count() - 100,
+            'batch': {'test_year': 2018, 'cds_codes': codes},
+        }
+
+    @contextmanager
+    def sender(self, mode, threads):
+        if mode == 'inprocess':
+            yield self.send_inprocess
+        else:
+            # Long lived threads close their connections when the server stops,
+            # a thread per request would leave them open on the scratch database.
+            with benchmarks.wsgi_server(threads=threads) as base_url:
+                yield partial(self.send_wsgi, base_url)
+
+    def run_scenario(self, send, request, warmup, requests):
+        get_cache().clear()
+        for _ in range(warmup):
+            send(*request)
+        latencies, queries, rows = [], [], 0
+        for _ in range(requests):
+            started = time.perf_counter()
+            status, content, query_count = send(*request)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if status >= 400:
+                raise CommandError('{} {} returned {}'.format(request[0], request[1], status))
+            rows += count_rows(content)
+            if query_count is not None:
+                queries.append(query_count)
+        return {
+            'p50': benchmarks.percentile(latencies, 50),
+            'p95': benchmarks.percentile(latencies, 95),
+            'p99': benchmarks.percentile(latencies, 99),
+            'queries': sum(queries) / len(queries) if queries else None,
+            'rows_per_sec': rows / (sum(latencies) / 1000),
+        }
+
+    def send_inprocess(self, method, path, body):
+        client = Client()
+        with CaptureQueriesContext(connection) as context:
+            if method == 'POST':
+                response = client.post(path, json.dumps(body), content_type='application/json')
+            else:
+                response = client.get(path)
+            if response.streaming:
+                content = b''.join(response.streaming_content)
+            else:
+                content = response.content
+        return response.status_code, content, len(context.captured_queries)
+
+    def send_wsgi(self, base_url, method, path, body):
+        http = HTTPConnection(urlsplit(base_url).netloc)
+        try:
+            headers = {'Content-Type': 'application/json'} if body is not None else {}
+            http.request(method, path, json.dumps(body) if body is not None else None, headers)
+            response = http.getresponse()
+            return response.status, response.read(), None
+        finally:
+            http.close()
+
+    def compare(self, results, path, max_regression):
+        with open(path) as f:
+            baseline = json.load(f)
+        self.stdout.write(self.style.MIGRATE_HEADING('p95 against {}'.format(path)))
+        regressions = []
+        for mode, scenarios in results.items():
+            for name, result in scenarios.items():
+                before = baseline.get(mode, {}).get(name)
+                if before is None:
+                    continue
+                ratio = result['p95'] / before['p95'] if before['p95'] else 1
+                line = '{:<10} {:<24} {:>8.2f} -> {:>8.2f} ms ({:+.0%})'.format(
+                    mode, name, before['p95'], result['p95'], ratio - 1
+                )
+                if ratio > max_regression:
+                    regressions.append(name)
+                    line = self.style.ERROR(line)
+                self.stdout.write(line)
+        if regressions:
+            raise CommandError('p95 regressed for {}'.format(', '.join(regressions)))
+
+
+def count_rows(content):
+    """Rows in a JSON list, paginated JSON, JSON object or NDJSON body."""
+    try:
+        data = json.loads(content)
+    except ValueError:
+        return content.count(b'\n')
+    if isinstance(data, dict):
+        return len(data['results']) if isinstance(data.get('results'), list) else 1
+    return len(data)
@@ -0,0 +1,126 @@
+import asyncio
+import time
+from importlib.util import find_spec
+from urllib.parse import urlsplit
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import get_internal_wsgi_application
+from django.db import connection
+from django.test.utils import override_settings
+from api import benchmarks
+from api.dataset import bump_dataset_version
+from api.models import Entity
+
+SCENARIOS = (
+    ('entities', '/api/entities/?limit=100'),
+    ('entities search', '/api/entities/?search=unified+district+3&limit=20'),
+    ('entity detail', '/api/entities/{entity_id}/'),
+    ('types', '/api/types/'),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare requests/sec and latency of the read endpoints under concurrent clients '
+        'through config.asgi (uvicorn) and through a threaded WSGI server.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000, help='Requests per run')
+        parser.add_argument(
+            '--concurrency',
+            default='1,16,64',
+            help='Comma separated numbers of concurrent clients (default 1,16,64)',
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=8,
+            help='WSGI server threads, and ASGI threads for requests handed to WSGI',
+        )
+        parser.add_argument(
+            '--scale', type=int, default=10, help='Districts and schools per county'
+        )
+        parser.add_argument('--only', help='Run scenarios whose name contains this text')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('bench_asgi requires PostgreSQL.')
+        missing = [module for module in ('asyncpg', 'uvicorn') if not find_spec(module)]
+        if missing:
+            raise CommandError('bench_asgi needs {}.'.format(' and '.join(missing)))
+        from api.asgi import ReadApplication
+
+        levels = [int(level) for level in options['concurrency'].split(',')]
+        scenarios = [
+            scenario for scenario in SCENARIOS
+            if not options['only'] or options['only'] in scenario[0]
+        ]
+        with override_settings(ALLOWED_HOSTS=['*']), benchmarks.scratch_database():
+            benchmarks.create_dimensions()
+            benchmarks.create_entities(
+                [2018], counties=25, districts=options['scale'], schools=options['scale']
+            )
+            bump_dataset_version()
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+            keys = {'entity_id': Entity.objects.order_by('pk').values_list('pk', flat=True)[0]}
+
+            servers = (
+                ('wsgi', benchmarks.wsgi_server(threads=options['threads'])),
+                ('asgi', benchmarks.asgi_server(
+                    ReadApplication(get_internal_wsgi_application(), threads=options['threads'])
+                )),
+            )
+            results = {}
+            for server_name, server in servers:
+                with server as base_url:
+                    netloc = urlsplit(base_url).netloc
+                    for name, path in scenarios:
+                        for level in levels:
+                            results[server_name, name, level] = asyncio.run(self.load(
+                                netloc, path.format(**keys), level, options['requests']
+                            ))
+
+        self.stdout.write('{:<18} {:>6} {:>12} {:>12} {:>10} {:>10}'.format(
+            'scenario', 'conc', 'wsgi req/s', 'asgi req/s', 'wsgi p99', 'asgi p99'
+        ))
+        for name, path in scenarios:
+            for level in levels:
+                wsgi, asgi = results['wsgi', name, level], results['asgi', name, level]
+                self.stdout.write('{:<18} {:>6} {:>12,.0f} {:>12,.0f} {:>10.1f} {:>10.1f}'.format(
+                    name, level, wsgi['requests_per_sec'], asgi['requests_per_sec'],
+                    wsgi['p99'], asgi['p99'],
+                ))
+
+    async def load(self, netloc, path, concurrency, requests):
+        host, port = netloc.split(':')
+        remaining = iter(range(requests))
+        latencies = []
+
+        async def client():
+            for _ in remaining:
+                started = time.perf_counter()
+                status = await self.fetch(host, port, path)
+                latencies.append((time.perf_counter() - started) * 1000)
+                if status >= 400:
+                    raise CommandError('GET {} returned {}'.format(path, status))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        return {
+            'requests_per_sec': requests / elapsed,
+            'p50': benchmarks.percentile(latencies, 50),
+            'p99': benchmarks.percentile(latencies, 99),
+        }
+
+    async def fetch(self, host, port, path):
+        reader, writer = await asyncio.open_connection(host, int(port))
+        try:
+            request = 'GET {} HTTP/1.1\r\nHost: {}\r\nConnection: close\r\n\r\n'.format(path, host)
+            writer.write(request.encode())
+            await writer.drain()
+            response = await reader.read()
+        finally:
+            writer.close()
+        return int(response.split(b' ', 2)[1])
@@ -0,0 +1,39 @@
+import os
+import tempfile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from api import benchmarks
+from api.loaders import ScoreLoader, read_research_file
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure load_scores throughput on a synthetic results file. '
+        'Everything written is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000)
+        parser.add_argument('--batch-size', type=int, default=50000)
+        parser.add_argument('--years', type=int, nargs='+', default=[2018])
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('bench_ingest requires PostgreSQL COPY support.')
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'scores.txt')
+        try:
+            with benchmarks.rolled_back():
+                benchmarks.create_dimensions()
+                entities = benchmarks.create_entities(options['years'])
+                benchmarks.write_score_file(path, options['rows'], options['years'])
+                self.stdout.write('{} entities, {:.1f} MB results file'.format(
+                    entities, os.path.getsize(path) / 2 ** 20
+                ))
+                loader = ScoreLoader(batch_size=options['batch_size'])
+                stats = loader.load(read_research_file(path))
+                self.stdout.write(str(stats))
+                self.stdout.write('peak RSS {:.0f} MB'.format(benchmarks.peak_memory_mb()))
+        finally:
+            os.remove(path)
+            os.rmdir(directory)
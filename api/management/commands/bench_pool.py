@@ -0,0 +1,108 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection
+from urllib.parse import urlsplit
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test.utils import override_settings
+from api import benchmarks
+from api.backends.postgresql_pool.base import close_pools
+from api.dataset import bump_dataset_version
+
+# (name, ENGINE, CONN_MAX_AGE)
+CONFIGURATIONS = (
+    ('connect per request', 'django.db.backends.postgresql', 0),
+    ('CONN_MAX_AGE=60', 'django.db.backends.postgresql', 60),
+    ('pool', 'api.backends.postgresql_pool', 0),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare requests/sec through a local WSGI server when connecting per request, '
+        'with persistent connections and with the connection pool.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, default=8, help='Concurrent clients')
+        parser.add_argument('--threads', type=int, default=8, help='Server threads')
+        parser.add_argument(
+            '--pool-size',
+            type=int,
+            help='Pool MAX_SIZE (defaults to --threads)',
+        )
+        parser.add_argument('--path', default='/api/entities/?limit=10')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('bench_pool requires PostgreSQL.')
+        settings_dict = connections.databases['default']
+        with override_settings(ALLOWED_HOSTS=['*']), benchmarks.scratch_database():
+            benchmarks.create_dimensions()
+            benchmarks.create_entities([2018], counties=5, districts=5, schools=5)
+            bump_dataset_version()
+            self.stdout.write('{:<22} {:>12} {:>8} {:>8} {:>12}'.format(
+                'configuration', 'requests/s', 'p50 ms', 'p95 ms', 'connections'
+            ))
+            for name, engine, max_age in CONFIGURATIONS:
+                original = dict(settings_dict)
+                settings_dict.update(
+                    ENGINE=engine,
+                    CONN_MAX_AGE=max_age,
+                    POOL=dict(
+                        settings_dict.get('POOL', {}),
+                        MAX_SIZE=options['pool_size'] or options['threads'],
+                    ),
+                )
+                try:
+                    result = self.run(options)
+                finally:
+                    settings_dict.clear()
+                    settings_dict.update(original)
+                    close_pools()
+                self.stdout.write('{:<22} {:>12,.0f} {:>8.2f} {:>8.2f} {:>12}'.format(
+                    name, result['requests_per_sec'], result['p50'], result['p95'],
+                    result['connections'],
+                ))
+
+    def run(self, options):
+        with benchmarks.wsgi_server(threads=options['threads']) as base_url:
+            netloc = urlsplit(base_url).netloc
+            for _ in range(options['threads']):
+                self.send(netloc, options['path'])
+            started = time.perf_counter()
+            with ThreadPoolExecutor(options['concurrency']) as executor:
+                latencies = list(executor.map(
+                    lambda _: self.send(netloc, options['path']), range(options['requests'])
+                ))
+            elapsed = time.perf_counter() - started
+            connections_open = self.count_connections()
+        return {
+            'requests_per_sec': options['requests'] / elapsed,
+            'p50': benchmarks.percentile(latencies, 50),
+            'p95': benchmarks.percentile(latencies, 95),
+            'connections': connections_open,
+        }
+
+    def send(self, netloc, path):
+        started = time.perf_counter()
+        http = HTTPConnection(netloc)
+        try:
+            http.request('GET', path)
+            response = http.getresponse()
+            response.read()
+        finally:
+            http.close()
+        if response.status >= 400:
+            raise CommandError('GET {} returned {}'.format(path, response.status))
+        return (time.perf_counter() - started) * 1000
+
+    def count_connections(self):
+        """Server connections to the database other than this thread's."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT count(*) FROM pg_stat_activity '
+                'WHERE datname = current_database() AND pid <> pg_backend_pid()'
+            )
+            return cursor.fetchone()[0]
@@ -0,0 +1,66 @@
+import gzip
+import time
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from api import benchmarks, renderers
+from api.middleware import CompressionMiddleware, brotli
+from api.models import EntityRead
+from api.serializers import EntityReadSerializer, ValuesSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare payload size and encode time of the JSON, MessagePack and Arrow '
+        'renderers for a page of entities. Everything written is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        # The request factory's host is 'testserver', which the URLs are built on.
+        with override_settings(ALLOWED_HOSTS=['testserver']), benchmarks.rolled_back():
+            benchmarks.create_dimensions()
+            benchmarks.create_entities([2018], counties=10, districts=10, schools=10)
+            self.run(options['rows'], options['repeat'])
+
+    def run(self, rows, repeat):
+        request = Request(APIRequestFactory().get('/api/entities/'))
+        serializer = ValuesSerializer(EntityReadSerializer(context={'request': request}))
+        data = {
+            'count': rows,
+            'next': None,
+            'previous': None,
+            'results': serializer.represent(
+                serializer.values(EntityRead.objects.order_by('pk')[:rows])
+            ),
+        }
+
+        candidates = [JSONRenderer(), renderers.MessagePackRenderer(), renderers.ArrowRenderer()]
+        self.stdout.write('{:<12} {:>10} {:>10} {:>10} {:>12}'.format(
+            'renderer', 'bytes', 'gzip', 'brotli', 'encode ms'
+        ))
+        for renderer in candidates:
+            if not getattr(renderer, 'available', True):
+                self.stdout.write('{:<12} not installed'.format(renderer.format))
+                continue
+            content = renderer.render(data)
+            started = time.perf_counter()
+            for _ in range(repeat):
+                renderer.render(data)
+            elapsed = (time.perf_counter() - started) / repeat
+            brotli_size = '-'
+            if brotli:
+                quality = CompressionMiddleware.brotli_quality
+                brotli_size = '{:,}'.format(len(brotli.compress(content, quality=quality)))
+            self.stdout.write('{:<12} {:>10,} {:>10,} {:>10} {:>12.2f}'.format(
+                renderer.format,
+                len(content),
+                len(gzip.compress(content)),
+                brotli_size,
+                elapsed * 1000,
+            ))
@@ -0,0 +1,49 @@
+import time
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from api import benchmarks
+from api.models import EntityRead
+from api.serializers import EntityReadSerializer, ValuesSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare rows/sec of the hyperlinked serializer of entity reads with the '
+        'values() fast path. Everything written is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        # The request factory's host is 'testserver', which the URLs are built on.
+        with override_settings(ALLOWED_HOSTS=['testserver']), benchmarks.rolled_back():
+            benchmarks.create_dimensions()
+            benchmarks.create_entities([2018], counties=10, districts=10, schools=10)
+            self.run(options['rows'], options['repeat'])
+
+    def run(self, rows, repeat):
+        request = Request(APIRequestFactory().get('/api/entities/'))
+        context = {'request': request, 'format': None}
+        queryset = EntityRead.objects.order_by('pk')[:rows]
+
+        def hyperlinked():
+            return EntityReadSerializer(list(queryset), many=True, context=context).data
+
+        def values():
+            serializer = ValuesSerializer(EntityReadSerializer(context=context))
+            return serializer.represent(serializer.values(queryset))
+
+        for label, serialize in (('HyperlinkedModelSerializer', hyperlinked),
+                                 ('ValuesSerializer', values)):
+            serialize()
+            started = time.perf_counter()
+            for _ in range(repeat):
+                count = len(serialize())
+            elapsed = time.perf_counter() - started
+            self.stdout.write('{:<28} {:>10,.0f} rows/sec ({} rows x {})'.format(
+                label, count * repeat / elapsed, count, repeat
+            ))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Max
+from django.utils import timezone
+from api import partitions
+from api.models import Entity
+
+
+class Command(BaseCommand):
+    help = "Create the yearly Entity and Score partitions, by default for next year."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'years',
+            type=int,
+            nargs='*',
+            help='Test years to create partitions for (default: the year after the latest one)',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('create_partition requires PostgreSQL.')
+        years = options['years'] or [self.next_year()]
+        for year in years:
+            created = partitions.create_partition(year)
+            if created:
+                self.stdout.write(self.style.SUCCESS('Created {}'.format(', '.join(created))))
+            else:
+                self.stdout.write('Partitions for {} already exist.'.format(year))
+
+    def next_year(self):
+        latest = Entity.objects.aggregate(latest=Max('test_year'))['latest']
+        years = partitions.partition_years(Entity) + ([latest] if latest else [])
+        return max(years) + 1 if years else timezone.now().year
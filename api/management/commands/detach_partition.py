@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from api import partitions
+from api.dataset import bump_dataset_version
+
+
+class Command(BaseCommand):
+    help = 'Retire a test year by detaching its Entity and Score partitions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('year', type=int, help='Test year to retire')
+        parser.add_argument(
+            '--drop',
+            action='store_true',
+            help='Drop the detached tables instead of keeping them for archiving',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('detach_partition requires PostgreSQL.')
+        detached = partitions.detach_partition(options['year'], drop=options['drop'])
+        if not detached:
+            raise CommandError('No partitions found for {}.'.format(options['year']))
+        bump_dataset_version()
+        self.stdout.write(self.style.SUCCESS('{} {}'.format(
+            'Dropped' if options['drop'] else 'Detached', ', '.join(detached)
+        )))
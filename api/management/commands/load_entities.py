@@ -0,0 +1,100 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+from django.db.models import ProtectedError
+from api.dataset import bump_dataset_version
+from api.loaders import ENTITY_COLUMNS, LoadStats, chunked, read_research_file
+from api.lookups import get_registry
+from api.models import Entity
+
+NATURAL_KEY = ('county_code', 'district_code', 'school_code')
+UPDATE_FIELDS = ['entity_type', 'county_name', 'district_name', 'school_name', 'zipcode']
+
+
+class Command(BaseCommand):
+    help = 'Bulk load a caret delimited CAASPP research entities file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path to the sb_ca<year>entities file')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Rows per INSERT statement (default 2000)',
+        )
+        parser.add_argument(
+            '--replace',
+            action='store_true',
+            help='Reload each test year found in the file, updating entities by their codes',
+        )
+        parser.add_argument('--encoding', default='utf-8-sig')
+
+    def handle(self, *args, **options):
+        type_ids = get_registry().codes('type')
+        stats = LoadStats()
+        # {test year: {natural key: pk}} of the entities not in the file so far.
+        existing = {}
+
+        try:
+            rows = read_research_file(options['path'], options['encoding'])
+            with transaction.atomic():
+                for chunk in chunked(rows, options['batch_size']):
+                    entities = []
+                    for row in chunk:
+                        entity = self.build_entity(row, type_ids)
+                        if entity is None:
+                            stats.skipped += 1
+                            continue
+                        if options['replace']:
+                            if entity.test_year not in existing:
+                                existing[entity.test_year] = self.existing_entities(
+                                    entity.test_year
+                                )
+                            entity.pk = existing[entity.test_year].pop(
+                                tuple(getattr(entity, field) for field in NATURAL_KEY), None
+                            )
+                        entities.append(entity)
+                    Entity.objects.bulk_create(
+                        [entity for entity in entities if entity.pk is None],
+                        batch_size=options['batch_size'],
+                    )
+                    Entity.objects.bulk_update(
+                        [entity for entity in entities if entity.pk is not None],
+                        UPDATE_FIELDS, batch_size=options['batch_size'],
+                    )
+                    stats.loaded += len(entities)
+                for test_year, missing in existing.items():
+                    try:
+                        Entity.objects.filter(
+                            test_year=test_year, pk__in=missing.values()
+                        ).delete()
+                    except ProtectedError:
+                        # Checked before the IntegrityError below, which it subclasses.
+                        raise CommandError(
+                            'Scores reference entities of {0} missing from the file, '
+                            'reload the scores for {0} without them first.'.format(test_year)
+                        )
+                bump_dataset_version()
+        except OSError as e:
+            raise CommandError('Could not read {}: {}'.format(options['path'], e))
+        except IntegrityError as e:
+            raise CommandError('Entities already loaded, use --replace to reload: {}'.format(e))
+
+        self.stdout.write(self.style.SUCCESS(str(stats)))
+
+    def existing_entities(self, test_year):
+        entities = Entity.objects.filter(test_year=test_year).values_list(*NATURAL_KEY, 'pk')
+        return {tuple(values): pk for *values, pk in entities.iterator()}
+
+    def build_entity(self, row, type_ids):
+        fields = {
+            field: row.get(column, '')
+            for column, field in ENTITY_COLUMNS.items()
+        }
+        try:
+            fields['test_year'] = int(fields['test_year'])
+            fields['entity_type_id'] = int(fields['entity_type_id'])
+        except ValueError:
+            return None
+        if fields['entity_type_id'] not in type_ids:
+            return None
+        return Entity(**fields)
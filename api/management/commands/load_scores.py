@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from api.loaders import ScoreLoader, read_research_file
+
+
+class Command(BaseCommand):
+    help = 'Load a caret delimited CAASPP research results file with COPY.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path to the sb_ca<year>_all file')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50000,
+            help='Rows per COPY chunk into the staging table (default 50000)',
+        )
+        parser.add_argument(
+            '--replace',
+            action='store_true',
+            help='Delete existing scores for each test year found in the file',
+        )
+        parser.add_argument('--encoding', default='utf-8-sig')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('load_scores requires PostgreSQL COPY support.')
+        loader = ScoreLoader(batch_size=options['batch_size'], replace=options['replace'])
+        try:
+            stats = loader.load(read_research_file(options['path'], options['encoding']))
+        except OSError as e:
+            raise CommandError('Could not read {}: {}'.format(options['path'], e))
+        self.stdout.write(self.style.SUCCESS(str(stats)))
@@ -0,0 +1,34 @@
+import time
+from django.core.management.base import BaseCommand
+from api import rollups
+from api.dataset import bump_dataset_version
+
+
+class Command(BaseCommand):
+    help = 'Rebuild proficiency rollups for test years whose scores changed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--year',
+            type=int,
+            nargs='+',
+            dest='years',
+            help='Rebuild these test years even if their scores did not change',
+        )
+
+    def handle(self, *args, **options):
+        years = options['years'] or rollups.stale_years()
+        if not years:
+            self.stdout.write('Rollups are up to date.')
+            return
+
+        for year in years:
+            started = time.perf_counter()
+            written = rollups.refresh_year(year)
+            self.stdout.write('{}: {} rollup rows in {:.2f}s'.format(
+                year, written, time.perf_counter() - started
+            ))
+        bump_dataset_version()
+        self.stdout.write(self.style.SUCCESS('Refreshed {}'.format(
+            ', '.join(str(year) for year in years)
+        )))
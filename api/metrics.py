@@ -0,0 +1,86 @@
+"""Prometheus metrics for the API hot paths, served at /metrics.
+
+Needs the optional prometheus_client package; without it nothing is
+recorded and /metrics returns 404. With several worker processes set
+PROMETHEUS_MULTIPROC_DIR to an empty directory shared by the workers before
+they start. Every process then writes its samples to memory mapped files in
+that directory and /metrics adds them up (see config/gunicorn.conf.py).
+"""
+import os
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+except ImportError:
+    prometheus_client = None
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+if prometheus_client is not None:
+    REQUESTS = prometheus_client.Counter(
+        'api_requests_total', 'Requests by route, action, method and status',
+        ['basename', 'action', 'method', 'status'],
+    )
+    LATENCY = prometheus_client.Histogram(
+        'api_request_duration_seconds', 'Request latency by route and action',
+        ['basename', 'action'], buckets=LATENCY_BUCKETS,
+    )
+    QUERIES = prometheus_client.Histogram(
+        'api_request_queries', 'SQL queries per request sampled by RequestTimingMiddleware',
+        ['basename', 'action'], buckets=QUERY_BUCKETS,
+    )
+    CACHE_LOOKUPS = prometheus_client.Counter(
+        'api_response_cache_lookups_total', 'Response cache lookups by route and result',
+        ['basename', 'result'],
+    )
+    # livesum adds up the connections of the worker processes still running.
+    POOL_CONNECTIONS = prometheus_client.Gauge(
+        'api_db_pool_connections', 'Pooled database connections by state',
+        ['alias', 'state'], multiprocess_mode='livesum',
+    )
+
+
+def route_labels(request):
+    """Return (router basename, viewset action) of a resolved request."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched', 'unmatched'
+    initkwargs = getattr(match.func, 'initkwargs', {})
+    actions = getattr(match.func, 'actions', None)
+    if 'basename' not in initkwargs or not actions:
+        return match.url_name or 'other', 'other'
+    method = request.method.lower()
+    action = actions.get(method) or (method == 'head' and actions.get('get'))
+    return initkwargs['basename'], action or 'other'
+
+
+def observe_request(request, response, duration, queries=None):
+    if prometheus_client is None:
+        return
+    basename, action = route_labels(request)
+    REQUESTS.labels(basename, action, request.method, response.status_code).inc()
+    LATENCY.labels(basename, action).observe(duration)
+    if queries is not None:
+        QUERIES.labels(basename, action).observe(queries)
+
+
+def count_cache_lookup(basename, hit):
+    if prometheus_client is not None:
+        CACHE_LOOKUPS.labels(basename, 'hit' if hit else 'miss').inc()
+
+
+def set_pool_connections(alias, in_use, idle):
+    if prometheus_client is not None:
+        POOL_CONNECTIONS.labels(alias, 'in_use').set(in_use)
+        POOL_CONNECTIONS.labels(alias, 'idle').set(idle)
+
+
+def render_metrics():
+    """Return (body, content type) of the metrics of every worker process."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return prometheus_client.generate_latest(registry), prometheus_client.CONTENT_TYPE_LATEST
@@ -0,0 +1,201 @@
+import logging
+import re
+import time
+from contextlib import ExitStack
+from django.conf import settings
+from django.db import connections
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from api import metrics, replicas
+from api.dataset import recently_changed
+from api.timing import RequestTimings, get_timings, sampled
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+re_accepts_brotli = re.compile(r'\bbr\b')
+
+logger = logging.getLogger('api.timing')
+
+
+def compress_brotli_sequence(sequence, quality):
+    compressor = brotli.Compressor(quality=quality)
+    for item in sequence:
+        data = compressor.process(item)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """Content encoding negotiated from Accept-Encoding.
+
+    Brotli is preferred when the client accepts it and the optional brotli
+    package is installed, gzip is used otherwise. Streaming responses such as
+    exports are compressed chunk by chunk.
+    """
+    # Dynamic responses are compressed on every request, so trade a little
+    # ratio for speed instead of using the maximum quality of 11.
+    brotli_quality = 5
+
+    def process_response(self, request, response):
+        accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if brotli is None or not re_accepts_brotli.search(accept_encoding):
+            return super().process_response(request, response)
+
+        if not response.streaming and len(response.content) < 200:
+            return response
+        if response.has_header('Content-Encoding'):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if response.streaming:
+            response.streaming_content = compress_brotli_sequence(
+                response.streaming_content, self.brotli_quality
+            )
+            del response['Content-Length']
+        else:
+            compressed_content = brotli.compress(response.content, quality=self.brotli_quality)
+            if len(compressed_content) >= len(response.content):
+                return response
+            response.content = compressed_content
+            response['Content-Length'] = str(len(response.content))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = 'br'
+        return response
+
+
+class RequestTimingMiddleware:
+    """Query count, DB time and phase timings of a sample of requests.
+
+    The numbers are sent back in a `Server-Timing` header and logged to the
+    `api.timing` logger with the values under `extra['timing']`. Streaming
+    responses are logged after the last chunk, so the record includes the
+    queries made while streaming, which the header cannot.
+    `API_TIMING_SAMPLE_RATE` is the share of requests measured, 0 turns the
+    middleware off. Unsampled requests only pay for one random number.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not sampled():
+            return self.get_response(request)
+
+        timings = request.timings = RequestTimings()
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(timings))
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            stack.close()
+            raise
+
+        response['Server-Timing'] = timings.server_timing(timings.metrics())
+        if response.streaming:
+            # Streamed rows are queried while the body is sent, so keep counting
+            # and log once it is done. The header only covers the time before.
+            response.streaming_content = release_after(
+                response.streaming_content, lambda: self.finish(stack, request, response, timings)
+            )
+        else:
+            self.finish(stack, request, response, timings)
+        return response
+
+    def finish(self, stack, request, response, timings):
+        stack.close()
+        metrics = timings.metrics()
+        logger.info(
+            '%s %s %s %.1fms, %d queries in %.1fms',
+            request.method, request.get_full_path(), response.status_code,
+            metrics['total'], timings.queries, metrics['db'],
+            extra={'timing': dict(
+                metrics,
+                method=request.method,
+                path=request.path,
+                status=response.status_code,
+                queries=timings.queries,
+            )},
+        )
+
+
+class MetricsMiddleware:
+    """Record request count and latency per router basename and action.
+
+    The query count is recorded too for requests sampled by
+    `RequestTimingMiddleware`, which has to come after this middleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if metrics.prometheus_client is None:
+            return self.get_response(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        timings = get_timings(request)
+        metrics.observe_request(
+            request, response, time.perf_counter() - started,
+            queries=timings.queries if timings is not None else None,
+        )
+        return response
+
+
+def release_after(streaming_content, release):
+    try:
+        yield from streaming_content
+    finally:
+        release()
+
+
+class ReplicaRoutingMiddleware:
+    """Serve the reads of GET and HEAD requests to the API viewsets from a replica.
+
+    A replica from `DATABASE_REPLICAS` is picked per request with the
+    `DB_REPLICA_SELECTION` strategy and kept until the response, streaming
+    or not, is complete. Clients stay on the primary for
+    `DB_REPLICA_PIN_SECONDS` after their own writes. Every request stays on
+    it for `DB_REPLICA_LAG_SECONDS` after any change to the dataset, so a
+    lagging replica cannot fill the response cache with old rows.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        replicas.state.replica = None
+        response = self.get_response(request)
+        replica = getattr(request, 'db_replica', None)
+        if replica is not None:
+            def release():
+                replicas.state.replica = None
+                replicas.selector.release(replica)
+
+            if response.streaming:
+                response.streaming_content = release_after(response.streaming_content, release)
+            else:
+                release()
+        elif (request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400
+              and settings.DATABASE_REPLICAS):
+            response.set_cookie(
+                replicas.PIN_COOKIE, '1', max_age=settings.DB_REPLICA_PIN_SECONDS, httponly=True
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (settings.DATABASE_REPLICAS and request.method in ('GET', 'HEAD')
+                and getattr(view_func, 'actions', None) and not self.pinned(request)):
+            request.db_replica = replicas.state.replica = replicas.selector.acquire(
+                settings.DATABASE_REPLICAS, settings.DB_REPLICA_SELECTION
+            )
+
+    def pinned(self, request):
+        return bool(request.COOKIES.get(replicas.PIN_COOKIE)) or recently_changed()
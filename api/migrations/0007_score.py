@@ -0,0 +1,37 @@
+# Generated by Django 2.2.28 on 2026-10-18 14:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_subgroup_category'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Score',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('test_year', models.IntegerField()),
+                ('test_type', models.CharField(max_length=1)),
+                ('total_tested_at_entity', models.IntegerField(blank=True, null=True)),
+                ('total_tested_with_scores', models.IntegerField(blank=True, null=True)),
+                ('reported_enrollment', models.IntegerField(blank=True, null=True)),
+                ('students_tested', models.IntegerField(blank=True, null=True)),
+                ('students_with_scores', models.IntegerField(blank=True, null=True)),
+                ('mean_scale_score', models.DecimalField(blank=True, decimal_places=1, max_digits=6, null=True)),
+                ('pct_exceeded', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('pct_met', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('pct_met_and_above', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('pct_nearly_met', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('pct_not_met', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('entity', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='api.Entity')),
+                ('grade', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='api.Grade')),
+                ('subgroup', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='api.SubGroup', to_field='subgroup_id')),
+                ('test', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='api.Test', to_field='test_id')),
+            ],
+        ),
+    ]
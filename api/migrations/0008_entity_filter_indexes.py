@@ -0,0 +1,29 @@
+# Generated by Django 2.2.28 on 2026-10-18 14:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_score'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='entity',
+            index=models.Index(fields=['test_year', 'county_code', 'district_code', 'school_code'], name='entity_year_cds_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='entity',
+            index=models.Index(fields=['county_code', 'district_code', 'school_code'], name='entity_cds_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='entity',
+            index=models.Index(fields=['zipcode', 'test_year'], name='entity_zipcode_year_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='entity',
+            index=models.Index(fields=['entity_type', 'test_year'], name='entity_type_year_idx'),
+        ),
+    ]
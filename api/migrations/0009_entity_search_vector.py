@@ -0,0 +1,49 @@
+# Generated by Django 2.2.28 on 2026-10-18 14:41
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+SEARCH_VECTOR_TRIGGER = '''
+CREATE FUNCTION api_entity_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('simple', coalesce(NEW.school_name, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(NEW.district_name, '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce(NEW.county_name, '')), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER api_entity_search_vector
+    BEFORE INSERT OR UPDATE ON api_entity
+    FOR EACH ROW EXECUTE PROCEDURE api_entity_search_vector_update();
+
+-- Fire the trigger once for every existing row to backfill the column.
+UPDATE api_entity SET search_vector = NULL;
+'''
+
+DROP_SEARCH_VECTOR_TRIGGER = '''
+DROP TRIGGER api_entity_search_vector ON api_entity;
+DROP FUNCTION api_entity_search_vector_update();
+'''
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_entity_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='entity',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='entity',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='entity_search_idx'),
+        ),
+        migrations.RunSQL(SEARCH_VECTOR_TRIGGER, DROP_SEARCH_VECTOR_TRIGGER),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 2.2.28 on 2026-10-18 14:47
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def create_version_row(apps, schema_editor):
+    DatasetVersion = apps.get_model('api', 'DatasetVersion')
+    DatasetVersion.objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_entity_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DatasetVersion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('modified', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RunPython(create_version_row, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 2.2.28 on 2026-10-18 14:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_datasetversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupState',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('test_year', models.IntegerField(unique=True)),
+                ('source_rows', models.BigIntegerField()),
+                ('source_max_id', models.BigIntegerField()),
+                ('refreshed', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProficiencyRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('test_year', models.IntegerField()),
+                ('level', models.CharField(choices=[('state', 'State'), ('county', 'County'), ('district', 'District'), ('school', 'School')], max_length=8)),
+                ('county_code', models.CharField(max_length=2)),
+                ('district_code', models.CharField(max_length=5)),
+                ('school_code', models.CharField(max_length=7)),
+                ('schools', models.IntegerField()),
+                ('students_with_scores', models.IntegerField()),
+                ('students_exceeded', models.IntegerField()),
+                ('students_met_and_above', models.IntegerField()),
+                ('pct_exceeded', models.DecimalField(decimal_places=2, max_digits=5, null=True)),
+                ('pct_met_and_above', models.DecimalField(decimal_places=2, max_digits=5, null=True)),
+                ('grade', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.Grade')),
+                ('subgroup', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.SubGroup', to_field='subgroup_id')),
+                ('test', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.Test', to_field='test_id')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='proficiencyrollup',
+            index=models.Index(fields=['test_year', 'level', 'test', 'grade', 'subgroup'], name='rollup_level_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='proficiencyrollup',
+            unique_together={('test_year', 'county_code', 'district_code', 'school_code', 'test', 'grade', 'subgroup')},
+        ),
+    ]
@@ -0,0 +1,91 @@
+import re
+from django.db import migrations, models
+import django.db.models.deletion
+
+PARTITIONED_TABLES = ('api_entity', 'api_score')
+
+
+def rebuild(schema_editor, table, partitioned):
+    """Recreate `table` as a LIST partitioned (or plain) table, keeping its data.
+
+    The indexes, constraints and triggers of the old table are read from the
+    catalog and recreated on the new one under the same names, so later
+    migrations can still find them. A partitioned table's primary key has to
+    include the partition key, so it becomes (id, test_year).
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+        sequence = cursor.fetchone()[0]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype IN ('c', 'f', 'u') "
+            "AND (conparentid = 0 OR conparentid IS NULL)",
+            [table],
+        )
+        constraints = cursor.fetchall()
+        cursor.execute(
+            "SELECT indexdef FROM pg_indexes WHERE tablename = %s AND indexname NOT IN ("
+            "SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass)",
+            [table, table],
+        )
+        indexes = [re.sub(r' ON (ONLY )?\S+ USING ', ' ON {} USING '.format(table), row[0])
+                   for row in cursor.fetchall()]
+        cursor.execute(
+            "SELECT pg_get_triggerdef(oid) FROM pg_trigger "
+            "WHERE tgrelid = %s::regclass AND NOT tgisinternal AND tgparentid = 0",
+            [table],
+        )
+        triggers = [row[0] for row in cursor.fetchall()]
+        cursor.execute('SELECT DISTINCT test_year FROM {}'.format(table))
+        years = sorted(row[0] for row in cursor.fetchall())
+
+    old = '{}_unpartitioned'.format(table)
+    schema_editor.execute('ALTER TABLE {} RENAME TO {}'.format(table, old))
+    schema_editor.execute('CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS){}'.format(
+        table, old, ' PARTITION BY LIST (test_year)' if partitioned else ''
+    ))
+    if partitioned:
+        for year in years:
+            schema_editor.execute(
+                'CREATE TABLE {0}_{1} PARTITION OF {0} FOR VALUES IN ({1})'.format(table, year)
+            )
+        schema_editor.execute('CREATE TABLE {0}_default PARTITION OF {0} DEFAULT'.format(table))
+    schema_editor.execute('INSERT INTO {} SELECT * FROM {}'.format(table, old))
+    schema_editor.execute('ALTER SEQUENCE {} OWNED BY {}.id'.format(sequence, table))
+    schema_editor.execute('DROP TABLE {}'.format(old))
+
+    schema_editor.execute('ALTER TABLE {0} ADD CONSTRAINT {0}_pkey PRIMARY KEY ({1})'.format(
+        table, 'id, test_year' if partitioned else 'id'
+    ))
+    for name, definition in constraints:
+        schema_editor.execute('ALTER TABLE {} ADD CONSTRAINT {} {}'.format(table, name, definition))
+    for statement in indexes + triggers:
+        schema_editor.execute(statement)
+
+
+def partition_tables(apps, schema_editor):
+    for table in PARTITIONED_TABLES:
+        rebuild(schema_editor, table, partitioned=True)
+
+
+def unpartition_tables(apps, schema_editor):
+    for table in PARTITIONED_TABLES:
+        rebuild(schema_editor, table, partitioned=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_proficiency_rollups'),
+    ]
+
+    operations = [
+        # A foreign key to a partitioned table has to reference the whole
+        # partition key, so Score.entity is no longer enforced by the database.
+        migrations.AlterField(
+            model_name='score',
+            name='entity',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.PROTECT, to='api.Entity'),
+        ),
+        migrations.RunPython(partition_tables, unpartition_tables),
+    ]
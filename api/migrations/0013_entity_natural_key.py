@@ -0,0 +1,21 @@
+# Generated by Django 2.2.28 on 2026-10-18 14:57
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_partition_by_test_year'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='entity',
+            unique_together={('test_year', 'county_code', 'district_code', 'school_code')},
+        ),
+        migrations.RemoveIndex(
+            model_name='entity',
+            name='entity_year_cds_idx',
+        ),
+    ]
@@ -0,0 +1,236 @@
+# Generated by Django 2.2.28 on 2026-10-18 15:33
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Statement level triggers see every row a statement wrote at once in the
+# transition tables, so a bulk insert of a year is synced with a handful of
+# set based statements. Parent ids are recomputed for the written rows and for
+# the rows of every county whose county or district entities changed.
+#
+# The parent ids are looked up under a transaction level advisory lock per
+# test year. A write waits for the other writers of its years to commit, and
+# its lookup then sees their rows, so concurrent loads into one county cannot
+# each miss the parents the other one inserted.
+ENTITY_READ_TRIGGERS = '''
+CREATE FUNCTION api_entityread_lock(test_years integer[]) RETURNS void AS $$
+DECLARE
+    locked_year integer;
+BEGIN
+    -- Always in the same order, so writers of several years cannot deadlock.
+    FOR locked_year IN SELECT DISTINCT unnest(test_years) ORDER BY 1 LOOP
+        PERFORM pg_advisory_xact_lock(hashtext('api_entityread'), locked_year);
+    END LOOP;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION api_entityread_sync() RETURNS trigger AS $$
+DECLARE
+    ids integer[] := '{}';
+    years integer[] := '{}';
+    counties text[] := '{}';
+    written_years integer[] := '{}';
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        DELETE FROM api_entityread WHERE id IN (SELECT id FROM old_rows);
+        SELECT COALESCE(array_agg(DISTINCT test_year), '{}') INTO written_years FROM old_rows;
+        SELECT
+            COALESCE(array_agg(test_year), '{}'),
+            COALESCE(array_agg(county_code), '{}')
+        INTO years, counties
+        FROM old_rows WHERE school_code = '0000000';
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        INSERT INTO api_entityread (
+            id, county_code, district_code, school_code, test_year, entity_type_id,
+            county_name, district_name, school_name, zipcode, search_vector,
+            cds_code, name, entity_type_description
+        )
+        SELECT
+            e.id, e.county_code, e.district_code, e.school_code, e.test_year, e.entity_type_id,
+            e.county_name, e.district_name, e.school_name, e.zipcode, e.search_vector,
+            e.county_code || e.district_code || e.school_code,
+            COALESCE(NULLIF(e.school_name, ''), NULLIF(e.district_name, ''), e.county_name),
+            t.description
+        FROM new_rows e
+        JOIN api_type t ON t.type_id = e.entity_type_id;
+        SELECT
+            COALESCE(array_agg(id), '{}'),
+            written_years || COALESCE(array_agg(DISTINCT test_year), '{}')
+        INTO ids, written_years
+        FROM new_rows;
+        SELECT
+            years || COALESCE(array_agg(test_year), '{}'),
+            counties || COALESCE(array_agg(county_code), '{}')
+        INTO years, counties
+        FROM new_rows WHERE school_code = '0000000';
+    END IF;
+
+    PERFORM api_entityread_lock(written_years);
+    WITH affected AS (
+        SELECT unnest(ids) AS id
+        UNION
+        SELECT r.id FROM api_entityread r
+        JOIN unnest(years, counties) AS p (test_year, county_code)
+            ON r.test_year = p.test_year AND r.county_code = p.county_code
+    )
+    UPDATE api_entityread r SET
+        district_id = CASE WHEN r.school_code <> '0000000' AND r.district_code <> '00000' THEN (
+            SELECT d.id FROM api_entity d
+            WHERE d.test_year = r.test_year AND d.county_code = r.county_code
+              AND d.district_code = r.district_code AND d.school_code = '0000000'
+        ) END,
+        county_id = CASE WHEN r.county_code <> '00'
+                          AND NOT (r.district_code = '00000' AND r.school_code = '0000000') THEN (
+            SELECT c.id FROM api_entity c
+            WHERE c.test_year = r.test_year AND c.county_code = r.county_code
+              AND c.district_code = '00000' AND c.school_code = '0000000'
+        ) END
+    FROM affected
+    WHERE r.id = affected.id;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER api_entityread_insert
+    AFTER INSERT ON api_entity REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE PROCEDURE api_entityread_sync();
+CREATE TRIGGER api_entityread_update
+    AFTER UPDATE ON api_entity REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE PROCEDURE api_entityread_sync();
+CREATE TRIGGER api_entityread_delete
+    AFTER DELETE ON api_entity REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE PROCEDURE api_entityread_sync();
+
+CREATE FUNCTION api_entityread_truncate() RETURNS trigger AS $$
+BEGIN
+    DELETE FROM api_entityread;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER api_entityread_truncate
+    AFTER TRUNCATE ON api_entity
+    FOR EACH STATEMENT EXECUTE PROCEDURE api_entityread_truncate();
+
+CREATE FUNCTION api_entityread_type_sync() RETURNS trigger AS $$
+BEGIN
+    UPDATE api_entityread SET entity_type_description = NEW.description
+    WHERE entity_type_id = NEW.type_id;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER api_entityread_type
+    AFTER UPDATE OF description ON api_type
+    FOR EACH ROW EXECUTE PROCEDURE api_entityread_type_sync();
+
+-- Rebuilds the rows of one test year, or of every year when it is NULL,
+-- with one insert and one parent id update, e.g. after attaching an archived
+-- partition again.
+CREATE FUNCTION api_entityread_refresh(refresh_year integer) RETURNS void AS $$
+BEGIN
+    PERFORM api_entityread_lock(array_agg(test_year))
+    FROM api_entity WHERE refresh_year IS NULL OR test_year = refresh_year;
+    DELETE FROM api_entityread WHERE refresh_year IS NULL OR test_year = refresh_year;
+    INSERT INTO api_entityread (
+        id, county_code, district_code, school_code, test_year, entity_type_id,
+        county_name, district_name, school_name, zipcode, search_vector,
+        cds_code, name, entity_type_description
+    )
+    SELECT
+        e.id, e.county_code, e.district_code, e.school_code, e.test_year, e.entity_type_id,
+        e.county_name, e.district_name, e.school_name, e.zipcode, e.search_vector,
+        e.county_code || e.district_code || e.school_code,
+        COALESCE(NULLIF(e.school_name, ''), NULLIF(e.district_name, ''), e.county_name),
+        t.description
+    FROM api_entity e
+    JOIN api_type t ON t.type_id = e.entity_type_id
+    WHERE refresh_year IS NULL OR e.test_year = refresh_year;
+
+    UPDATE api_entityread r SET
+        district_id = CASE WHEN r.school_code <> '0000000' AND r.district_code <> '00000' THEN (
+            SELECT d.id FROM api_entity d
+            WHERE d.test_year = r.test_year AND d.county_code = r.county_code
+              AND d.district_code = r.district_code AND d.school_code = '0000000'
+        ) END,
+        county_id = CASE WHEN r.county_code <> '00'
+                          AND NOT (r.district_code = '00000' AND r.school_code = '0000000') THEN (
+            SELECT c.id FROM api_entity c
+            WHERE c.test_year = r.test_year AND c.county_code = r.county_code
+              AND c.district_code = '00000' AND c.school_code = '0000000'
+        ) END
+    WHERE refresh_year IS NULL OR r.test_year = refresh_year;
+END
+$$ LANGUAGE plpgsql;
+
+SELECT api_entityread_refresh(NULL);
+'''
+
+DROP_ENTITY_READ_TRIGGERS = '''
+DROP TRIGGER api_entityread_type ON api_type;
+DROP TRIGGER api_entityread_truncate ON api_entity;
+DROP TRIGGER api_entityread_delete ON api_entity;
+DROP TRIGGER api_entityread_update ON api_entity;
+DROP TRIGGER api_entityread_insert ON api_entity;
+DROP FUNCTION api_entityread_type_sync();
+DROP FUNCTION api_entityread_truncate();
+DROP FUNCTION api_entityread_refresh(integer);
+DROP FUNCTION api_entityread_sync();
+DROP FUNCTION api_entityread_lock(integer[]);
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_entity_natural_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EntityRead',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('county_code', models.CharField(max_length=2)),
+                ('district_code', models.CharField(max_length=5)),
+                ('school_code', models.CharField(max_length=7)),
+                ('test_year', models.IntegerField()),
+                ('county_name', models.CharField(max_length=200)),
+                ('district_name', models.CharField(blank=True, max_length=1000)),
+                ('school_name', models.CharField(blank=True, max_length=1000)),
+                ('zipcode', models.CharField(blank=True, max_length=12)),
+                ('search_vector', django.contrib.postgres.search.SearchVectorField(null=True)),
+                ('cds_code', models.CharField(max_length=14)),
+                ('name', models.CharField(max_length=1000)),
+                ('entity_type_description', models.CharField(max_length=30)),
+                ('county', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='api.Entity')),
+                ('district', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='api.Entity')),
+                ('entity_type', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='api.Type', to_field='type_id')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='entityread',
+            index=models.Index(fields=['county_code', 'district_code', 'school_code'], name='entityread_cds_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='entityread',
+            index=models.Index(fields=['zipcode', 'test_year'], name='entityread_zipcode_year_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='entityread',
+            index=models.Index(fields=['entity_type', 'test_year'], name='entityread_type_year_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='entityread',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='entityread_search_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='entityread',
+            unique_together={('test_year', 'county_code', 'district_code', 'school_code')},
+        ),
+        migrations.RunSQL(ENTITY_READ_TRIGGERS, DROP_ENTITY_READ_TRIGGERS),
+    ]
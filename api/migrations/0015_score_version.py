@@ -0,0 +1,93 @@
+from django.db import migrations, models
+
+
+# One statement level trigger per operation bumps the version of every test
+# year the statement wrote, so in place updates make rollups stale as well as
+# inserts and deletes. Years are bumped in order, so writers of several years
+# cannot deadlock on the counter rows.
+SCORE_VERSION_TRIGGERS = '''
+CREATE FUNCTION api_scoreversion_bump() RETURNS trigger AS $$
+DECLARE
+    years integer[] := '{}';
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        SELECT COALESCE(array_agg(DISTINCT test_year), '{}') INTO years FROM old_rows;
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        SELECT years || COALESCE(array_agg(DISTINCT test_year), '{}') INTO years FROM new_rows;
+    END IF;
+    INSERT INTO api_scoreversion (test_year, version)
+    SELECT DISTINCT test_year, 1 FROM unnest(years) AS test_year ORDER BY test_year
+    ON CONFLICT (test_year) DO UPDATE SET version = api_scoreversion.version + 1;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER api_scoreversion_insert
+    AFTER INSERT ON api_score REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE PROCEDURE api_scoreversion_bump();
+CREATE TRIGGER api_scoreversion_update
+    AFTER UPDATE ON api_score REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE PROCEDURE api_scoreversion_bump();
+CREATE TRIGGER api_scoreversion_delete
+    AFTER DELETE ON api_score REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE PROCEDURE api_scoreversion_bump();
+
+CREATE FUNCTION api_scoreversion_truncate() RETURNS trigger AS $$
+BEGIN
+    DELETE FROM api_scoreversion;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER api_scoreversion_truncate
+    AFTER TRUNCATE ON api_score
+    FOR EACH STATEMENT EXECUTE PROCEDURE api_scoreversion_truncate();
+
+-- Existing rollups were built from an unknown version, so every year is
+-- rebuilt by the next refresh.
+INSERT INTO api_scoreversion (test_year, version)
+SELECT DISTINCT test_year, 1 FROM api_score;
+'''
+
+DROP_SCORE_VERSION_TRIGGERS = '''
+DROP TRIGGER api_scoreversion_truncate ON api_score;
+DROP TRIGGER api_scoreversion_delete ON api_score;
+DROP TRIGGER api_scoreversion_update ON api_score;
+DROP TRIGGER api_scoreversion_insert ON api_score;
+DROP FUNCTION api_scoreversion_truncate();
+DROP FUNCTION api_scoreversion_bump();
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_entity_read_model'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScoreVersion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('test_year', models.IntegerField(unique=True)),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RemoveField(
+            model_name='rollupstate',
+            name='source_max_id',
+        ),
+        migrations.RemoveField(
+            model_name='rollupstate',
+            name='source_rows',
+        ),
+        migrations.AddField(
+            model_name='rollupstate',
+            name='source_version',
+            field=models.BigIntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.RunSQL(SCORE_VERSION_TRIGGERS, DROP_SCORE_VERSION_TRIGGERS),
+    ]
@@ -0,0 +1,257 @@
+from django.db import transaction
+from django.shortcuts import get_object_or_404
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import JSONParser
+from rest_framework.permissions import BasePermission
+from rest_framework.response import Response
+from rest_framework.serializers import as_serializer_error
+from rest_framework.validators import UniqueTogetherValidator, UniqueValidator
+from api.dataset import bump_dataset_version, dataset_etag, dataset_last_modified
+from api.parsers import NDJSONParser
+from api.serializers import ValuesSerializer
+from api.timing import get_timings, timed
+
+
+class ValuesReadMixin:
+    """Serve list and retrieve from `values()` rows through `ValuesSerializer`.
+
+    Writes still go through the regular `serializer_class`.
+    """
+
+    def get_values_serializer(self):
+        return ValuesSerializer(self.get_serializer())
+
+    def object_permissions_apply(self):
+        """Whether any permission class overrides `has_object_permission()`."""
+        return any(
+            type(permission).has_object_permission is not BasePermission.has_object_permission
+            for permission in self.get_permissions()
+        )
+
+    def check_row_permissions(self, request, row):
+        """`check_object_permissions()` for a `values()` row.
+
+        Object level permissions get the model instance, read again by primary
+        key, since they may look at any attribute. Without any the row is not
+        looked up again.
+        """
+        if self.object_permissions_apply():
+            pk = self.get_queryset().model._meta.pk
+            self.check_object_permissions(request, self.get_queryset().get(pk=row[pk.attname]))
+
+    def list(self, request, *args, **kwargs):
+        serializer = self.get_values_serializer()
+        queryset = serializer.values(self.filter_queryset(self.get_queryset()))
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            with timed(request, 'serialize'):
+                data = serializer.represent(page)
+            return self.get_paginated_response(data)
+        with timed(request, 'serialize'):
+            data = serializer.represent(queryset)
+        return Response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        serializer = self.get_values_serializer()
+        queryset = serializer.values(self.filter_queryset(self.get_queryset()))
+
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        row = get_object_or_404(
+            queryset, **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        )
+        self.check_row_permissions(request, row)
+        with timed(request, 'serialize'):
+            data = serializer.to_representation(row)
+        return Response(data)
+
+
+class ReadModelMixin:
+    """Serve list, retrieve and other `read_actions` from a denormalized read model.
+
+    `read_queryset` and `read_serializer_class` take the place of `queryset`
+    and `serializer_class` for those actions. Writes and the other actions
+    keep using the regular model.
+    """
+    read_actions = ('list', 'retrieve')
+    read_queryset = None
+    read_serializer_class = None
+
+    def get_queryset(self):
+        if self.action in self.read_actions:
+            return self.read_queryset.all()
+        return super().get_queryset()
+
+    def get_serializer_class(self):
+        if self.action in self.read_actions:
+            return self.read_serializer_class
+        return super().get_serializer_class()
+
+
+class TimingMixin:
+    """Mark where the view starts and rendering begins and ends.
+
+    Adds `view` and `render` to the timings of requests sampled by
+    `RequestTimingMiddleware`.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        timings = get_timings(request)
+        if timings is not None:
+            timings.start_view()
+        super().initial(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        timings = get_timings(request)
+        if timings is not None:
+            timings.finish_view()
+            if hasattr(response, 'add_post_render_callback') and not response.is_rendered:
+                response.add_post_render_callback(timings.finish_render)
+        return response
+
+
+class ConditionalGetMixin:
+    """Strong ETag and Last-Modified headers derived from the dataset version.
+
+    `If-None-Match` and `If-Modified-Since` are answered with 304 before the
+    view runs, so an unchanged dataset is never queried or serialized.
+    """
+
+    @method_decorator(condition(etag_func=dataset_etag, last_modified_func=dataset_last_modified))
+    def dispatch(self, request, *args, **kwargs):
+        return super().dispatch(request, *args, **kwargs)
+
+
+class BulkWriteMixin:
+    """`POST <list url>/bulk/` creating and updating many rows in one request.
+
+    The body is a JSON array or NDJSON, one object per row. Rows with an `id`
+    update that row and the others are created. Every row is validated first,
+    uniqueness is checked with one query per unique constraint instead of one
+    per row, and nothing is written unless every row is valid. The writes use
+    bulk_create/bulk_update inside a single transaction.
+    """
+    bulk_max_rows = 50000
+    bulk_batch_size = 1000
+
+    @action(detail=False, methods=['post'], parser_classes=(JSONParser, NDJSONParser))
+    def bulk(self, request):
+        rows = request.data
+        if not isinstance(rows, list):
+            return Response(
+                {'detail': 'Expected a list of objects.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(rows) > self.bulk_max_rows:
+            return Response(
+                {'detail': 'At most {} rows per request.'.format(self.bulk_max_rows)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        model = self.get_queryset().model
+        ids = [row['id'] for row in rows if isinstance(row, dict) and row.get('id') is not None]
+        existing = {str(pk): instance for pk, instance in model.objects.in_bulk(
+            [pk for pk in ids if str(pk).isdigit()]
+        ).items()}
+        serializer = self.get_bulk_serializer()
+        instances, errors, update_fields = [], [], set()
+        for index, row in enumerate(rows):
+            instance, row_errors = self.build_bulk_instance(
+                serializer, row, existing, update_fields
+            )
+            if row_errors:
+                errors.append({'index': index, 'errors': row_errors})
+            else:
+                instances.append((index, instance))
+        errors.extend(self.check_bulk_uniqueness(model, instances))
+        if errors:
+            errors.sort(key=lambda error: error['index'])
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        created = [instance for _, instance in instances if instance.pk is None]
+        updated = [instance for _, instance in instances if instance.pk is not None]
+        with transaction.atomic():
+            model.objects.bulk_create(created, batch_size=self.bulk_batch_size)
+            if updated:
+                model.objects.bulk_update(
+                    updated, sorted(update_fields), batch_size=self.bulk_batch_size
+                )
+            bump_dataset_version()
+        return Response({'created': len(created), 'updated': len(updated)})
+
+    def get_bulk_serializer(self):
+        """One serializer shared by every row, without per-row unique checks.
+
+        Building the fields and validators is most of the cost of a serializer,
+        so rows are validated with `run_validation` on this single instance.
+        """
+        serializer = self.get_serializer()
+        serializer.validators = [
+            validator for validator in serializer.validators
+            if not isinstance(validator, UniqueTogetherValidator)
+        ]
+        for field in serializer.fields.values():
+            field.validators = [
+                validator for validator in field.validators
+                if not isinstance(validator, UniqueValidator)
+            ]
+        return serializer
+
+    def build_bulk_instance(self, serializer, row, existing, update_fields):
+        if not isinstance(row, dict):
+            return None, {'non_field_errors': ['Expected an object.']}
+        instance = None
+        if row.get('id') is not None:
+            instance = existing.get(str(row['id']))
+            if instance is None:
+                return None, {'id': ['Not found.']}
+
+        try:
+            validated_data = serializer.run_validation(row)
+        except ValidationError as exc:
+            return None, as_serializer_error(exc)
+
+        if instance is None:
+            instance = serializer.Meta.model(**validated_data)
+        else:
+            for name, value in validated_data.items():
+                setattr(instance, name, value)
+            update_fields.update(validated_data)
+        return instance, None
+
+    def check_bulk_uniqueness(self, model, instances):
+        """Errors for rows clashing with each other or with stored rows."""
+        opts = model._meta
+        constraints = [(field.name,) for field in opts.concrete_fields
+                       if field.unique and not field.primary_key]
+        constraints.extend(tuple(names) for names in opts.unique_together)
+
+        errors = []
+        for names in constraints:
+            columns = [opts.get_field(name).attname for name in names]
+
+            def key(obj):
+                return tuple(getattr(obj, column) for column in columns)
+
+            pending = {}
+            for index, instance in instances:
+                pending.setdefault(key(instance), []).append((index, instance))
+            stored = model.objects.filter(**{
+                '{}__in'.format(columns[0]): {values[0] for values in pending}
+            }).values_list('pk', *columns)
+            taken = {tuple(row[1:]): row[0] for row in stored}
+
+            message = '{} with this {} already exists.'.format(
+                opts.verbose_name.capitalize(), ', '.join(names)
+            )
+            for values, clashing in pending.items():
+                owner = taken.get(values)
+                for index, instance in clashing:
+                    if len(clashing) > 1 or owner not in (None, instance.pk):
+                        errors.append({'index': index, 'errors': {'non_field_errors': [message]}})
+        return errors
@@ -1,5 +1,8 @@
 from django.db import models
 from django.contrib import admin
+from django.utils import timezone
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 
 
 class Entity(models.Model):
@@ -13,6 +16,8 @@ class Entity(models.Model):
     district_name = models.CharField(max_length=1000, blank=True)
     school_name = models.CharField(max_length=1000, blank=True)
     zipcode = models.CharField(max_length=12, blank=True)
+    # Maintained by the api_entity_search_vector trigger (see migration 0009).
+    search_vector = SearchVectorField(null=True, editable=False)
 
     def __str__(self):
         if self.school_name:
@@ -28,8 +33,79 @@ class Entity(models.Model):
             name
         )
 
+    def delete(self, *args, **kwargs):
+        # Entity has no post_delete receiver (see api.signals), so queryset
+        # deletes of a whole year do not bump the dataset version per row.
+        from api.dataset import bump_dataset_version
+        deleted = super().delete(*args, **kwargs)
+        bump_dataset_version()
+        return deleted
+
     class Meta:
         verbose_name_plural = 'entities'
+        # Also the index behind the entities/<year>/<cds code>/ lookup.
+        unique_together = ('test_year', 'county_code', 'district_code', 'school_code')
+        indexes = [
+            models.Index(
+                fields=['county_code', 'district_code', 'school_code'],
+                name='entity_cds_idx',
+            ),
+            models.Index(fields=['zipcode', 'test_year'], name='entity_zipcode_year_idx'),
+            models.Index(fields=['entity_type', 'test_year'], name='entity_type_year_idx'),
+            GinIndex(fields=['search_vector'], name='entity_search_idx'),
+        ]
+
+
+class EntityRead(models.Model):
+    """Serializer-ready copy of an `Entity`, read by the entity list and detail endpoints.
+
+    Rows are kept in sync by statement level triggers on api_entity and
+    api_type (see migration 0014), so every way of writing entities, bulk
+    inserts included, updates them. `name` follows the fallback of
+    `Entity.__str__`, and `district` and `county` point to the entities of the
+    same year the row belongs to.
+    """
+    id = models.IntegerField(primary_key=True)
+    county_code = models.CharField(max_length=2)
+    district_code = models.CharField(max_length=5)
+    school_code = models.CharField(max_length=7)
+    test_year = models.IntegerField()
+    entity_type = models.ForeignKey(
+        'Type', on_delete=models.DO_NOTHING, to_field='type_id', db_constraint=False,
+        related_name='+',
+    )
+    county_name = models.CharField(max_length=200)
+    district_name = models.CharField(max_length=1000, blank=True)
+    school_name = models.CharField(max_length=1000, blank=True)
+    zipcode = models.CharField(max_length=12, blank=True)
+    search_vector = SearchVectorField(null=True)
+    cds_code = models.CharField(max_length=14)
+    name = models.CharField(max_length=1000)
+    entity_type_description = models.CharField(max_length=30)
+    district = models.ForeignKey(
+        'Entity', null=True, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+'
+    )
+    county = models.ForeignKey(
+        'Entity', null=True, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+'
+    )
+
+    def __str__(self):
+        return '{}-{}-{} {}'.format(
+            self.county_code, self.district_code, self.school_code, self.name
+        )
+
+    class Meta:
+        unique_together = ('test_year', 'county_code', 'district_code', 'school_code')
+        indexes = [
+            models.Index(
+                fields=['county_code', 'district_code', 'school_code'],
+                name='entityread_cds_idx',
+            ),
+            models.Index(fields=['zipcode', 'test_year'], name='entityread_zipcode_year_idx'),
+            models.Index(fields=['entity_type', 'test_year'], name='entityread_type_year_idx'),
+            GinIndex(fields=['search_vector'], name='entityread_search_idx'),
+        ]
+
 
 class Type(models.Model):
     type_id = models.IntegerField(unique=True)
@@ -64,6 +140,117 @@ class SubGroup(models.Model):
         return self.description
 
 
+class Score(models.Model):
+    # Entity and Score are partitioned by test_year (see migration 0012 and
+    # api.partitions), so this reference is not enforced by the database.
+    entity = models.ForeignKey('Entity', on_delete=models.PROTECT, db_constraint=False)
+    test = models.ForeignKey('Test', on_delete=models.PROTECT, to_field='test_id')
+    grade = models.ForeignKey('Grade', on_delete=models.PROTECT)
+    subgroup = models.ForeignKey('SubGroup', on_delete=models.PROTECT, to_field='subgroup_id')
+    test_year = models.IntegerField()
+    test_type = models.CharField(max_length=1)
+    total_tested_at_entity = models.IntegerField(null=True, blank=True)
+    total_tested_with_scores = models.IntegerField(null=True, blank=True)
+    reported_enrollment = models.IntegerField(null=True, blank=True)
+    students_tested = models.IntegerField(null=True, blank=True)
+    students_with_scores = models.IntegerField(null=True, blank=True)
+    mean_scale_score = models.DecimalField(max_digits=6, decimal_places=1, null=True, blank=True)
+    pct_exceeded = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    pct_met = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    pct_met_and_above = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    pct_nearly_met = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    pct_not_met = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+
+    def __str__(self):
+        return '{} {} {} {}'.format(self.entity, self.test, self.grade, self.subgroup)
+
+
+class ProficiencyRollup(models.Model):
+    """Percent met/exceeded aggregated from school level scores.
+
+    Rows are rebuilt per test year by the refresh_rollups command. The level
+    follows from the codes: district rows have school code 0000000, county
+    rows also have district code 00000 and the state row has county code 00.
+    """
+    LEVELS = (
+        ('state', 'State'),
+        ('county', 'County'),
+        ('district', 'District'),
+        ('school', 'School'),
+    )
+
+    test_year = models.IntegerField()
+    level = models.CharField(max_length=8, choices=LEVELS)
+    county_code = models.CharField(max_length=2)
+    district_code = models.CharField(max_length=5)
+    school_code = models.CharField(max_length=7)
+    test = models.ForeignKey('Test', on_delete=models.CASCADE, to_field='test_id')
+    grade = models.ForeignKey('Grade', on_delete=models.CASCADE)
+    subgroup = models.ForeignKey('SubGroup', on_delete=models.CASCADE, to_field='subgroup_id')
+    schools = models.IntegerField()
+    students_with_scores = models.IntegerField()
+    students_exceeded = models.IntegerField()
+    students_met_and_above = models.IntegerField()
+    pct_exceeded = models.DecimalField(max_digits=5, decimal_places=2, null=True)
+    pct_met_and_above = models.DecimalField(max_digits=5, decimal_places=2, null=True)
+
+    def __str__(self):
+        return '{}-{}-{} {} {} {} {}'.format(
+            self.county_code,
+            self.district_code,
+            self.school_code,
+            self.test_year,
+            self.test_id,
+            self.grade_id,
+            self.subgroup_id,
+        )
+
+    class Meta:
+        unique_together = (
+            'test_year', 'county_code', 'district_code', 'school_code',
+            'test', 'grade', 'subgroup',
+        )
+        indexes = [
+            models.Index(
+                fields=['test_year', 'level', 'test', 'grade', 'subgroup'],
+                name='rollup_level_idx',
+            ),
+        ]
+
+
+class ScoreVersion(models.Model):
+    """Per test year counter bumped by a trigger on every write to scores.
+
+    Inserts, updates and deletes all bump it (migration 0015), so rollups
+    built from an older version are stale, see api.rollups.
+    """
+    test_year = models.IntegerField(unique=True)
+    version = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return '{} v{}'.format(self.test_year, self.version)
+
+
+class RollupState(models.Model):
+    """Score version a test year's rollups were last built from."""
+    test_year = models.IntegerField(unique=True)
+    source_version = models.BigIntegerField()
+    refreshed = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return '{} (v{})'.format(self.test_year, self.source_version)
+
+
+class DatasetVersion(models.Model):
+    """Single row bumped on every write to the API tables, see api.dataset."""
+    version = models.PositiveIntegerField(default=0)
+    modified = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return 'v{} ({})'.format(self.version, self.modified)
+
+
 class SubGroupAdmin(admin.ModelAdmin):
     list_display = ('__str__', 'category')
     list_filter = ('category',)
+
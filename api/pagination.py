@@ -0,0 +1,171 @@
+import hashlib
+from collections import OrderedDict
+from django.conf import settings
+from django.core.exceptions import EmptyResultSet
+from django.db import connections
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from api.dataset import dataset_token, get_cache
+
+
+class KeysetPagination(CursorPagination):
+    """Cursor pagination on the primary key.
+
+    Pages are fetched with `WHERE id > <cursor> ORDER BY id LIMIT n`, so a deep
+    page costs the same as the first one and no COUNT(*) is issued. Any other
+    ordering, such as search ranking, is replaced by primary key order.
+    """
+    ordering = 'id'
+    page_size_query_param = 'limit'
+    max_page_size = 1000
+
+
+class DefaultPagination(LimitOffsetPagination):
+    """Limit/offset pagination with opt-in keyset pagination.
+
+    Requests with `?pagination=keyset` or a `?cursor=` parameter are handed to
+    `KeysetPagination`. Viewsets can also opt in for every request by setting
+    `pagination_class = KeysetPagination`.
+
+    The count of a filter is cached per dataset version, so paging through it
+    runs COUNT(*) once. When the planner expects at least
+    API_COUNT_ESTIMATE_THRESHOLD rows the planner's estimate is used instead
+    and the page has `"count_estimated": true`. `?count=false` leaves the count
+    out. Without an exact count the page fetches one row more than the limit
+    to tell whether there is a next page.
+    """
+    mode_query_param = 'pagination'
+    count_query_param = 'count'
+    keyset_class = KeysetPagination
+    keyset = None
+    # 'exact', 'estimated' or 'skipped'.
+    count_mode = 'exact'
+    count_key = None
+    has_next = False
+
+    def use_keyset(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == 'keyset'
+            or self.keyset_class.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_keyset(request):
+            self.keyset = self.keyset_class()
+            results = self.keyset.paginate_queryset(queryset, request, view)
+            self.display_page_controls = self.keyset.display_page_controls
+            return results
+
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+        self.offset = self.get_offset(request)
+        self.request = request
+        self.count = self.lookup_count(queryset)
+        if self.count is None and self.count_mode == 'exact':
+            self.count = self.store_count(queryset.count())
+        if self.page_is_empty():
+            return []
+        return self.trim_page(list(queryset[self.offset:self.page_stop()]))
+
+    def lookup_count(self, queryset):
+        """Return the count of `queryset` if it is known without COUNT(*).
+
+        Sets `count_mode`. None in 'exact' mode means COUNT(*) has to run and
+        its result be passed to `store_count()`.
+        """
+        if self.request.query_params.get(self.count_query_param) == 'false':
+            self.count_mode = 'skipped'
+            return None
+        try:
+            key = self.get_count_cache_key(queryset)
+        except EmptyResultSet:
+            self.count_mode = 'exact'
+            return 0
+        cache = get_cache()
+        self.count_key = key
+        cached = cache.get(self.count_key)
+        if cached is not None:
+            count, estimated = cached
+            self.count_mode = 'estimated' if estimated else 'exact'
+            return count
+
+        estimate = self.estimate_count(queryset)
+        threshold = settings.API_COUNT_ESTIMATE_THRESHOLD
+        if estimate is not None and threshold and estimate >= threshold:
+            self.count_mode = 'estimated'
+            cache.set(self.count_key, (estimate, True), settings.API_CACHE_TIMEOUT)
+            return estimate
+        self.count_mode = 'exact'
+        return None
+
+    def store_count(self, count):
+        get_cache().set(self.count_key, (count, False), settings.API_CACHE_TIMEOUT)
+        return count
+
+    def get_count_cache_key(self, queryset):
+        sql, params = queryset.order_by().query.sql_with_params()
+        digest = hashlib.md5(repr((sql, params)).encode('utf-8')).hexdigest()
+        return 'api:count:{}:{}:{}'.format(dataset_token(), queryset.db, digest)
+
+    def estimate_count(self, queryset):
+        """Rows the PostgreSQL planner expects `queryset` to return, or None."""
+        if not settings.API_COUNT_ESTIMATE_THRESHOLD:
+            return None
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+        sql, params = queryset.order_by().query.get_compiler(queryset.db).as_sql()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+            plan = cursor.fetchone()[0]
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    def page_is_empty(self):
+        if self.count_mode != 'exact':
+            return False
+        return self.count == 0 or self.offset > self.count
+
+    def page_stop(self):
+        """End of the page slice, one row further when the count is not exact."""
+        stop = self.offset + self.limit
+        return stop if self.count_mode == 'exact' else stop + 1
+
+    def trim_page(self, rows):
+        if self.count_mode == 'exact':
+            if self.count > self.limit and self.template is not None:
+                self.display_page_controls = True
+            return rows
+        self.has_next = len(rows) > self.limit
+        if self.count_mode == 'estimated' and self.template is not None:
+            self.display_page_controls = self.offset > 0 or self.has_next
+        return rows[:self.limit]
+
+    def get_next_link(self):
+        if self.count_mode == 'exact':
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(url, self.offset_query_param, self.offset + self.limit)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        fields = [('count', self.count)]
+        if self.count_mode == 'estimated':
+            fields.append(('count_estimated', True))
+        elif self.count_mode == 'skipped':
+            fields = []
+        return Response(OrderedDict(fields + [
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def to_html(self):
+        if self.keyset is not None:
+            return self.keyset.to_html()
+        return super().to_html()
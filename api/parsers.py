@@ -0,0 +1,23 @@
+import json
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+class NDJSONParser(BaseParser):
+    """Parse newline delimited JSON into a list with one item per line."""
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        rows = []
+        for number, line in enumerate(stream, start=1):
+            line = line.decode(encoding).strip()
+            if not line:
+                continue
+            try:
+                rows.append(json.loads(line))
+            except ValueError as exc:
+                raise ParseError('NDJSON parse error on line {} - {}'.format(number, exc))
+        return rows
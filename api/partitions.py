@@ -0,0 +1,106 @@
+"""Yearly partitions of the Entity and Score tables.
+
+Both tables are LIST partitioned by test_year (migration 0012), with one
+partition per year and a default partition catching years that have none yet.
+Queries filtering on test_year only touch that year's partition, and a year
+is retired by detaching its partitions instead of deleting its rows.
+"""
+from django.db import connection, transaction
+from api.models import Entity, EntityRead, Score, ScoreVersion
+
+PARTITIONED_MODELS = (Entity, Score)
+
+
+def partition_name(model, test_year):
+    return '{}_{}'.format(model._meta.db_table, test_year)
+
+
+def default_partition_name(model):
+    return '{}_default'.format(model._meta.db_table)
+
+
+def partitions(model):
+    """Return {partition name: bound} for the attached partitions of `model`."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) '
+            'FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+            'WHERE i.inhparent = %s::regclass ORDER BY c.relname',
+            [model._meta.db_table],
+        )
+        return dict(cursor.fetchall())
+
+
+def partition_years(model):
+    prefix = '{}_'.format(model._meta.db_table)
+    return sorted(
+        int(name[len(prefix):]) for name in partitions(model)
+        if name[len(prefix):].isdigit()
+    )
+
+
+@transaction.atomic
+def create_partition(test_year):
+    """Create the partitions for `test_year` and return the new table names.
+
+    Rows of that year already in the default partition are moved into the new
+    partition before it is attached, since attaching checks that the default
+    partition holds no rows for it.
+    """
+    test_year = int(test_year)
+    created = []
+    with connection.cursor() as cursor:
+        for model in PARTITIONED_MODELS:
+            table = model._meta.db_table
+            name = partition_name(model, test_year)
+            if name in partitions(model):
+                continue
+            cursor.execute('CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS)'.format(name, table))
+            cursor.execute(
+                'WITH moved AS (DELETE FROM {} WHERE test_year = %s RETURNING *) '
+                'INSERT INTO {} SELECT * FROM moved'.format(default_partition_name(model), name),
+                [test_year],
+            )
+            cursor.execute('ALTER TABLE {} ATTACH PARTITION {} FOR VALUES IN ({})'.format(
+                table, name, test_year
+            ))
+            created.append(name)
+    return created
+
+
+@transaction.atomic
+def detach_partition(test_year, drop=False):
+    """Detach the partitions of `test_year`, dropping them if `drop` is set.
+
+    Detached tables keep their rows and can be archived or attached again.
+    Their rows leave `EntityRead` as well; after attaching a table again, call
+    `refresh_entity_read(<year>)` to restore them.
+    Returns the names of the detached tables.
+    """
+    detached = []
+    with connection.cursor() as cursor:
+        for model in PARTITIONED_MODELS:
+            name = partition_name(model, test_year)
+            if name not in partitions(model):
+                continue
+            cursor.execute('ALTER TABLE {} DETACH PARTITION {}'.format(model._meta.db_table, name))
+            if model is Entity:
+                # Detaching fires no delete trigger, see migration 0014.
+                cursor.execute(
+                    'DELETE FROM {} WHERE test_year = %s'.format(EntityRead._meta.db_table),
+                    [test_year],
+                )
+            else:
+                # Nor does it bump the score version, so the year's rollups
+                # would never be found stale.
+                ScoreVersion.objects.filter(test_year=test_year).delete()
+            if drop:
+                cursor.execute('DROP TABLE {}'.format(name))
+            detached.append(name)
+    return detached
+
+
+def refresh_entity_read(test_year=None):
+    """Rebuild the `EntityRead` rows of `test_year`, or of every year if None."""
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT api_entityread_refresh(%s)', [test_year])
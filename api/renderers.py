@@ -0,0 +1,164 @@
+import csv
+import io
+import json
+from itertools import islice
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+class Echo:
+    """File-like object whose write() hands the written value straight back."""
+
+    def write(self, value):
+        return value
+
+
+class StreamingRenderer(BaseRenderer):
+    """Renderer that can also stream rows of a values_list() queryset.
+
+    `stream(header, rows)` yields text chunks of `chunk_size` rows for a
+    `StreamingHttpResponse`. `render()` handles ordinary response data such as
+    error payloads.
+    """
+    charset = 'utf-8'
+    chunk_size = 1000
+    available = True
+
+    def stream(self, header, rows):
+        rows = iter(rows)
+        preamble = self.render_header(header)
+        if preamble:
+            yield preamble
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                return
+            yield ''.join(self.render_row(header, row) for row in chunk)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        rows = data if isinstance(data, list) else [data]
+        header = []
+        for row in rows:
+            header.extend(key for key in row if key not in header)
+        values = ([row.get(key) for key in header] for row in rows)
+        return ''.join(self.stream(header, values)).encode(self.charset)
+
+    def render_header(self, header):
+        return ''
+
+    def render_row(self, header, row):
+        raise NotImplementedError
+
+
+class CSVRenderer(StreamingRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def __init__(self):
+        self.writer = csv.writer(Echo())
+
+    def render_header(self, header):
+        return self.writer.writerow(header)
+
+    def render_row(self, header, row):
+        return self.writer.writerow(row)
+
+
+class NDJSONRenderer(StreamingRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+    def render_row(self, header, row):
+        return json.dumps(dict(zip(header, row)), cls=JSONEncoder) + '\n'
+
+
+class MessagePackRenderer(BaseRenderer):
+    """The JSON payload packed as MessagePack, needs the optional msgpack package."""
+    media_type = 'application/x-msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+    available = msgpack is not None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=JSONEncoder().default, use_bin_type=True)
+
+
+class ArrowRenderer(BaseRenderer):
+    """Apache Arrow IPC stream of the result rows, needs the optional pyarrow package.
+
+    Rows become columns that pandas can load with
+    `pyarrow.ipc.open_stream(content).read_pandas()`. Paginated responses keep
+    `count`, `next` and `previous` as JSON in the schema metadata. Column types
+    are inferred from the first batch of rows.
+    """
+    media_type = 'application/vnd.apache.arrow.stream'
+    format = 'arrow'
+    charset = None
+    render_style = 'binary'
+    chunk_size = 10000
+    available = pyarrow is not None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        metadata = None
+        if isinstance(data, dict) and isinstance(data.get('results'), list):
+            metadata = {key: json.dumps(value) for key, value in data.items() if key != 'results'}
+            data = data['results']
+        rows = data if isinstance(data, list) else [data]
+        header = []
+        for row in rows:
+            header.extend(key for key in row if key not in header)
+        values = ([row.get(key) for key in header] for row in rows)
+        return b''.join(self.stream(header, values, metadata))
+
+    def stream(self, header, rows, metadata=None):
+        rows = iter(rows)
+        sink = io.BytesIO()
+        chunk = list(islice(rows, self.chunk_size))
+        schema = self.schema(header, chunk, metadata)
+        with pyarrow.ipc.new_stream(sink, schema) as writer:
+            while chunk:
+                writer.write_batch(self.record_batch(chunk, schema))
+                yield self.drain(sink)
+                chunk = list(islice(rows, self.chunk_size))
+        yield self.drain(sink)
+
+    def schema(self, header, chunk, metadata):
+        fields = []
+        for name, values in zip(header, self.columns(header, chunk)):
+            column_type = pyarrow.array(values).type
+            if pyarrow.types.is_null(column_type):
+                column_type = pyarrow.string()
+            fields.append(pyarrow.field(name, column_type))
+        return pyarrow.schema(fields, metadata=metadata)
+
+    def record_batch(self, chunk, schema):
+        return pyarrow.record_batch([
+            pyarrow.array(values, type=field.type)
+            for values, field in zip(self.columns(schema.names, chunk), schema)
+        ], schema=schema)
+
+    def columns(self, header, chunk):
+        return [[row[i] for row in chunk] for i in range(len(header))]
+
+    def drain(self, sink):
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
@@ -0,0 +1,71 @@
+"""Read replica routing, see `ReplicaRoutingMiddleware`.
+
+GET and HEAD requests to the API viewsets read from one of the aliases in
+DATABASE_REPLICAS, picked per request. Writes, reads outside such requests
+and reads after a write in the same request use the primary ('default').
+"""
+import itertools
+import threading
+from collections import Counter
+from django.conf import settings
+
+PRIMARY = 'default'
+
+# Clients that just wrote carry this cookie and read from the primary until
+# it expires, so they see their own writes despite replication lag.
+PIN_COOKIE = 'api_primary'
+
+# `replica` is the alias serving the reads of the current request, if any.
+state = threading.local()
+
+
+class ReplicaSelector:
+    """Round robin or least connections choice of a replica.
+
+    Least connections counts the requests of this process currently reading
+    from each replica and breaks ties in round robin order.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rotation = itertools.count()
+        self.active = Counter()
+
+    def acquire(self, replicas, strategy='round_robin'):
+        with self.lock:
+            start = next(self.rotation) % len(replicas)
+            ordered = replicas[start:] + replicas[:start]
+            if strategy == 'least_connections':
+                replica = min(ordered, key=lambda alias: self.active[alias])
+            else:
+                replica = ordered[0]
+            self.active[replica] += 1
+        return replica
+
+    def release(self, replica):
+        with self.lock:
+            self.active[replica] -= 1
+
+
+selector = ReplicaSelector()
+
+
+def read_alias():
+    return getattr(state, 'replica', None) or PRIMARY
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        return read_alias()
+
+    def db_for_write(self, model, **hints):
+        # Reads later in the same request have to see the write.
+        state.replica = None
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
@@ -0,0 +1,83 @@
+from django.db import connection, transaction
+from api.models import ProficiencyRollup, RollupState, ScoreVersion
+
+# School rows are rolled up to district, county and state in one pass with
+# GROUPING SETS. Suppressed rows (no students or no percentage) are left out
+# of both the numerator and the denominator.
+REFRESH_SQL = '''
+INSERT INTO api_proficiencyrollup (
+    test_year, level, county_code, district_code, school_code,
+    test_id, grade_id, subgroup_id, schools, students_with_scores,
+    students_exceeded, students_met_and_above, pct_exceeded, pct_met_and_above
+)
+SELECT
+    test_year,
+    CASE
+        WHEN GROUPING(county_code) = 1 THEN 'state'
+        WHEN GROUPING(district_code) = 1 THEN 'county'
+        WHEN GROUPING(school_code) = 1 THEN 'district'
+        ELSE 'school'
+    END,
+    COALESCE(county_code, '00'),
+    COALESCE(district_code, '00000'),
+    COALESCE(school_code, '0000000'),
+    test_id, grade_id, subgroup_id,
+    COUNT(*),
+    SUM(students_with_scores),
+    SUM(students_exceeded),
+    SUM(students_met_and_above),
+    ROUND(100.0 * SUM(students_exceeded) / NULLIF(SUM(students_with_scores), 0), 2),
+    ROUND(100.0 * SUM(students_met_and_above) / NULLIF(SUM(students_with_scores), 0), 2)
+FROM (
+    SELECT
+        s.test_year, e.county_code, e.district_code, e.school_code,
+        s.test_id, s.grade_id, s.subgroup_id, s.students_with_scores,
+        ROUND(COALESCE(s.pct_exceeded, 0) * s.students_with_scores / 100) AS students_exceeded,
+        ROUND(s.pct_met_and_above * s.students_with_scores / 100) AS students_met_and_above
+    FROM api_score s
+    JOIN api_entity e ON e.id = s.entity_id AND e.test_year = s.test_year
+    WHERE s.test_year = %s
+      AND e.school_code <> '0000000'
+      AND s.students_with_scores > 0
+      AND s.pct_met_and_above IS NOT NULL
+) school_scores
+GROUP BY test_year, test_id, grade_id, subgroup_id, GROUPING SETS (
+    (county_code, district_code, school_code),
+    (county_code, district_code),
+    (county_code),
+    ()
+)
+'''
+
+
+def source_versions():
+    """Return {test_year: version} of the score table, see ScoreVersion."""
+    return dict(ScoreVersion.objects.values_list('test_year', 'version'))
+
+
+def stale_years():
+    """Test years whose scores changed since their rollups were built."""
+    versions = source_versions()
+    built = dict(RollupState.objects.values_list('test_year', 'source_version'))
+    years = {year for year, version in versions.items() if built.get(year) != version}
+    return sorted(years | (built.keys() - versions.keys()))
+
+
+@transaction.atomic
+def refresh_year(test_year):
+    """Rebuild the rollups of one test year and return the rows written."""
+    ProficiencyRollup.objects.filter(test_year=test_year).delete()
+    # Read before the rollups are built, so scores written meanwhile leave the
+    # year stale instead of being missed.
+    version = source_versions().get(test_year)
+    if version is None:
+        RollupState.objects.filter(test_year=test_year).delete()
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(REFRESH_SQL, [test_year])
+        written = cursor.rowcount
+    RollupState.objects.update_or_create(
+        test_year=test_year,
+        defaults={'source_version': version},
+    )
+    return written
@@ -1,32 +1,202 @@
-from rest_framework import serializers
-from api.models import Entity, Type, Test, Grade, SubGroup
+from collections import OrderedDict
+from django.core.exceptions import ValidationError
+from rest_framework import permissions, serializers
+from rest_framework.relations import PKOnlyObject
+from api.lookups import DIMENSIONS, get_registry
+from api.models import Entity, EntityRead, Type, Test, Grade, SubGroup, ProficiencyRollup
 
 
-class TypeSerializer(serializers.HyperlinkedModelSerializer):
+class DimensionRelatedField(serializers.SlugRelatedField):
+    """Slug field for a dimension code resolved through the lookup registry.
+
+    It reads and writes the same code as the `SlugRelatedField` DRF builds
+    for a foreign key with `to_field`, without a query per row either way.
+    """
+
+    def __init__(self, dimension, **kwargs):
+        self.dimension = dimension
+        model, code_field = DIMENSIONS[dimension]
+        kwargs.setdefault('queryset', model.objects.all())
+        super().__init__(slug_field=code_field, **kwargs)
+
+    def to_internal_value(self, data):
+        model, code_field = DIMENSIONS[self.dimension]
+        try:
+            code = model._meta.get_field(code_field).to_python(data)
+        except ValidationError:
+            self.fail('invalid')
+        instance = get_registry().get(self.dimension, code)
+        if instance is None:
+            self.fail('does_not_exist', slug_name=self.slug_field, value=data)
+        return instance
+
+    def use_pk_only_optimization(self):
+        # A foreign key to the code column holds the code itself.
+        field = self.parent.Meta.model._meta.get_field(self.source)
+        return field.target_field.name == self.slug_field
+
+    def to_representation(self, obj):
+        if isinstance(obj, PKOnlyObject):
+            return obj.pk
+        return super().to_representation(obj)
+
+
+def projected_fields(names, query_params):
+    """Return the `names` kept by the `fields` and `exclude` query parameters.
+
+    Both parameters take a comma separated list of field names. Unknown names
+    are rejected so a typo does not silently return everything.
+    """
+    wanted, excluded = (
+        [name for name in query_params.get(param, '').split(',') if name]
+        for param in ('fields', 'exclude')
+    )
+    unknown = [name for name in wanted + excluded if name not in names]
+    if unknown:
+        raise serializers.ValidationError({
+            'fields': ['Unknown field(s): {}.'.format(', '.join(unknown))]
+        })
+    return [
+        name for name in names
+        if (not wanted or name in wanted) and name not in excluded
+    ]
+
+
+class FieldProjectionMixin:
+    """Sparse fieldsets for reads through `?fields=` and `?exclude=`.
+
+    Only safe requests are projected, writes always see every field. Since
+    `ValuesSerializer` selects the columns of the remaining fields, the
+    projection narrows the query as well as the payload.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is not None and request.method in permissions.SAFE_METHODS:
+            self.project(request.query_params)
+
+    def project(self, query_params):
+        kept = projected_fields(list(self.fields), query_params)
+        for name in list(self.fields):
+            if name not in kept:
+                self.fields.pop(name)
+
+
+class TypeSerializer(FieldProjectionMixin, serializers.HyperlinkedModelSerializer):
     class Meta:
         model = Type
         fields = '__all__'
 
 
-class EntitySerializer(serializers.HyperlinkedModelSerializer):
+class EntitySerializer(FieldProjectionMixin, serializers.HyperlinkedModelSerializer):
+    entity_type = DimensionRelatedField('type')
+
     class Meta:
         model = Entity
-        fields = '__all__'
+        exclude = ('search_vector',)
+
 
+class EntityReadSerializer(FieldProjectionMixin, serializers.HyperlinkedModelSerializer):
+    """Entity payload read from `EntityRead`, with the denormalized fields added."""
+    entity_type = serializers.SlugRelatedField(slug_field='type_id', read_only=True)
 
-class TestSerializer(serializers.HyperlinkedModelSerializer):
+    class Meta:
+        model = EntityRead
+        fields = (
+            'url', 'entity_type', 'county_code', 'district_code', 'school_code', 'test_year',
+            'county_name', 'district_name', 'school_name', 'zipcode',
+            'cds_code', 'name', 'entity_type_description', 'district', 'county',
+        )
+        extra_kwargs = {'url': {'view_name': 'entity-detail'}}
+
+
+class TestSerializer(FieldProjectionMixin, serializers.HyperlinkedModelSerializer):
     class Meta:
         model = Test
         fields = '__all__'
 
 
-class GradeSerializer(serializers.HyperlinkedModelSerializer):
+class GradeSerializer(FieldProjectionMixin, serializers.HyperlinkedModelSerializer):
     class Meta:
         model = Grade
         fields = '__all__'
 
 
-class SubGroupSerializer(serializers.HyperlinkedModelSerializer):
+class SubGroupSerializer(FieldProjectionMixin, serializers.HyperlinkedModelSerializer):
     class Meta:
         model = SubGroup
         fields = '__all__'
+
+
+class ProficiencyRollupSerializer(FieldProjectionMixin, serializers.HyperlinkedModelSerializer):
+    test = DimensionRelatedField('test')
+    subgroup = DimensionRelatedField('subgroup')
+
+    class Meta:
+        model = ProficiencyRollup
+        fields = '__all__'
+
+
+class ValuesSerializer:
+    """Read-only fast path producing the same payload as a hyperlinked serializer.
+
+    Rows come from a `values()` queryset instead of model instances, and URLs
+    are formatted from a prefix/suffix template resolved once per request
+    instead of calling `reverse()` for every row.
+    """
+    passthrough_fields = (
+        serializers.CharField,
+        serializers.IntegerField,
+        serializers.BooleanField,
+        serializers.SlugRelatedField,
+    )
+
+    def __init__(self, serializer):
+        self.request = serializer.context['request']
+        self.format = serializer.context.get('format')
+        self.model = serializer.Meta.model
+        self.fields = []
+        for name, field in serializer.fields.items():
+            column, convert = self.build_field(field)
+            self.fields.append((name, column, convert))
+        # The primary key is always read, pagination cursors are built from it.
+        columns = [self.model._meta.pk.attname] + [column for _, column, _ in self.fields]
+        self.columns = list(dict.fromkeys(columns))
+
+    def build_field(self, field):
+        opts = self.model._meta
+        if isinstance(field, serializers.HyperlinkedIdentityField):
+            return opts.pk.attname, self.url_template(field)
+        if isinstance(field, serializers.HyperlinkedRelatedField):
+            return opts.get_field(field.source).attname, self.url_template(field)
+        column = opts.get_field(field.source).attname
+        if isinstance(field, self.passthrough_fields):
+            return column, None
+        return column, field.to_representation
+
+    def url_template(self, field):
+        placeholder = '__lookup__'
+        url = field.reverse(
+            field.view_name,
+            kwargs={field.lookup_url_kwarg: placeholder},
+            request=self.request,
+            format=self.format,
+        )
+        prefix, _, suffix = url.partition(placeholder)
+        return lambda value: '{}{}{}'.format(prefix, value, suffix)
+
+    def values(self, queryset):
+        return queryset.values(*self.columns)
+
+    def to_representation(self, row):
+        data = OrderedDict()
+        for name, column, convert in self.fields:
+            value = row[column]
+            if convert is not None and value is not None:
+                value = convert(value)
+            data[name] = value
+        return data
+
+    def represent(self, rows):
+        return [self.to_representation(row) for row in rows]
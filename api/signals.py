@@ -0,0 +1,22 @@
+from django.db.models.signals import post_delete, post_save
+from api.dataset import bump_dataset_version
+from api.models import Entity, Grade, SubGroup, Test, Type
+
+VERSIONED_MODELS = (Entity, Type, Test, Grade, SubGroup)
+
+# Entities are deleted a year at a time by load_entities and detach_partition,
+# which bump the version once themselves. A post_delete receiver would bump it
+# for every deleted row instead, so Entity.delete() bumps it for single rows.
+DELETE_VERSIONED_MODELS = (Type, Test, Grade, SubGroup)
+
+
+def bump_version_on_write(sender, **kwargs):
+    bump_dataset_version()
+
+
+# Connected per model: a post_delete receiver without a sender would turn off
+# fast deletes of every model, and send a signal per row of each queryset delete.
+for model in VERSIONED_MODELS:
+    post_save.connect(bump_version_on_write, sender=model)
+for model in DELETE_VERSIONED_MODELS:
+    post_delete.connect(bump_version_on_write, sender=model)
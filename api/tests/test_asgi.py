@@ -0,0 +1,150 @@
+import asyncio
+from unittest import mock, skipUnless
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.wsgi import get_wsgi_application
+from django.test import TestCase, TransactionTestCase, override_settings
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.test import APIClient
+from api.asgi import ReadApplication, asyncpg, compile_queryset
+from api.models import Entity
+from api.views import EntityViewSet
+
+
+@skipUnless(asyncpg, 'asyncpg is not installed')
+class ReadApplicationTest(TransactionTestCase):
+    """asyncpg reads through its own connections, so the fixtures are committed."""
+    fixtures = ['testing']
+
+    def setUp(self):
+        cache.clear()
+        self.app = ReadApplication(get_wsgi_application(), threads=2)
+        self.client = APIClient()
+
+    def request(self, *requests):
+        """Send (method, path, headers) requests in turn, return (status, headers, body)."""
+        async def send_all():
+            try:
+                return [await self.send(*request) for request in requests]
+            finally:
+                await self.app.close()
+
+        return asyncio.run(send_all())
+
+    async def send(self, method, path, headers=None):
+        path, _, query_string = path.partition('?')
+        headers = dict({'host': 'testserver'}, **(headers or {}))
+        scope = {
+            'type': 'http',
+            'method': method,
+            'path': path,
+            'query_string': query_string.encode(),
+            'headers': [(name.encode(), value.encode()) for name, value in headers.items()],
+            'server': ('testserver', 80),
+            'scheme': 'http',
+            'http_version': '1.1',
+        }
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b''}
+
+        async def send(message):
+            messages.append(message)
+
+        await self.app(scope, receive, send)
+        start = messages[0]
+        headers = {name.decode().lower(): value.decode() for name, value in start['headers']}
+        body = b''.join(message.get('body', b'') for message in messages[1:])
+        return start['status'], headers, body
+
+    def test_reads_match_wsgi_responses(self):
+        entity = Entity.objects.order_by('pk').first()
+        paths = [
+            '/api/entities/',
+            '/api/entities/?limit=1&offset=1',
+            '/api/entities/?limit=1&count=false',
+            '/api/entities/?test_year={}&fields=url,county_code'.format(entity.test_year),
+            '/api/entities/?search=alameda',
+            '/api/entities/{}/'.format(entity.pk),
+            '/api/types/',
+            '/api/grades/',
+        ]
+        with mock.patch.object(self.app, 'call_wsgi', wraps=self.app.call_wsgi) as call_wsgi:
+            responses = self.request(*(('GET', path) for path in paths))
+        self.assertFalse(call_wsgi.called)
+        for path, (status, headers, body) in zip(paths, responses):
+            expected = self.client.get(path)
+            self.assertEqual(status, expected.status_code, path)
+            self.assertEqual(body, expected.content, path)
+            self.assertEqual(headers['etag'], expected['ETag'], path)
+            self.assertEqual(headers['content-type'], expected['Content-Type'], path)
+            self.assertEqual(headers['x-frame-options'], expected['X-Frame-Options'], path)
+            self.assertEqual(headers['vary'], expected['Vary'], path)
+
+    @override_settings(API_COUNT_ESTIMATE_THRESHOLD=1)
+    def test_estimated_count(self):
+        status, _, body = self.request(('GET', '/api/entities/?limit=1', None))[0]
+        self.assertEqual(status, 200)
+        self.assertIn(b'"count_estimated":true', body)
+        self.assertEqual(body, self.client.get('/api/entities/?limit=1').content)
+
+    def test_conditional_and_head_requests(self):
+        etag = self.client.get('/api/entities/')['ETag']
+        (status, headers, body), (head_status, _, head_body) = self.request(
+            ('GET', '/api/entities/', {'if-none-match': etag}),
+            ('HEAD', '/api/entities/', None),
+        )
+        self.assertEqual((status, body), (304, b''))
+        self.assertEqual(headers['etag'], etag)
+        self.assertEqual((head_status, head_body), (200, b''))
+
+    def test_compresses_like_wsgi(self):
+        status, headers, body = self.request(
+            ('GET', '/api/entities/?limit=100', {'accept-encoding': 'gzip'})
+        )[0]
+        self.assertEqual(headers['content-encoding'], 'gzip')
+        self.assertEqual(headers['content-length'], str(len(body)))
+
+    def test_session_users_are_authenticated(self):
+        self.client.force_login(User.objects.get(username='some_user'))
+        cookie = 'sessionid={}'.format(self.client.cookies['sessionid'].value)
+        with mock.patch.object(EntityViewSet, 'permission_classes', [IsAuthenticated]), \
+                mock.patch.object(self.app, 'call_wsgi', wraps=self.app.call_wsgi) as call_wsgi:
+            (status, _, _), (anonymous_status, _, _) = self.request(
+                ('GET', '/api/entities/', {'cookie': cookie}),
+                ('GET', '/api/entities/', None),
+            )
+        self.assertEqual(status, 200)
+        self.assertEqual(anonymous_status, 401)
+        self.assertEqual(call_wsgi.call_count, 1)
+
+    @override_settings(ALLOWED_HOSTS=['testserver'])
+    def test_disallowed_host_is_a_bad_request(self):
+        status, _, _ = self.request(('GET', '/api/entities/', {'host': 'example.com'}))[0]
+        self.assertEqual(status, 400)
+
+    def test_other_requests_go_to_wsgi(self):
+        with mock.patch.object(self.app, 'call_wsgi', wraps=self.app.call_wsgi) as call_wsgi:
+            responses = self.request(
+                ('POST', '/api/types/', None),
+                ('GET', '/api/entities/export/?format=ndjson', None),
+                ('GET', '/api/entities/?pagination=keyset', None),
+                ('GET', '/api/entities/?fields=nope', None),
+                ('GET', '/api/entities/999999/', None),
+                ('GET', '/api/rollups/', None),
+            )
+        self.assertEqual(call_wsgi.call_count, 6)
+        self.assertEqual([status for status, _, _ in responses], [401, 200, 200, 400, 404, 200])
+        self.assertEqual(responses[1][2].count(b'\n'), Entity.objects.count())
+
+
+class CompileQuerysetTest(TestCase):
+
+    def test_numbers_placeholders(self):
+        queryset = Entity.objects.filter(county_code='01', school_name__contains='100%')
+        sql, params = compile_queryset(queryset.values('id'), 'default')
+        self.assertIn('$1', sql)
+        self.assertIn('$2', sql)
+        self.assertNotIn('%s', sql)
+        self.assertEqual(params, ['01', '%100\\%%'])
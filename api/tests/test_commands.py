@@ -0,0 +1,335 @@
+import json
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import OperationalError
+from django.test import TestCase, TransactionTestCase, override_settings
+from api import benchmarks
+from api.models import Entity, Type, Score, Grade, ProficiencyRollup
+
+ENTITY_HEADER = (
+    'County Code^District Code^School Code^Filler^Test Year^Type Id^'
+    'County Name^District Name^School Name^Zip Code'
+)
+
+SCORE_HEADER = (
+    'County Code^District Code^School Code^Filler^Test Year^Subgroup ID^'
+    'Test Type^Total Tested At Entity Level^Total Tested with Scores^Grade^'
+    'Test Id^CAASPP Reported Enrollment^Students Tested^Mean Scale Score^'
+    'Percentage Standard Exceeded^Percentage Standard Met^'
+    'Percentage Standard Met and Above^Percentage Standard Nearly Met^'
+    'Percentage Standard Not Met^Students with Scores'
+)
+
+
+def write_research_file(directory, name, lines):
+    path = os.path.join(directory, name)
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    return path
+
+
+class LoadEntitiesCommandTest(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        Type.objects.create(type_id=4, description='State')
+        Type.objects.create(type_id=5, description='County')
+        Type.objects.create(type_id=7, description='School')
+        self.path = write_research_file(self.directory, 'entities.txt', [
+            ENTITY_HEADER,
+            '00^00000^0000000^^2018^4^State of California^^^',
+            '01^00000^0000000^^2018^5^Alameda^^^',
+            '01^61119^0111765^^2018^7^Alameda^Alameda Unified^Lincoln Middle^94501',
+            '01^61119^0122222^^2018^99^Alameda^Alameda Unified^Unknown Type^94501',
+        ])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_loads_rows_with_known_types(self):
+        out = StringIO()
+        call_command('load_entities', self.path, batch_size=2, stdout=out)
+        self.assertEqual(Entity.objects.count(), 3)
+        self.assertIn('3 rows loaded, 1 skipped', out.getvalue())
+        self.assertIn('rows/sec', out.getvalue())
+
+    def test_loaded_fields(self):
+        call_command('load_entities', self.path, stdout=StringIO())
+        school = Entity.objects.get(school_code='0111765')
+        self.assertEqual(school.test_year, 2018)
+        self.assertEqual(school.entity_type.description, 'School')
+        self.assertEqual(school.school_name, 'Lincoln Middle')
+        self.assertEqual(school.zipcode, '94501')
+
+    def test_replace_deletes_existing_year(self):
+        call_command('load_entities', self.path, stdout=StringIO())
+        call_command('load_entities', self.path, replace=True, stdout=StringIO())
+        self.assertEqual(Entity.objects.count(), 3)
+
+    def test_replace_deletes_entities_missing_from_file(self):
+        call_command('load_entities', self.path, stdout=StringIO())
+        school = Entity.objects.get(school_code='0111765')
+        path = write_research_file(self.directory, 'entities.txt', [
+            ENTITY_HEADER,
+            '00^00000^0000000^^2018^4^State of California^^^',
+            '01^61119^0111765^^2018^7^Alameda^Alameda Unified^Lincoln^94501',
+        ])
+        call_command('load_entities', path, replace=True, stdout=StringIO())
+        self.assertEqual(Entity.objects.count(), 2)
+        self.assertEqual(Entity.objects.get(pk=school.pk).school_name, 'Lincoln')
+
+    def test_reload_without_replace_fails(self):
+        call_command('load_entities', self.path, stdout=StringIO())
+        with self.assertRaisesMessage(CommandError, 'use --replace'):
+            call_command('load_entities', self.path, stdout=StringIO())
+        self.assertEqual(Entity.objects.count(), 3)
+
+
+class LoadScoresCommandTest(TestCase):
+    fixtures = ['testing']
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = write_research_file(self.directory, 'scores.txt', [
+            SCORE_HEADER,
+            '00^00000^0000000^^2016^1^B^450000^449000^3^1^451000^449500^2410.1^'
+            '22.50^25.10^47.60^25.00^27.40^449000',
+            '01^00000^0000000^^2016^1^B^12000^11900^13^2^12100^11950^*^'
+            '*^*^*^*^*^11900',
+            '99^99999^9999999^^2016^1^B^1^1^3^1^1^1^1^1^1^1^1^1^1',
+        ])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_loads_rows_with_known_codes(self):
+        out = StringIO()
+        call_command('load_scores', self.path, batch_size=1, stdout=out)
+        self.assertEqual(Score.objects.count(), 2)
+        self.assertIn('2 rows loaded, 1 skipped', out.getvalue())
+
+    def test_maps_codes_to_dimensions(self):
+        call_command('load_scores', self.path, stdout=StringIO())
+        score = Score.objects.get(entity__county_code='00')
+        self.assertEqual(score.grade.num, '03')
+        self.assertEqual(score.test.test_id, 1)
+        self.assertEqual(score.subgroup.subgroup_id, 1)
+        self.assertEqual(str(score.pct_met_and_above), '47.60')
+
+    def test_suppressed_values_are_null(self):
+        call_command('load_scores', self.path, stdout=StringIO())
+        score = Score.objects.get(entity__county_code='01')
+        self.assertIsNone(score.mean_scale_score)
+        self.assertIsNone(score.pct_exceeded)
+        self.assertEqual(score.students_with_scores, 11900)
+
+    def test_rows_without_test_type_are_skipped(self):
+        write_research_file(self.directory, 'scores.txt', [
+            SCORE_HEADER,
+            '00^00000^0000000^^2016^1^^450000^449000^3^1^451000^449500^2410.1^'
+            '22.50^25.10^47.60^25.00^27.40^449000',
+            '01^00000^0000000^^2016^1^B^12000^11900^13^2^12100^11950^*^'
+            '*^*^*^*^*^11900',
+        ])
+        out = StringIO()
+        call_command('load_scores', self.path, stdout=out)
+        self.assertEqual(Score.objects.get().entity.county_code, '01')
+        self.assertIn('1 rows loaded, 1 skipped', out.getvalue())
+
+    def test_entities_reload_keeps_scores(self):
+        call_command('load_scores', self.path, stdout=StringIO())
+        county = Entity.objects.get(test_year=2016, county_code='01')
+        path = write_research_file(self.directory, 'entities.txt', [
+            ENTITY_HEADER,
+            '00^00000^0000000^^2016^4^State of California^^^',
+            '01^00000^0000000^^2016^5^Alameda County^^^',
+        ])
+        out = StringIO()
+        call_command('load_entities', path, replace=True, stdout=out)
+        self.assertIn('2 rows loaded', out.getvalue())
+        self.assertEqual(Entity.objects.get(pk=county.pk).county_name, 'Alameda County')
+        self.assertEqual(Score.objects.filter(entity=county).count(), 1)
+        self.assertEqual(Entity.objects.filter(test_year=2016).count(), 2)
+
+    def test_entities_reload_refuses_to_drop_scored_entities(self):
+        call_command('load_scores', self.path, stdout=StringIO())
+        path = write_research_file(self.directory, 'entities.txt', [
+            ENTITY_HEADER,
+            '00^00000^0000000^^2016^4^State of California^^^',
+        ])
+        with self.assertRaisesMessage(CommandError, 'reload the scores for 2016'):
+            call_command('load_entities', path, replace=True, stdout=StringIO())
+        self.assertEqual(Entity.objects.filter(test_year=2016).count(), 2)
+
+    def test_replace_deletes_existing_year(self):
+        call_command('load_scores', self.path, stdout=StringIO())
+        call_command('load_scores', self.path, replace=True, stdout=StringIO())
+        self.assertEqual(Score.objects.count(), 2)
+
+
+class RefreshRollupsCommandTest(TestCase):
+    fixtures = ['testing']
+
+    def setUp(self):
+        school = Type.objects.create(type_id=7, description='School')
+        self.grade = Grade.objects.get(num='03')
+        for school_code, tested, pct in (('0000001', 100, '50.00'), ('0000002', 300, '10.00')):
+            entity = Entity.objects.create(
+                county_code='01',
+                district_code='61119',
+                school_code=school_code,
+                test_year=2016,
+                entity_type=school,
+                county_name='Alameda',
+            )
+            self.add_score(entity, tested, pct)
+
+    def add_score(self, entity, tested, pct):
+        return Score.objects.create(
+            entity=entity,
+            test_id=1,
+            grade=self.grade,
+            subgroup_id=1,
+            test_year=entity.test_year,
+            test_type='B',
+            students_with_scores=tested,
+            pct_exceeded=pct,
+            pct_met_and_above=pct,
+        )
+
+    def refresh(self, *args):
+        out = StringIO()
+        call_command('refresh_rollups', *args, stdout=out)
+        return out.getvalue()
+
+    def test_builds_every_level(self):
+        self.refresh()
+        levels = dict(ProficiencyRollup.objects.values_list('level', 'pct_met_and_above'))
+        self.assertEqual(set(levels), {'state', 'county', 'district', 'school'})
+        district = ProficiencyRollup.objects.get(level='district')
+        self.assertEqual(district.students_with_scores, 400)
+        self.assertEqual(district.students_met_and_above, 80)
+        self.assertEqual(str(district.pct_met_and_above), '20.00')
+        self.assertEqual(district.schools, 2)
+        self.assertEqual(district.school_code, '0000000')
+
+    def test_only_changed_years_are_refreshed(self):
+        self.assertIn('2016', self.refresh())
+        self.assertIn('up to date', self.refresh())
+        self.add_score(Entity.objects.get(school_code='0000001'), 10, '0.00')
+        self.assertIn('Refreshed 2016', self.refresh())
+
+    def test_updated_scores_make_their_year_stale(self):
+        self.refresh()
+        Score.objects.filter(test_year=2016).update(pct_met_and_above='90.00')
+        self.assertIn('Refreshed 2016', self.refresh())
+        district = ProficiencyRollup.objects.get(level='district')
+        self.assertEqual(str(district.pct_met_and_above), '90.00')
+        self.assertIn('up to date', self.refresh())
+
+    def test_forced_year(self):
+        self.refresh()
+        self.assertIn('Refreshed 2016', self.refresh('--year', '2016'))
+
+
+class BenchApiCommandTest(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.baseline = os.path.join(self.directory, 'baseline.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def bench(self, **options):
+        out = StringIO()
+        call_command(
+            'bench_api', mode='inprocess', scratch=False, requests=2, warmup=1,
+            scale=2, scores=500, only='entit', stdout=out, **options
+        )
+        return out.getvalue()
+
+    def test_reports_every_scenario(self):
+        output = self.bench(save_baseline=self.baseline)
+        self.assertIn('entity natural key', output)
+        self.assertIn('entities batch 500', output)
+        self.assertNotIn('rollups', output)
+        with open(self.baseline) as f:
+            result = json.load(f)['inprocess']['entity detail']
+        self.assertEqual(result['queries'], 1)
+        self.assertLessEqual(result['p50'], result['p99'])
+        self.assertEqual(Entity.objects.count(), 0)
+
+    def test_fails_on_regression(self):
+        with open(self.baseline, 'w') as f:
+            json.dump({'inprocess': {'entity detail': {'p95': 0.0001}}}, f)
+        with self.assertRaisesMessage(CommandError, 'p95 regressed for entity detail'):
+            self.bench(baseline=self.baseline)
+
+    def test_baseline_is_saved_before_teardown(self):
+        rolled_back = benchmarks.rolled_back
+
+        @contextmanager
+        def failing_teardown():
+            with rolled_back():
+                yield
+            raise OperationalError('database is being accessed by other users')
+
+        with mock.patch('api.benchmarks.rolled_back', failing_teardown):
+            with self.assertRaises(OperationalError):
+                self.bench(save_baseline=self.baseline)
+        with open(self.baseline) as f:
+            self.assertIn('entity detail', json.load(f)['inprocess'])
+
+    def test_wsgi_needs_scratch_database(self):
+        with self.assertRaises(CommandError):
+            call_command('bench_api', mode='wsgi', scratch=False, stdout=StringIO())
+
+
+@override_settings(ALLOWED_HOSTS=[])
+class BenchSerializersCommandTest(TestCase):
+
+    def test_reports_both_serializers(self):
+        out = StringIO()
+        call_command('bench_serializers', rows=10, repeat=1, stdout=out)
+        self.assertIn('HyperlinkedModelSerializer', out.getvalue())
+        self.assertIn('ValuesSerializer', out.getvalue())
+        self.assertEqual(Entity.objects.count(), 0)
+
+
+@override_settings(ALLOWED_HOSTS=[])
+class BenchRenderersCommandTest(TestCase):
+
+    def test_reports_every_renderer(self):
+        out = StringIO()
+        call_command('bench_renderers', rows=10, repeat=1, stdout=out)
+        for renderer in ('json', 'msgpack', 'arrow'):
+            self.assertIn(renderer, out.getvalue())
+        self.assertEqual(Entity.objects.count(), 0)
+
+
+class BenchApiWsgiTest(TransactionTestCase):
+    """The WSGI mode migrates and drops a scratch database of its own."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.baseline = os.path.join(self.directory, 'baseline.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_wsgi_mode_serves_scratch_database(self):
+        out = StringIO()
+        call_command(
+            'bench_api', mode='wsgi', requests=1, warmup=0, scale=1, scores=100,
+            only='entities year', save_baseline=self.baseline, stdout=out,
+        )
+        self.assertIn('entities year county', out.getvalue())
+        with open(self.baseline) as f:
+            self.assertIn('entities year', json.load(f)['wsgi'])
@@ -0,0 +1,104 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework import serializers
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from api.loaders import ScoreLoader
+from api.lookups import get_registry
+from api.models import Entity, Type, Grade, Score
+from api.serializers import EntitySerializer
+
+
+class DimensionRegistryTest(TestCase):
+    fixtures = ['testing']
+
+    def setUp(self):
+        cache.clear()
+
+    def test_resolves_codes(self):
+        registry = get_registry()
+        self.assertEqual(registry.get('type', 4).description, 'State')
+        self.assertEqual(registry.pk('grade', '03'), Grade.objects.get(num='03').pk)
+        self.assertEqual(registry.get('subgroup', 1).description, 'All Students')
+        self.assertIsNone(registry.get('test', 99))
+
+    def test_loaded_once(self):
+        get_registry()
+        with self.assertNumQueries(0):
+            get_registry().get('type', 4)
+
+    def test_refreshed_after_write(self):
+        get_registry()
+        Type.objects.create(type_id=7, description='School')
+        self.assertEqual(get_registry().get('type', 7).description, 'School')
+
+
+class HotPathQueryCountTest(TestCase):
+    fixtures = ['testing']
+
+    def setUp(self):
+        cache.clear()
+        get_registry()
+
+    def entity(self, i):
+        return {
+            'county_code': '01',
+            'district_code': '61119',
+            'school_code': '{:07d}'.format(i),
+            'test_year': 2018,
+            'entity_type': 5 if i % 2 else 4,
+            'county_name': 'Alameda',
+        }
+
+    def test_entity_validation_makes_no_dimension_queries(self):
+        request = Request(APIRequestFactory().post('/api/entities/'))
+        data = [self.entity(i) for i in range(50)]
+        serializer = EntitySerializer(data=data, many=True, context={'request': request})
+        # Each row still checks its natural key is unique, but codes are
+        # resolved without touching the dimension tables.
+        with CaptureQueriesContext(connection) as context:
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+        queried = ' '.join(query['sql'] for query in context.captured_queries)
+        self.assertEqual(len(context.captured_queries), len(data))
+        self.assertNotIn('"api_type"', queried)
+
+    def test_entity_type_payload_is_unchanged(self):
+        class DefaultEntitySerializer(serializers.HyperlinkedModelSerializer):
+            # DRF's own field for the foreign key, a SlugRelatedField on type_id.
+            class Meta:
+                model = Entity
+                exclude = ('search_vector',)
+
+        request = Request(APIRequestFactory().get('/api/entities/'))
+        entities = list(Entity.objects.order_by('pk'))
+        expected = DefaultEntitySerializer(entities, many=True, context={'request': request}).data
+        with self.assertNumQueries(0):
+            data = EntitySerializer(entities, many=True, context={'request': request}).data
+        self.assertEqual([dict(row) for row in data], [dict(row) for row in expected])
+        self.assertEqual(data[0]['entity_type'], 4)
+
+    def test_unknown_code_is_rejected(self):
+        request = Request(APIRequestFactory().post('/api/entities/'))
+        data = dict(self.entity(1), entity_type=42)
+        serializer = EntitySerializer(data=data, context={'request': request})
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('entity_type', serializer.errors)
+
+    def score_rows(self, count):
+        for i in range(count):
+            yield {
+                'County Code': '00', 'District Code': '00000', 'School Code': '0000000',
+                'Test Year': '2016', 'Subgroup ID': '1', 'Test Type': 'B',
+                'Grade': '3' if i % 2 else '13', 'Test Id': str(i % 2 + 1),
+            }
+
+    def load_queries(self, count):
+        with CaptureQueriesContext(connection) as context:
+            ScoreLoader(batch_size=1000).load(self.score_rows(count))
+        return len(context.captured_queries)
+
+    def test_score_ingest_query_count_is_independent_of_rows(self):
+        self.assertEqual(self.load_queries(5), self.load_queries(500))
+        self.assertEqual(Score.objects.count(), 505)
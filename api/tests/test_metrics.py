@@ -0,0 +1,83 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from unittest import mock, skipUnless
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from api import metrics
+
+
+def sample(name, **labels):
+    return metrics.prometheus_client.REGISTRY.get_sample_value(name, labels) or 0
+
+
+@skipUnless(metrics.prometheus_client, 'prometheus_client is not installed')
+class MetricsTest(TestCase):
+    fixtures = ['testing']
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_counts_requests_per_route_and_action(self):
+        labels = {'basename': 'entity', 'action': 'natural_key', 'method': 'GET', 'status': '200'}
+        before = sample('api_requests_total', **labels)
+        for _ in range(3):
+            self.client.get('/api/entities/2016/01000000000000/')
+        self.assertEqual(sample('api_requests_total', **labels), before + 3)
+        self.assertGreater(sample(
+            'api_request_duration_seconds_count', basename='entity', action='natural_key'
+        ), 0)
+
+    def test_unmatched_and_other_routes(self):
+        before = sample('api_requests_total', basename='unmatched', action='unmatched',
+                        method='GET', status='404')
+        self.client.get('/nowhere/')
+        self.assertEqual(sample('api_requests_total', basename='unmatched', action='unmatched',
+                                method='GET', status='404'), before + 1)
+
+    def test_cache_hit_rate(self):
+        hits = sample('api_response_cache_lookups_total', basename='type', result='hit')
+        misses = sample('api_response_cache_lookups_total', basename='type', result='miss')
+        self.client.get('/api/types/')
+        self.client.get('/api/types/')
+        self.assertEqual(
+            sample('api_response_cache_lookups_total', basename='type', result='miss'), misses + 1
+        )
+        self.assertEqual(
+            sample('api_response_cache_lookups_total', basename='type', result='hit'), hits + 1
+        )
+
+    # Query counts are only recorded for requests sampled for timing.
+    @override_settings(API_TIMING_SAMPLE_RATE=1)
+    def test_endpoint(self):
+        self.client.get('/api/grades/')
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            'api_requests_total{action="list",basename="grade",method="GET",status="200"}',
+            response.content.decode(),
+        )
+        self.assertIn('api_request_queries_bucket', response.content.decode())
+
+    def test_aggregates_worker_processes(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        environ = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=directory)
+        script = (
+            "from api import metrics; "
+            "metrics.REQUESTS.labels('entity', 'list', 'GET', 200).inc(2)"
+        )
+        for _ in range(2):
+            subprocess.run([sys.executable, '-c', script], env=environ, check=True,
+                           cwd=settings.BASE_DIR)
+        with mock.patch.dict(os.environ, PROMETHEUS_MULTIPROC_DIR=directory):
+            body, _ = metrics.render_metrics()
+        self.assertIn(
+            b'api_requests_total{action="list",basename="entity",method="GET",status="200"} 4.0',
+            body,
+        )
@@ -1,7 +1,11 @@
-from django.test import TestCase
+import threading
+from django.test import TestCase, TransactionTestCase
+from django.contrib.postgres.search import SearchQuery
 from django.core.exceptions import ValidationError
+from django.db import connection, transaction
 from django.db.utils import IntegrityError
-from api.models import Entity, Type, Test, Grade, SubGroup
+from api import partitions
+from api.models import Entity, EntityRead, Type, Test, Grade, SubGroup
 
 
 class EntityModelTest(TestCase):
@@ -86,6 +90,179 @@ class EntityModelTest(TestCase):
             print('Blank zipcode should not throw error.')
 
 
+class EntityIndexTest(TestCase):
+    fixtures = ['testing']
+
+    filter_combinations = (
+        {'test_year': 2016},
+        {'test_year': 2016, 'county_code': '01'},
+        {'test_year': 2016, 'county_code': '01', 'district_code': '61119'},
+        {
+            'test_year': 2016,
+            'county_code': '01',
+            'district_code': '61119',
+            'school_code': '0111765',
+        },
+        {'county_code': '01'},
+        {'county_code': '01', 'district_code': '61119'},
+        {'county_code': '01', 'district_code': '61119', 'school_code': '0111765'},
+        {'zipcode': '94501'},
+        {'zipcode': '94501', 'test_year': 2016},
+        {'entity_type': 7},
+        {'entity_type': 7, 'test_year': 2016},
+    )
+
+    def setUp(self):
+        # The fixture tables are tiny, so force the planner to prove an index
+        # is usable instead of letting it prefer a sequential scan.
+        with connection.cursor() as cursor:
+            cursor.execute('SET enable_seqscan = off')
+
+    def tearDown(self):
+        with connection.cursor() as cursor:
+            cursor.execute('RESET enable_seqscan')
+
+    def test_filter_combinations_use_an_index(self):
+        for model in (Entity, EntityRead):
+            for params in self.filter_combinations:
+                with self.subTest(model=model.__name__, **params):
+                    plan = model.objects.filter(**params).explain()
+                    self.assertIn('Index', plan)
+                    self.assertNotIn('Seq Scan', plan)
+
+    def test_search_uses_gin_index(self):
+        query = SearchQuery('linc:*', config='simple', search_type='raw')
+        plan = Entity.objects.filter(search_vector=query).explain()
+        # Partitions name their copy of entity_search_idx after the column.
+        self.assertIn('Bitmap Index Scan on api_entity_default_search_vector_idx', plan)
+
+
+class EntityReadTest(TestCase):
+    fixtures = ['testing']
+
+    def setUp(self):
+        Type.objects.create(type_id=6, description='District')
+        Type.objects.create(type_id=7, description='School')
+        self.county = Entity.objects.get(test_year=2016, county_code='01')
+
+    def create(self, district_code, school_code, **fields):
+        fields.setdefault('entity_type_id', 7 if school_code != '0000000' else 6)
+        return Entity.objects.create(
+            county_code='01', district_code=district_code, school_code=school_code,
+            test_year=2016, county_name='Alameda', **fields
+        )
+
+    def read(self, entity):
+        return EntityRead.objects.get(pk=entity.pk)
+
+    def test_rows_are_precomputed(self):
+        district = self.create('61119', '0000000', district_name='Alameda Unified')
+        school = self.create(
+            '61119', '0111765', district_name='Alameda Unified', school_name='Lincoln Middle'
+        )
+        row = self.read(school)
+        self.assertEqual(row.cds_code, '01611190111765')
+        self.assertEqual(row.name, 'Lincoln Middle')
+        self.assertEqual(row.entity_type_description, 'School')
+        self.assertEqual((row.district_id, row.county_id), (district.pk, self.county.pk))
+        self.assertEqual(str(row), str(school))
+
+        row = self.read(district)
+        self.assertEqual(row.name, 'Alameda Unified')
+        self.assertEqual((row.district_id, row.county_id), (None, self.county.pk))
+        row = self.read(self.county)
+        self.assertEqual((row.name, row.district_id, row.county_id), ('Alameda', None, None))
+
+    def test_bulk_writes_are_synced(self):
+        Entity.objects.bulk_create([
+            Entity(county_code='01', district_code='61119', school_code='0111765',
+                   test_year=2016, entity_type_id=7, county_name='Alameda',
+                   district_name='Alameda Unified'),
+            Entity(county_code='01', district_code='61119', school_code='0000000',
+                   test_year=2016, entity_type_id=6, county_name='Alameda',
+                   district_name='Alameda Unified'),
+        ])
+        district = Entity.objects.get(district_code='61119', school_code='0000000')
+        school = EntityRead.objects.get(school_code='0111765')
+        self.assertEqual(school.district_id, district.pk)
+        self.assertEqual(school.name, 'Alameda Unified')
+
+        Entity.objects.filter(district_code='61119').update(zipcode='94501')
+        self.assertEqual(EntityRead.objects.filter(zipcode='94501').count(), 2)
+        Entity.objects.filter(district_code='61119').delete()
+        self.assertEqual(EntityRead.objects.count(), Entity.objects.count())
+
+    def test_parent_changes_reach_children(self):
+        school = self.create('61119', '0111765', district_name='Alameda Unified')
+        self.assertIsNone(self.read(school).district_id)
+        district = self.create('61119', '0000000', district_name='Alameda Unified')
+        self.assertEqual(self.read(school).district_id, district.pk)
+        self.county.delete()
+        self.assertIsNone(self.read(school).county_id)
+        self.assertIsNone(self.read(district).county_id)
+
+    def test_updates_and_type_changes_are_synced(self):
+        self.county.county_name = 'Alameda County'
+        self.county.save()
+        self.assertEqual(self.read(self.county).name, 'Alameda County')
+        Type.objects.filter(type_id=5).update(description='Counties')
+        self.assertEqual(self.read(self.county).entity_type_description, 'Counties')
+
+    def test_detached_years_are_removed(self):
+        partitions.create_partition(2016)
+        self.assertEqual(EntityRead.objects.filter(test_year=2016).count(), 2)
+        partitions.detach_partition(2016)
+        self.assertFalse(EntityRead.objects.exists())
+
+    def test_reattached_years_are_refreshed(self):
+        school = self.create('61119', '0111765', district_name='Alameda Unified')
+        partitions.create_partition(2016)
+        partitions.detach_partition(2016)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'ALTER TABLE api_entity ATTACH PARTITION api_entity_2016 FOR VALUES IN (2016)'
+            )
+        partitions.refresh_entity_read(2016)
+        self.assertEqual(EntityRead.objects.count(), 3)
+        row = self.read(school)
+        self.assertEqual((row.name, row.county_id), ('Alameda Unified', self.county.pk))
+
+
+class EntityReadConcurrencyTest(TransactionTestCase):
+    """Concurrent writers need their own connections, so nothing is rolled back."""
+    fixtures = ['testing']
+
+    def test_concurrent_loads_link_parents(self):
+        Type.objects.create(type_id=6, description='District')
+        Type.objects.create(type_id=7, description='School')
+
+        def insert_school():
+            try:
+                Entity.objects.create(
+                    county_code='01', district_code='61119', school_code='0111765',
+                    test_year=2016, entity_type_id=7, county_name='Alameda',
+                )
+            finally:
+                connection.close()
+
+        with transaction.atomic():
+            district = Entity.objects.create(
+                county_code='01', district_code='61119', school_code='0000000',
+                test_year=2016, entity_type_id=6, county_name='Alameda',
+            )
+            thread = threading.Thread(target=insert_school)
+            thread.start()
+            # Commit only once the school's insert waits for this transaction.
+            with connection.cursor() as cursor:
+                waiting = 0
+                while not waiting and thread.is_alive():
+                    cursor.execute('SELECT count(*) FROM pg_locks WHERE NOT granted')
+                    waiting = cursor.fetchone()[0]
+        thread.join()
+        school = EntityRead.objects.get(school_code='0111765')
+        self.assertEqual(school.district_id, district.pk)
+
+
 class TypeModelTest(TestCase):
 
     def setUp(self):
@@ -0,0 +1,78 @@
+from io import StringIO
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase
+from api import partitions
+from api.models import Entity, Score
+
+
+class PartitionTest(TestCase):
+    fixtures = ['testing']
+
+    def rows_in(self, table):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT count(*) FROM {}'.format(table))
+            return cursor.fetchone()[0]
+
+    def test_years_without_partition_use_default(self):
+        self.assertEqual(partitions.partitions(Entity), {'api_entity_default': 'DEFAULT'})
+        self.assertEqual(self.rows_in('api_entity_default'), 2)
+
+    def test_create_partition_moves_rows_out_of_default(self):
+        self.assertEqual(partitions.create_partition(2016), ['api_entity_2016', 'api_score_2016'])
+        self.assertEqual(self.rows_in('api_entity_2016'), 2)
+        self.assertEqual(self.rows_in('api_entity_default'), 0)
+        self.assertEqual(Entity.objects.filter(test_year=2016).count(), 2)
+        self.assertEqual(partitions.create_partition(2016), [])
+
+    def test_single_year_queries_are_pruned(self):
+        partitions.create_partition(2016)
+        partitions.create_partition(2017)
+        plan = Entity.objects.filter(test_year=2016).explain()
+        self.assertIn('api_entity_2016', plan)
+        self.assertNotIn('api_entity_2017', plan)
+        self.assertNotIn('api_entity_default', plan)
+
+    def test_new_rows_are_routed_and_indexed(self):
+        partitions.create_partition(2019)
+        entity = Entity.objects.create(
+            county_code='01', district_code='00000', school_code='0000000',
+            test_year=2019, entity_type_id=5, county_name='Alameda',
+        )
+        self.assertEqual(self.rows_in('api_entity_2019'), 1)
+        self.assertEqual(Entity.objects.get(pk=entity.pk).county_name, 'Alameda')
+        self.assertTrue(Entity.objects.filter(search_vector='alameda').exists())
+
+    def test_detach_partition_keeps_table(self):
+        partitions.create_partition(2016)
+        self.assertEqual(partitions.detach_partition(2016), ['api_entity_2016', 'api_score_2016'])
+        self.assertEqual(Entity.objects.count(), 0)
+        self.assertEqual(Score.objects.count(), 0)
+        self.assertEqual(self.rows_in('api_entity_2016'), 2)
+
+
+class PartitionCommandTest(TestCase):
+    fixtures = ['testing']
+
+    def test_create_partition_defaults_to_next_year(self):
+        out = StringIO()
+        call_command('create_partition', stdout=out)
+        self.assertIn('api_entity_2017', out.getvalue())
+        call_command('create_partition', stdout=out)
+        self.assertIn('api_entity_2018', out.getvalue())
+
+    def test_create_partition_for_years(self):
+        out = StringIO()
+        call_command('create_partition', 2016, 2016, stdout=out)
+        self.assertIn('Partitions for 2016 already exist.', out.getvalue())
+        self.assertEqual(partitions.partition_years(Score), [2016])
+
+    def test_detach_partition_drop(self):
+        call_command('create_partition', 2016, stdout=StringIO())
+        out = StringIO()
+        call_command('detach_partition', 2016, drop=True, stdout=out)
+        self.assertIn('Dropped api_entity_2016, api_score_2016', out.getvalue())
+        self.assertEqual(Entity.objects.count(), 0)
+        with self.assertRaises(CommandError):
+            call_command('detach_partition', 2016, stdout=StringIO())
@@ -0,0 +1,135 @@
+import threading
+from unittest import skipUnless
+from django.db import connection
+from django.db.utils import OperationalError, load_backend
+from django.test import TestCase
+from api import metrics
+from api.backends.postgresql_pool.base import close_pools, pools
+
+ENGINE = 'api.backends.postgresql_pool'
+
+
+class ConnectionPoolTest(TestCase):
+
+    def setUp(self):
+        self.settings_dict = dict(
+            connection.settings_dict,
+            ENGINE=ENGINE,
+            # Keeps these pools apart from the test runner's when it is pooled too.
+            OPTIONS=dict(connection.settings_dict['OPTIONS'], application_name='pooltest'),
+            POOL={'MIN_SIZE': 0, 'MAX_SIZE': 2, 'TIMEOUT': 0.1, 'CHECK_INTERVAL': 30},
+        )
+        self.wrappers = []
+
+    def tearDown(self):
+        for wrapper in self.wrappers:
+            wrapper.close()
+        for key in [key for key in pools if 'pooltest' in key[2]]:
+            pools.pop(key).closeall()
+
+    def wrapper(self, **pool):
+        settings_dict = dict(self.settings_dict, POOL=dict(self.settings_dict['POOL'], **pool))
+        wrapper = load_backend(ENGINE).DatabaseWrapper(settings_dict, alias='default')
+        self.wrappers.append(wrapper)
+        return wrapper
+
+    def backend_pid(self, wrapper):
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT pg_backend_pid()')
+            return cursor.fetchone()[0]
+
+    def test_close_returns_connection_to_pool(self):
+        wrapper = self.wrapper()
+        pid = self.backend_pid(wrapper)
+        wrapper.close()
+        self.assertEqual(wrapper.pool.stats(), {'in_use': 0, 'idle': 1})
+        self.assertEqual(self.backend_pid(wrapper), pid)
+        self.assertEqual(wrapper.pool.stats(), {'in_use': 1, 'idle': 0})
+
+    def test_connections_are_shared_between_threads(self):
+        first = self.wrapper()
+        pid = self.backend_pid(first)
+        first.close()
+        pids = []
+
+        def borrow():
+            second = load_backend(ENGINE).DatabaseWrapper(self.settings_dict, alias='default')
+            pids.append(self.backend_pid(second))
+            second.close()
+
+        thread = threading.Thread(target=borrow)
+        thread.start()
+        thread.join()
+        self.assertEqual(pids, [pid])
+        self.assertEqual(len([key for key in pools if 'pooltest' in key[2]]), 1)
+
+    def test_open_transaction_is_rolled_back_on_return(self):
+        wrapper = self.wrapper()
+        wrapper.ensure_connection()
+        wrapper.set_autocommit(False)
+        with wrapper.cursor() as cursor:
+            cursor.execute('CREATE TEMPORARY TABLE pooled (id int)')
+        wrapper.close()
+        with wrapper.cursor() as cursor:
+            cursor.execute("SELECT to_regclass('pg_temp.pooled')")
+            self.assertIsNone(cursor.fetchone()[0])
+        self.assertTrue(wrapper.get_autocommit())
+
+    def test_session_state_is_discarded_on_return(self):
+        wrapper = self.wrapper()
+        with wrapper.cursor() as cursor:
+            cursor.execute('CREATE TEMPORARY TABLE pooled (id int)')
+            cursor.execute("SET application_name = 'borrowed'")
+            cursor.execute('SELECT pg_advisory_lock(4242)')
+        pid = self.backend_pid(wrapper)
+        wrapper.close()
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT pg_backend_pid()')
+            self.assertEqual(cursor.fetchone()[0], pid)
+            cursor.execute("SELECT to_regclass('pg_temp.pooled')")
+            self.assertIsNone(cursor.fetchone()[0])
+            cursor.execute('SHOW application_name')
+            self.assertEqual(cursor.fetchone()[0], 'pooltest')
+            cursor.execute("SELECT count(*) FROM pg_locks WHERE locktype = 'advisory' "
+                           'AND pid = pg_backend_pid()')
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+    def test_waits_for_free_connection_then_times_out(self):
+        first, second, third = self.wrapper(), self.wrapper(), self.wrapper()
+        first.ensure_connection()
+        second.ensure_connection()
+        with self.assertRaisesMessage(OperationalError, "No free connection in the 'default' pool"):
+            third.ensure_connection()
+        first.close()
+        third.ensure_connection()
+        self.assertEqual(third.pool.stats(), {'in_use': 2, 'idle': 0})
+
+    def test_broken_idle_connection_is_replaced(self):
+        wrapper = self.wrapper(CHECK_INTERVAL=0)
+        pid = self.backend_pid(wrapper)
+        wrapper.close()
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_terminate_backend(%s)', [pid])
+        self.assertNotEqual(self.backend_pid(wrapper), pid)
+        self.assertEqual(wrapper.pool.stats(), {'in_use': 1, 'idle': 0})
+
+    def test_close_pools_closes_idle_connections(self):
+        wrapper = self.wrapper()
+        wrapper.ensure_connection()
+        raw = wrapper.connection
+        wrapper.close()
+        close_pools(self.settings_dict['NAME'])
+        self.assertTrue(raw.closed)
+        self.assertNotIn(wrapper.pool, pools.values())
+
+    @skipUnless(metrics.prometheus_client, 'prometheus_client is not installed')
+    def test_reports_connections_in_use(self):
+        wrapper = self.wrapper()
+        wrapper.ensure_connection()
+        registry = metrics.prometheus_client.REGISTRY
+        gauge = 'api_db_pool_connections'
+        in_use = {'alias': 'default', 'state': 'in_use'}
+        idle = {'alias': 'default', 'state': 'idle'}
+        self.assertEqual(registry.get_sample_value(gauge, in_use), 1)
+        wrapper.close()
+        self.assertEqual(registry.get_sample_value(gauge, idle), 1)
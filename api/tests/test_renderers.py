@@ -0,0 +1,96 @@
+import gzip
+import json
+from unittest import skipUnless
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+from api import renderers
+from api.middleware import brotli
+from api.models import Entity
+
+
+class CompressionTest(TestCase):
+    fixtures = ['testing']
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_gzip(self):
+        response = self.client.get('/api/entities/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertTrue(response['ETag'].startswith('W/"'))
+        self.assertEqual(json.loads(gzip.decompress(response.content))['count'], 2)
+
+    @skipUnless(brotli, 'brotli is not installed')
+    def test_brotli_is_preferred(self):
+        response = self.client.get('/api/entities/', HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(json.loads(brotli.decompress(response.content))['count'], 2)
+
+    @skipUnless(brotli, 'brotli is not installed')
+    def test_brotli_streaming_export(self):
+        response = self.client.get('/api/entities/export/', HTTP_ACCEPT_ENCODING='br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        content = brotli.decompress(b''.join(response.streaming_content)).decode()
+        self.assertEqual(len(content.splitlines()), 2)
+
+    def test_identity(self):
+        response = self.client.get('/api/entities/')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_conditional_get_matches_compressed_etag(self):
+        response = self.client.get('/api/entities/', HTTP_ACCEPT_ENCODING='gzip')
+        response = self.client.get(
+            '/api/entities/', HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, 304)
+
+
+@skipUnless(renderers.msgpack, 'msgpack is not installed')
+class MessagePackRendererTest(TestCase):
+    fixtures = ['testing']
+
+    def test_matches_json(self):
+        client = APIClient()
+        response = client.get('/api/entities/', HTTP_ACCEPT='application/x-msgpack')
+        self.assertEqual(response['Content-Type'], 'application/x-msgpack')
+        self.assertEqual(
+            renderers.msgpack.unpackb(response.content),
+            client.get('/api/entities/').json(),
+        )
+
+
+@skipUnless(renderers.pyarrow, 'pyarrow is not installed')
+class ArrowRendererTest(TestCase):
+    fixtures = ['testing']
+
+    def read(self, content):
+        return renderers.pyarrow.ipc.open_stream(content).read_all()
+
+    def test_list_is_columnar(self):
+        response = APIClient().get('/api/entities/?format=arrow')
+        self.assertEqual(response['Content-Type'], 'application/vnd.apache.arrow.stream')
+        table = self.read(response.content)
+        self.assertEqual(table.column('county_code').to_pylist(), ['00', '01'])
+        self.assertEqual(table.schema.field('test_year').type, renderers.pyarrow.int64())
+        self.assertEqual(table.schema.metadata[b'count'], b'2')
+
+    def test_null_columns_and_batches(self):
+        renderer = renderers.ArrowRenderer()
+        renderer.chunk_size = 2
+        rows = [[i, None if i < 3 else 'x'] for i in range(5)]
+        table = self.read(b''.join(renderer.stream(['id', 'name'], rows)))
+        self.assertEqual(table.column('id').to_pylist(), list(range(5)))
+        self.assertEqual(table.column('name').to_pylist(), [None, None, None, 'x', 'x'])
+
+    def test_export(self):
+        Entity.objects.create(
+            county_code='01', district_code='61119', school_code='0000000',
+            test_year=2017, entity_type_id=5, county_name='Alameda',
+        )
+        response = APIClient().get('/api/entities/export/?format=arrow&fields=id,county_name')
+        table = self.read(b''.join(response.streaming_content))
+        self.assertEqual(table.column_names, ['id', 'county_name'])
+        self.assertEqual(table.num_rows, 3)
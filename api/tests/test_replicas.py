@@ -0,0 +1,116 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connections
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from api import replicas
+from api.dataset import bump_dataset_version
+from api.models import Entity
+from api.replicas import ReplicaRouter, ReplicaSelector
+
+
+class ReplicaSelectorTest(TestCase):
+
+    def test_round_robin(self):
+        selector = ReplicaSelector()
+        chosen = [selector.acquire(['r1', 'r2', 'r3']) for _ in range(6)]
+        self.assertEqual(chosen, ['r1', 'r2', 'r3', 'r1', 'r2', 'r3'])
+
+    def test_least_connections(self):
+        selector = ReplicaSelector()
+        first = selector.acquire(['r1', 'r2'], 'least_connections')
+        second = selector.acquire(['r1', 'r2'], 'least_connections')
+        self.assertEqual({first, second}, {'r1', 'r2'})
+        selector.release('r1')
+        self.assertEqual(selector.acquire(['r1', 'r2'], 'least_connections'), 'r1')
+        self.assertEqual(selector.acquire(['r1', 'r2'], 'least_connections'), 'r2')
+
+
+class ReplicaRouterTest(TestCase):
+
+    def tearDown(self):
+        replicas.state.replica = None
+
+    def test_reads_follow_request_replica_until_a_write(self):
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(Entity), 'default')
+        replicas.state.replica = 'replica1'
+        self.assertEqual(router.db_for_read(Entity), 'replica1')
+        self.assertEqual(router.db_for_write(Entity), 'default')
+        self.assertEqual(router.db_for_read(Entity), 'default')
+
+    @override_settings(DATABASE_REPLICAS=['replica1'])
+    def test_replicas_are_not_migrated(self):
+        router = ReplicaRouter()
+        self.assertTrue(router.allow_migrate('default', 'api'))
+        self.assertFalse(router.allow_migrate('replica1', 'api'))
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], DB_REPLICA_PIN_SECONDS=0,
+                   DB_REPLICA_LAG_SECONDS=0)
+class ReplicaRoutingTest(TestCase):
+    """The replica is a second connection to the test database.
+
+    It cannot see the fixtures, which are only loaded inside the test
+    transaction of the primary connection, so empty results show a read
+    went to the replica.
+    """
+    fixtures = ['testing']
+
+    def setUp(self):
+        connections.databases['replica'] = dict(connections.databases['default'])
+        cache.clear()
+        self.client = APIClient()
+
+    def tearDown(self):
+        connections['replica'].close()
+        del connections.databases['replica']
+        delattr(connections._connections, 'replica')
+
+    def test_viewset_reads_go_to_replica(self):
+        with CaptureQueriesContext(connections['replica']) as queries:
+            response = self.client.get('/api/entities/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [])
+        self.assertTrue(queries.captured_queries)
+        self.assertEqual(replicas.selector.active['replica'], 0)
+
+    def test_streaming_export_reads_from_replica(self):
+        with CaptureQueriesContext(connections['replica']) as queries:
+            response = self.client.get('/api/entities/export/?format=ndjson')
+            self.assertEqual(replicas.selector.active['replica'], 1)
+            self.assertEqual(b''.join(response.streaming_content), b'')
+        self.assertTrue(queries.captured_queries)
+        self.assertEqual(replicas.selector.active['replica'], 0)
+
+    def test_other_views_and_writes_use_primary(self):
+        self.client.force_authenticate(user=User.objects.get(username='some_user'))
+        with CaptureQueriesContext(connections['replica']) as queries:
+            self.assertEqual(self.client.get('/admin/login/').status_code, 200)
+            response = self.client.post('/api/types/', {'type_id': 99, 'description': 'Other'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(queries.captured_queries, [])
+        self.assertIn(replicas.PIN_COOKIE, response.cookies)
+
+    @override_settings(DB_REPLICA_LAG_SECONDS=60)
+    def test_reads_stay_on_primary_after_writes(self):
+        bump_dataset_version()
+        response = self.client.get('/api/entities/')
+        self.assertNotEqual(response.data['results'], [])
+
+    @override_settings(DB_REPLICA_PIN_SECONDS=60)
+    def test_client_sticks_to_primary_after_its_write(self):
+        self.assertEqual(self.client.get('/api/entities/').data['results'], [])
+        self.client.cookies[replicas.PIN_COOKIE] = '1'
+        self.assertNotEqual(self.client.get('/api/entities/').data['results'], [])
+
+    def test_other_clients_leave_primary_after_the_lag(self):
+        bump_dataset_version()
+        self.assertEqual(self.client.get('/api/entities/').data['results'], [])
+
+    def test_pin_check_does_not_query_primary(self):
+        self.client.get('/api/entities/')
+        with CaptureQueriesContext(connections['default']) as queries:
+            self.client.get('/api/entities/')
+        self.assertEqual(queries.captured_queries, [])
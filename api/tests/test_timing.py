@@ -0,0 +1,69 @@
+import re
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+
+def server_timing(response):
+    """Return {metric: (duration, description)} from the Server-Timing header."""
+    metrics = {}
+    for entry in response['Server-Timing'].split(', '):
+        name, *params = entry.split(';')
+        params = dict(param.split('=', 1) for param in params)
+        metrics[name] = (float(params['dur']), params.get('desc', '').strip('"'))
+    return metrics
+
+
+@override_settings(API_TIMING_SAMPLE_RATE=1)
+class RequestTimingTest(TestCase):
+    fixtures = ['testing']
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_server_timing_header(self):
+        self.client.get('/api/entities/')
+        response = self.client.get('/api/entities/')
+        metrics = server_timing(response)
+        self.assertEqual(
+            list(metrics), ['db', 'serialize', 'render', 'view', 'total']
+        )
+        # The count of the first response is cached.
+        self.assertEqual(metrics['db'][1], '1 queries')
+        self.assertGreaterEqual(metrics['total'][0], metrics['db'][0])
+
+    def test_counts_every_query(self):
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/entities/')
+        self.assertEqual(server_timing(response)['db'][1], '4 queries')
+
+    def test_logs_structured_record(self):
+        with self.assertLogs('api.timing', 'INFO') as logs:
+            self.client.get('/api/entities/2/')
+        record = logs.records[0]
+        self.assertTrue(re.match(r'GET /api/entities/2/ 200 [\d.]+ms', record.getMessage()))
+        self.assertEqual(record.timing['status'], 200)
+        self.assertIn('serialize', record.timing)
+
+    def test_streaming_response(self):
+        with self.assertLogs('api.timing', 'INFO') as logs:
+            response = self.client.get('/api/entities/export/')
+            self.assertIn('db;dur=', response['Server-Timing'])
+            self.assertEqual(logs.records, [])
+            b''.join(response.streaming_content)
+        timing = logs.records[0].timing
+        self.assertGreaterEqual(timing['queries'], 1)
+        self.assertGreater(timing['db'], 0)
+
+    @override_settings(API_TIMING_SAMPLE_RATE=0)
+    def test_disabled(self):
+        response = self.client.get('/api/entities/')
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    @override_settings(API_TIMING_SAMPLE_RATE=0.5)
+    def test_sampling(self):
+        sampled = sum(
+            self.client.get('/api/types/').has_header('Server-Timing') for _ in range(200)
+        )
+        self.assertTrue(40 < sampled < 160, sampled)
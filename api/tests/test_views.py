@@ -1,8 +1,23 @@
-from django.test import TestCase
-from rest_framework.test import APIClient
+import csv
+import io
+import json
+import time
+from unittest import mock
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework import permissions
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
 from django.contrib.auth.models import User
 from api.views import TypeViewSet, EntityViewSet, TestViewSet, GradeViewSet
-from api.models import Type, Entity, Test, Grade, SubGroup
+from api.models import Type, Entity, Test, Grade, SubGroup, ProficiencyRollup, DatasetVersion
+from api.serializers import (
+    EntitySerializer, EntityReadSerializer, TypeSerializer, TestSerializer, GradeSerializer,
+    SubGroupSerializer,
+)
 
 class TypeViewSetTest(TestCase):
     fixtures = ['testing']
@@ -440,3 +455,676 @@ class SubGroupViewSetTest(TestCase):
         self.assertEqual(response.status_code, 204)
         new_count = SubGroup.objects.all().count()
         self.assertEqual(original_count - 1, new_count)
+
+
+class EntitySearchTest(TestCase):
+    fixtures = ['testing']
+
+    def setUp(self):
+        self.client = APIClient()
+        school_type = Type.objects.create(type_id=7, description='School')
+        district_type = Type.objects.create(type_id=6, description='District')
+        Entity.objects.create(
+            county_code='01',
+            district_code='61119',
+            school_code='0000000',
+            test_year=2016,
+            entity_type=district_type,
+            county_name='Alameda',
+            district_name='Lincoln Unified',
+        )
+        Entity.objects.create(
+            county_code='01',
+            district_code='61119',
+            school_code='0111765',
+            test_year=2016,
+            entity_type=school_type,
+            county_name='Alameda',
+            district_name='Alameda Unified',
+            school_name='Lincoln Middle',
+        )
+
+    def search(self, term):
+        response = self.client.get('/api/entities/', {'search': term})
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_prefix_match(self):
+        names = [result['school_name'] for result in self.search('linc mid')]
+        self.assertEqual(names, ['Lincoln Middle'])
+
+    def test_all_words_must_match(self):
+        self.assertEqual(self.search('lincoln sacramento'), [])
+
+    def test_school_name_matches_rank_first(self):
+        results = self.search('lincoln')
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0]['school_name'], 'Lincoln Middle')
+        self.assertEqual(results[1]['district_name'], 'Lincoln Unified')
+
+    def test_county_name_is_searchable(self):
+        self.assertEqual(len(self.search('alam')), 3)
+
+    def test_search_vector_not_serialized(self):
+        self.assertNotIn('search_vector', self.search('lincoln')[0])
+
+    def test_punctuation_is_ignored(self):
+        self.assertEqual(len(self.search('(lincoln)')), 2)
+
+
+class KeysetPaginationTest(TestCase):
+    fixtures = ['testing']
+
+    def setUp(self):
+        self.client = APIClient()
+        for code in range(5):
+            Entity.objects.create(
+                county_code='{:02d}'.format(code + 10),
+                district_code='00000',
+                school_code='0000000',
+                test_year=2017,
+                entity_type_id=5,
+                county_name='County {}'.format(code),
+            )
+        self.ids = list(Entity.objects.order_by('id').values_list('id', flat=True))
+
+    def walk(self, url, params=None):
+        ids = []
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            page = response.json()
+            self.assertNotIn('count', page)
+            ids.extend(
+                int(result['url'].rstrip('/').rsplit('/', 1)[1])
+                for result in page['results']
+            )
+            url, params = page['next'], None
+        return ids
+
+    def test_keyset_mode_walks_all_rows_in_id_order(self):
+        ids = self.walk('/api/entities/', {'pagination': 'keyset', 'limit': 2})
+        self.assertEqual(ids, self.ids)
+
+    def test_keyset_mode_respects_filters(self):
+        ids = self.walk('/api/entities/', {'pagination': 'keyset', 'test_year': 2017})
+        self.assertEqual(len(ids), 5)
+
+    def test_keyset_next_link_has_cursor(self):
+        response = self.client.get('/api/entities/', {'pagination': 'keyset', 'limit': 2})
+        self.assertIn('cursor=', response.json()['next'])
+
+    def test_offset_mode_is_default(self):
+        response = self.client.get('/api/entities/', {'limit': 2})
+        page = response.json()
+        self.assertEqual(page['count'], len(self.ids))
+        self.assertIn('offset=2', page['next'])
+
+
+class CountPaginationTest(TestCase):
+    fixtures = ['testing']
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.total = Entity.objects.count()
+
+    def count_queries(self, queries):
+        return [query for query in queries if 'COUNT(*)' in query['sql']]
+
+    def test_count_is_cached_per_filter(self):
+        with CaptureQueriesContext(connection) as first:
+            self.client.get('/api/entities/', {'limit': 2})
+        with CaptureQueriesContext(connection) as second:
+            page = self.client.get('/api/entities/', {'limit': 2, 'offset': 2}).json()
+        self.assertEqual(len(self.count_queries(first.captured_queries)), 1)
+        self.assertEqual(self.count_queries(second.captured_queries), [])
+        self.assertEqual(page['count'], self.total)
+        self.assertNotIn('count_estimated', page)
+
+        with CaptureQueriesContext(connection) as other:
+            self.client.get('/api/entities/', {'limit': 2, 'county_code': '01'})
+        self.assertEqual(len(self.count_queries(other.captured_queries)), 1)
+
+    def test_write_invalidates_cached_count(self):
+        self.client.get('/api/entities/', {'limit': 2})
+        Entity.objects.first().delete()
+        page = self.client.get('/api/entities/', {'limit': 2, 'offset': 2}).json()
+        self.assertEqual(page['count'], self.total - 1)
+
+    def test_count_false_skips_count(self):
+        with CaptureQueriesContext(connection) as queries:
+            page = self.client.get('/api/entities/', {'limit': 1, 'count': 'false'}).json()
+        self.assertEqual(self.count_queries(queries.captured_queries), [])
+        self.assertNotIn('count', page)
+        self.assertEqual(len(page['results']), 1)
+        self.assertIn('offset=1', page['next'])
+
+        last = self.client.get(
+            '/api/entities/', {'limit': 1, 'offset': self.total - 1, 'count': 'false'}
+        ).json()
+        self.assertEqual(len(last['results']), 1)
+        self.assertIsNone(last['next'])
+
+    @override_settings(API_COUNT_ESTIMATE_THRESHOLD=1)
+    def test_large_counts_are_estimated(self):
+        with CaptureQueriesContext(connection) as queries:
+            page = self.client.get('/api/entities/', {'limit': 1}).json()
+        self.assertEqual(self.count_queries(queries.captured_queries), [])
+        self.assertTrue(
+            any(query['sql'].startswith('EXPLAIN') for query in queries.captured_queries)
+        )
+        self.assertTrue(page['count_estimated'])
+        self.assertGreaterEqual(page['count'], 1)
+        self.assertEqual(len(page['results']), 1)
+        self.assertIsNotNone(page['next'])
+
+
+class EntityExportTest(TestCase):
+    fixtures = ['testing']
+
+    def setUp(self):
+        self.client = APIClient()
+        Entity.objects.create(
+            county_code='01',
+            district_code='61119',
+            school_code='0000000',
+            test_year=2017,
+            entity_type_id=5,
+            county_name='Alameda',
+            district_name='Alameda Unified',
+        )
+
+    def export(self, **params):
+        response = self.client.get('/api/entities/export/', params)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_ndjson_is_default(self):
+        response, content = self.export()
+        self.assertTrue(response['Content-Type'].startswith('application/x-ndjson'))
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(len(rows), Entity.objects.count())
+        self.assertEqual(rows[0]['county_name'], 'State of California')
+        self.assertEqual(rows[0]['entity_type'], 4)
+
+    def test_csv_format(self):
+        response, content = self.export(format='csv')
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+        self.assertIn('entities.csv', response['Content-Disposition'])
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual(len(rows), Entity.objects.count())
+        self.assertEqual(rows[-1]['district_name'], 'Alameda Unified')
+
+    def test_honors_list_filters(self):
+        response, content = self.export(format='csv', test_year=2017)
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual([row['test_year'] for row in rows], ['2017'])
+
+    def test_honors_search(self):
+        response, content = self.export(search='alameda unified')
+        self.assertEqual(len(content.splitlines()), 1)
+
+
+class ValuesReadTest(TestCase):
+    fixtures = ['testing']
+    endpoints = (
+        ('/api/entities/', EntityReadSerializer),
+        ('/api/types/', TypeSerializer),
+        ('/api/tests/', TestSerializer),
+        ('/api/grades/', GradeSerializer),
+        ('/api/subgroups/', SubGroupSerializer),
+    )
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def expected(self, path, serializer_class, instances, many):
+        request = Request(APIRequestFactory().get(path))
+        serializer = serializer_class(instances, many=many, context={'request': request})
+        return json.loads(json.dumps(serializer.data))
+
+    def test_list_matches_hyperlinked_serializer(self):
+        for path, serializer_class in self.endpoints:
+            with self.subTest(path=path):
+                model = serializer_class.Meta.model
+                instances = model.objects.order_by('pk')
+                results = self.client.get(path).json()['results']
+                results.sort(key=lambda result: result['url'])
+                expected = self.expected(path, serializer_class, instances, True)
+                expected.sort(key=lambda result: result['url'])
+                self.assertEqual(results, expected)
+
+    def test_retrieve_matches_hyperlinked_serializer(self):
+        for path, serializer_class in self.endpoints:
+            with self.subTest(path=path):
+                instance = serializer_class.Meta.model.objects.first()
+                detail = '{}{}/'.format(path, instance.pk)
+                response = self.client.get(detail)
+                self.assertEqual(
+                    response.json(),
+                    self.expected(detail, serializer_class, instance, False)
+                )
+
+    def test_object_permissions_get_model_instance(self):
+        class CountyOnly(permissions.BasePermission):
+            def has_object_permission(self, request, view, obj):
+                return obj.county_code == '01'
+
+        view = EntityViewSet.as_view(
+            {'get': 'retrieve'}, permission_classes=(CountyOnly,)
+        )
+        for entity in Entity.objects.all():
+            request = APIRequestFactory().get('/api/entities/{}/?fields=url'.format(entity.pk))
+            response = view(request, pk=entity.pk)
+            self.assertEqual(response.status_code == 200, entity.county_code == '01')
+
+    def test_retrieve_missing_returns_404(self):
+        response = self.client.get('/api/entities/999999/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_format_suffix_is_kept_in_urls(self):
+        response = self.client.get('/api/types.json')
+        self.assertTrue(response.json()['results'][0]['url'].endswith('.json'))
+
+
+class EntityNaturalKeyTest(TestCase):
+    fixtures = ['testing']
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_returns_entity_by_year_and_cds_code(self):
+        response = self.client.get('/api/entities/2016/01000000000000/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), self.client.get('/api/entities/2/').json())
+
+    def test_unknown_entity_returns_404(self):
+        response = self.client.get('/api/entities/2017/01000000000000/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_route_only_matches_full_codes(self):
+        response = self.client.get('/api/entities/2016/0100000/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_natural_key_is_unique(self):
+        entity = Entity.objects.get(pk=2)
+        data = EntitySerializer(entity, context={
+            'request': Request(APIRequestFactory().get('/'))
+        }).data
+        serializer = EntitySerializer(data=dict(data, county_name='Copy'), context={
+            'request': Request(APIRequestFactory().post('/'))
+        })
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('non_field_errors', serializer.errors)
+
+
+class EntityBatchTest(TestCase):
+    fixtures = ['testing']
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        Entity.objects.bulk_create(
+            Entity(
+                county_code='01', district_code='61119', school_code='{:07d}'.format(i),
+                test_year=2016, entity_type_id=5, county_name='Alameda',
+            )
+            for i in range(1, 301)
+        )
+
+    def codes(self, schools):
+        return ['0161119{:07d}'.format(school) for school in schools]
+
+    def test_returns_codes_in_request_order(self):
+        schools = list(range(300, 0, -3))
+        self.client.post('/api/entities/batch/', {'ids': []}, format='json')
+        with self.assertNumQueries(1):
+            response = self.client.post('/api/entities/batch/', {
+                'test_year': 2016, 'cds_codes': self.codes(schools),
+            }, format='json')
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([int(entity['school_code']) for entity in results], schools)
+        self.assertEqual(results[0], self.client.get(results[0]['url']).json())
+        self.assertEqual(response.json()['missing'], [])
+
+    def test_reports_missing_codes(self):
+        codes = self.codes([5, 999]) + ['01000000000000']
+        response = self.client.post('/api/entities/batch/', {
+            'test_year': 2016, 'cds_codes': codes,
+        }, format='json')
+        self.assertEqual(len(response.json()['results']), 2)
+        self.assertEqual(response.json()['missing'], self.codes([999]))
+
+    def test_other_years_are_not_matched(self):
+        response = self.client.post('/api/entities/batch/', {
+            'test_year': 2017, 'cds_codes': self.codes([1]),
+        }, format='json')
+        self.assertEqual(response.json()['results'], [])
+
+    def test_by_ids(self):
+        response = self.client.post('/api/entities/batch/', {'ids': [2, 999999, 1]}, format='json')
+        self.assertEqual([entity['county_code'] for entity in response.json()['results']],
+                         ['01', '00'])
+        self.assertEqual(response.json()['missing'], [999999])
+
+    def test_invalid_body(self):
+        for body in ({'ids': ['a']}, {'cds_codes': self.codes([1])},
+                     {'test_year': 2016, 'cds_codes': ['123']}, []):
+            with self.subTest(body=body):
+                response = self.client.post('/api/entities/batch/', body, format='json')
+                self.assertEqual(response.status_code, 400)
+
+    def test_too_many_keys(self):
+        response = self.client.post('/api/entities/batch/', {
+            'ids': list(range(EntityViewSet.batch_max_keys + 1)),
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class FieldProjectionTest(TestCase):
+    fixtures = ['testing']
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_fields_narrow_payload_and_query(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/entities/?fields=county_code,zipcode')
+        self.assertEqual(response.status_code, 200)
+        for entity in response.json()['results']:
+            self.assertEqual(list(entity), ['county_code', 'zipcode'])
+        select = [query['sql'] for query in context.captured_queries
+                  if 'county_code' in query['sql']][-1]
+        self.assertNotIn('school_name', select)
+        self.assertNotIn('district_name', select)
+
+    def test_exclude(self):
+        response = self.client.get('/api/entities/2/?exclude=district_name,school_name')
+        self.assertNotIn('school_name', response.json())
+        self.assertEqual(response.json()['county_name'], 'Alameda')
+
+    def test_every_endpoint_projects(self):
+        for path in ('/api/types/', '/api/tests/', '/api/grades/', '/api/subgroups/',
+                     '/api/rollups/'):
+            with self.subTest(path=path):
+                response = self.client.get(path + '?fields=url')
+                self.assertEqual(response.status_code, 200)
+                for result in response.json()['results']:
+                    self.assertEqual(list(result), ['url'])
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get('/api/entities/?fields=county_code,nope')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('nope', response.json()['fields'][0])
+
+    def test_keyset_pages_without_url(self):
+        response = self.client.get('/api/entities/?pagination=keyset&limit=1&fields=county_code')
+        self.assertEqual(response.json()['results'], [{'county_code': '00'}])
+        self.assertEqual(self.client.get(response.json()['next']).json()['results'],
+                         [{'county_code': '01'}])
+
+    def test_export(self):
+        response = self.client.get('/api/entities/export/?format=csv&fields=id,county_code')
+        content = b''.join(response.streaming_content).decode()
+        self.assertEqual(content.splitlines()[0], 'id,county_code')
+
+    def test_batch(self):
+        response = self.client.post(
+            '/api/entities/batch/?fields=county_code', {'ids': [1]}, format='json'
+        )
+        self.assertEqual(response.json()['results'], [{'county_code': '00'}])
+
+    def test_writes_are_not_projected(self):
+        self.client.force_authenticate(user=User.objects.get(username='some_user'))
+        response = self.client.post('/api/types/?fields=url', {
+            'type_id': 9, 'description': 'Charter'
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['description'], 'Charter')
+
+
+class ResponseCacheTest(TestCase):
+    fixtures = ['testing']
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.get(username='some_user')
+
+    def values(self, path='/api/types/', key='description'):
+        return [result[key] for result in self.client.get(path).json()['results']]
+
+    def test_repeat_get_is_served_without_queries(self):
+        self.client.get('/api/types/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/types/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), Type.objects.count())
+
+    def test_query_string_is_part_of_the_key(self):
+        self.client.get('/api/types/', {'limit': 1})
+        response = self.client.get('/api/types/', {'limit': 2})
+        self.assertEqual(len(response.json()['results']), 2)
+
+    def test_post_invalidates(self):
+        self.values()
+        self.client.force_authenticate(user=self.user)
+        self.client.post('/api/types/', {'type_id': 6, 'description': 'District'})
+        self.assertIn('District', self.values())
+
+    def test_update_invalidates(self):
+        grade = Grade.objects.first()
+        self.client.get('/api/grades/{}/'.format(grade.id))
+        grade.description = 'Third'
+        grade.save()
+        response = self.client.get('/api/grades/{}/'.format(grade.id))
+        self.assertEqual(response.json()['description'], 'Third')
+
+    def test_delete_invalidates(self):
+        test = Test.objects.first()
+        self.values('/api/tests/', 'name')
+        test.delete()
+        self.assertNotIn(test.name, self.values('/api/tests/', 'name'))
+
+    def test_errors_are_not_cached(self):
+        self.client.get('/api/types/999/')
+        Type.objects.create(id=999, type_id=98, description='Late')
+        self.assertEqual(self.client.get('/api/types/999/').status_code, 200)
+
+
+class ConditionalGetTest(TestCase):
+    fixtures = ['testing']
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_get_has_strong_etag_and_last_modified(self):
+        response = self.client.get('/api/entities/', {'test_year': 2016})
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertIn('Last-Modified', response)
+
+    def test_if_none_match_returns_304_without_queries(self):
+        etag = self.client.get('/api/entities/', {'test_year': 2016})['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                '/api/entities/', {'test_year': 2016}, HTTP_IF_NONE_MATCH=etag
+            )
+        self.assertEqual(response.status_code, 304)
+
+    def test_if_modified_since_returns_304(self):
+        last_modified = self.client.get('/api/types/')['Last-Modified']
+        response = self.client.get('/api/types/', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_differs_per_url(self):
+        first = self.client.get('/api/entities/', {'test_year': 2016})['ETag']
+        second = self.client.get('/api/entities/', {'test_year': 2017})['ETag']
+        self.assertNotEqual(first, second)
+
+    def test_write_changes_etag(self):
+        etag = self.client.get('/api/grades/')['ETag']
+        Entity.objects.get(pk=1).save()
+        response = self.client.get('/api/grades/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_bump_from_another_process_is_seen_after_timeout(self):
+        with mock.patch('api.dataset.VERSION_TIMEOUT', 0.05):
+            etag = self.client.get('/api/grades/')['ETag']
+            # Another process bumps the row without touching this process' cache.
+            DatasetVersion.objects.filter(pk=1).update(version=F('version') + 1)
+            cached = self.client.get('/api/grades/', HTTP_IF_NONE_MATCH=etag)
+            time.sleep(0.1)
+            response = self.client.get('/api/grades/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(response.status_code, 200)
+
+    def test_entity_delete_changes_etag(self):
+        self.client.force_authenticate(user=User.objects.get(username='some_user'))
+        entity = Entity.objects.create(
+            county_code='02', district_code='00000', school_code='0000000', test_year=2016,
+            entity_type_id=5, county_name='Alpine',
+        )
+        etag = self.client.get('/api/grades/')['ETag']
+        self.client.delete('/api/entities/{}/'.format(entity.pk))
+        response = self.client.get('/api/grades/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_entity_queryset_delete_bumps_nothing_per_row(self):
+        with mock.patch('api.signals.bump_dataset_version') as bump:
+            Entity.objects.filter(county_code='01').delete()
+        self.assertFalse(bump.called)
+
+    def test_unversioned_models_keep_fast_deletes(self):
+        ProficiencyRollup.objects.create(
+            test_year=2016, level='state', county_code='00', district_code='00000',
+            school_code='0000000', test_id=1, grade=Grade.objects.get(num='03'),
+            subgroup_id=1, schools=1, students_with_scores=1, students_exceeded=1,
+            students_met_and_above=1, pct_exceeded='1.00', pct_met_and_above='1.00',
+        )
+        with self.assertNumQueries(1):
+            ProficiencyRollup.objects.filter(test_year=2016).delete()
+
+
+class ProficiencyRollupViewSetTest(TestCase):
+    fixtures = ['testing']
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.get(username='some_user')
+        grade = Grade.objects.get(num='03')
+        for county_code, level, pct in (('00', 'state', '48.10'), ('01', 'county', '55.20')):
+            ProficiencyRollup.objects.create(
+                test_year=2016, level=level, county_code=county_code,
+                district_code='00000', school_code='0000000', test_id=1,
+                grade=grade, subgroup_id=1, schools=10, students_with_scores=1000,
+                students_exceeded=200, students_met_and_above=500,
+                pct_exceeded='20.00', pct_met_and_above=pct,
+            )
+
+    def test_filter_by_level(self):
+        response = self.client.get('/api/rollups/', {'test_year': 2016, 'level': 'county'})
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]['pct_met_and_above'], '55.20')
+        self.assertEqual(results[0]['test'], 1)
+        self.assertTrue(results[0]['grade'].endswith('/api/grades/{}/'.format(
+            Grade.objects.get(num='03').pk
+        )))
+
+    def test_read_only(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post('/api/rollups/', {'test_year': 2017})
+        self.assertEqual(response.status_code, 405)
+
+
+class BulkWriteTest(TestCase):
+    fixtures = ['testing']
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.get(username='some_user')
+        self.client.force_authenticate(user=self.user)
+
+    def entity(self, school_code, **fields):
+        row = {
+            'county_code': '01',
+            'district_code': '61119',
+            'school_code': school_code,
+            'test_year': 2018,
+            'entity_type': 5,
+            'county_name': 'Alameda',
+        }
+        row.update(fields)
+        return row
+
+    def test_unauthorized_cannot_bulk_write(self):
+        self.client.force_authenticate(user=None)
+        response = self.client.post('/api/entities/bulk/', [self.entity('0000001')], format='json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_creates_and_updates_in_one_request(self):
+        original_count = Entity.objects.count()
+        rows = [self.entity('{:07d}'.format(i)) for i in range(100)]
+        rows.append(self.entity('9999999', id=1, county_name='Renamed'))
+        response = self.client.post('/api/entities/bulk/', rows, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'created': 100, 'updated': 1})
+        self.assertEqual(Entity.objects.count(), original_count + 100)
+        self.assertEqual(Entity.objects.get(pk=1).county_name, 'Renamed')
+
+    def test_ndjson_body(self):
+        body = '\n'.join(json.dumps(self.entity('{:07d}'.format(i))) for i in range(3))
+        response = self.client.post(
+            '/api/entities/bulk/', body, content_type='application/x-ndjson'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['created'], 3)
+
+    def test_per_row_errors_write_nothing(self):
+        original_count = Entity.objects.count()
+        rows = [
+            self.entity('0000001'),
+            self.entity('0000002', entity_type=42),
+            self.entity('00000003'),
+            self.entity('0000004', id=999999),
+        ]
+        response = self.client.post('/api/entities/bulk/', rows, format='json')
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()['errors']
+        self.assertEqual([error['index'] for error in errors], [1, 2, 3])
+        self.assertIn('entity_type', errors[0]['errors'])
+        self.assertIn('school_code', errors[1]['errors'])
+        self.assertEqual(Entity.objects.count(), original_count)
+
+    def test_unique_fields_checked_against_payload_and_table(self):
+        rows = [
+            {'subgroup_id': 1, 'description': 'Clash', 'category': 'All'},
+            {'subgroup_id': 500, 'description': 'First', 'category': 'Test'},
+            {'subgroup_id': 500, 'description': 'Second', 'category': 'Test'},
+            {'subgroup_id': 501, 'description': 'Fine', 'category': 'Test'},
+        ]
+        response = self.client.post('/api/subgroups/bulk/', rows, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['index'] for error in response.json()['errors']], [0, 1, 2])
+
+    def test_update_may_keep_its_own_unique_value(self):
+        subgroup = SubGroup.objects.first()
+        rows = [{
+            'id': subgroup.id,
+            'subgroup_id': subgroup.subgroup_id,
+            'description': 'Renamed',
+            'category': 'All Students',
+        }]
+        response = self.client.post('/api/subgroups/bulk/', rows, format='json')
+        self.assertEqual(response.status_code, 200, response.json())
+        self.assertEqual(SubGroup.objects.get(pk=subgroup.pk).description, 'Renamed')
+
+    def test_rejects_non_list_body(self):
+        response = self.client.post('/api/entities/bulk/', self.entity('0000001'), format='json')
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,93 @@
+"""Per-request SQL and phase timings, see `RequestTimingMiddleware`.
+
+Sampled requests carry a `RequestTimings` as `request.timings`. Every query
+on every connection is counted and timed through `execute_wrapper`, and
+views mark the serialize phase with `timed(request, 'serialize')`. Time spent
+in queries inside a phase is only counted as DB time.
+"""
+import random
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from django.conf import settings
+
+
+class RequestTimings:
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db = 0.0
+        self.phases = OrderedDict()
+        self.view_started = None
+        self.view_finished = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db += time.perf_counter() - started
+
+    @contextmanager
+    def phase(self, name):
+        started, db = time.perf_counter(), self.db
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started - (self.db - db)
+            self.phases[name] = self.phases.get(name, 0.0) + elapsed
+
+    def start_view(self):
+        self.view_started = time.perf_counter()
+
+    def finish_view(self):
+        self.view_finished = time.perf_counter()
+
+    def finish_render(self, response=None):
+        if self.view_finished is not None:
+            self.phases['render'] = time.perf_counter() - self.view_finished
+
+    def metrics(self):
+        """Return {name: milliseconds} plus the query count."""
+        metrics = OrderedDict(db=self.db * 1000)
+        metrics.update((name, seconds * 1000) for name, seconds in self.phases.items())
+        if self.view_started is not None and self.view_finished is not None:
+            view = self.view_finished - self.view_started - sum(
+                seconds for name, seconds in self.phases.items() if name != 'render'
+            )
+            # Query time is already reported under db.
+            metrics['view'] = max(view * 1000 - metrics['db'], 0.0)
+        metrics['total'] = (time.perf_counter() - self.started) * 1000
+        return metrics
+
+    def server_timing(self, metrics):
+        entries = []
+        for name, duration in metrics.items():
+            entry = '{};dur={:.2f}'.format(name, duration)
+            if name == 'db':
+                entry += ';desc="{} queries"'.format(self.queries)
+            entries.append(entry)
+        return ', '.join(entries)
+
+
+def sampled():
+    """Whether to measure this request, see `API_TIMING_SAMPLE_RATE`."""
+    rate = settings.API_TIMING_SAMPLE_RATE
+    return rate >= 1 or (rate > 0 and random.random() < rate)
+
+
+def get_timings(request):
+    return getattr(request, 'timings', None)
+
+
+@contextmanager
+def timed(request, name):
+    """Time the block as phase `name` when the request is sampled."""
+    timings = get_timings(request)
+    if timings is None:
+        yield
+    else:
+        with timings.phase(name):
+            yield
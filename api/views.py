@@ -1,20 +1,42 @@
-from rest_framework import viewsets, filters, permissions
+from django.db.models.expressions import RawSQL
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from rest_framework import viewsets, permissions, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from api.models import Entity, Type, Test, Grade, SubGroup
-from api.serializers import EntitySerializer, TypeSerializer, TestSerializer, GradeSerializer, SubGroupSerializer
+from api import metrics
+from api.cache import CachedResponseMixin
+from api.filters import FullTextSearchFilter
+from api.mixins import (
+    BulkWriteMixin, ConditionalGetMixin, ReadModelMixin, TimingMixin, ValuesReadMixin,
+)
+from api.models import Entity, EntityRead, Type, Test, Grade, SubGroup, ProficiencyRollup
+from api.renderers import ArrowRenderer, CSVRenderer, NDJSONRenderer
+from api.serializers import (
+    EntitySerializer, EntityReadSerializer, TypeSerializer, TestSerializer, GradeSerializer,
+    SubGroupSerializer, ProficiencyRollupSerializer, ValuesSerializer, projected_fields,
+)
+from api.timing import timed
 
 
-class TypeViewSet(viewsets.ModelViewSet):
+class TypeViewSet(TimingMixin, ConditionalGetMixin, CachedResponseMixin, ValuesReadMixin,
+                  viewsets.ModelViewSet):
     queryset = Type.objects.all()
     serializer_class = TypeSerializer
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
 
 
-class EntityViewSet(viewsets.ModelViewSet):
+class EntityViewSet(TimingMixin, ConditionalGetMixin, BulkWriteMixin, ReadModelMixin,
+                    ValuesReadMixin, viewsets.ModelViewSet):
     queryset = Entity.objects.all()
     serializer_class = EntitySerializer
+    # Reads of single entities and pages of them use precomputed rows, see `EntityRead`.
+    read_actions = ('list', 'retrieve', 'natural_key', 'batch')
+    read_queryset = EntityRead.objects.all()
+    read_serializer_class = EntityReadSerializer
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
-    filter_backends = (DjangoFilterBackend, filters.SearchFilter)
+    filter_backends = (DjangoFilterBackend, FullTextSearchFilter)
     filter_fields = (
         'county_code',
         'district_code',
@@ -24,21 +46,166 @@ class EntityViewSet(viewsets.ModelViewSet):
         'zipcode',
     )
     search_fields = ('county_name', 'district_name', 'school_name')
+    search_vector_field = 'search_vector'
+    batch_max_keys = 5000
+    export_fields = (
+        'id',
+        'county_code',
+        'district_code',
+        'school_code',
+        'test_year',
+        'entity_type',
+        'county_name',
+        'district_name',
+        'school_name',
+        'zipcode',
+    )
+
+    @action(
+        detail=False,
+        url_path=r'(?P<test_year>\d{4})/(?P<cds_code>\d{14})',
+        url_name='natural-key',
+    )
+    def natural_key(self, request, test_year, cds_code, format=None):
+        """Retrieve one entity by test year and 14 digit county-district-school code."""
+        serializer = self.get_values_serializer()
+        row = get_object_or_404(
+            serializer.values(self.get_queryset()),
+            test_year=test_year,
+            county_code=cds_code[:2],
+            district_code=cds_code[2:7],
+            school_code=cds_code[7:],
+        )
+        self.check_row_permissions(request, row)
+        with timed(request, 'serialize'):
+            data = serializer.to_representation(row)
+        return Response(data)
+
+    @action(detail=False, methods=['post'], permission_classes=(permissions.AllowAny,))
+    def batch(self, request):
+        """Retrieve many entities in one query, in the order they were asked for.
+
+        The body holds either `ids` or a `test_year` and 14 digit `cds_codes`.
+        Keys that match nothing are listed under `missing`.
+        """
+        data = request.data if isinstance(request.data, dict) else {}
+        if 'ids' in data:
+            keys, error = self.batch_ids(data['ids'])
+        else:
+            keys, error = self.batch_cds_codes(data.get('test_year'), data.get('cds_codes'))
+        if error is None and len(keys) > self.batch_max_keys:
+            error = 'At most {} keys per request.'.format(self.batch_max_keys)
+        if error is not None:
+            return Response({'detail': error}, status=status.HTTP_400_BAD_REQUEST)
+
+        model_serializer = self.get_serializer()
+        model_serializer.project(request.query_params)
+        serializer = ValuesSerializer(model_serializer)
+        if 'ids' in data:
+            rows = self.get_queryset().filter(pk__in=set(keys)).values(*serializer.columns, 'id')
+            found = {row['id']: row for row in rows}
+        else:
+            queryset = self.get_queryset().filter(test_year=data['test_year'])
+            matches = RawSQL(
+                'SELECT id FROM {} WHERE test_year = %s '
+                'AND (county_code, district_code, school_code) IN ('
+                'SELECT * FROM unnest(%s::text[], %s::text[], %s::text[]))'.format(
+                    queryset.model._meta.db_table
+                ),
+                [data['test_year'], [key[:2] for key in keys], [key[2:7] for key in keys],
+                 [key[7:] for key in keys]],
+            )
+            found = {
+                row['county_code'] + row['district_code'] + row['school_code']: row
+                for row in queryset.filter(pk__in=matches).values(
+                    *serializer.columns, 'county_code', 'district_code', 'school_code'
+                )
+            }
+        with timed(request, 'serialize'):
+            results = [serializer.to_representation(found[key]) for key in keys if key in found]
+        return Response({
+            'results': results,
+            'missing': [key for key in keys if key not in found],
+        })
+
+    def batch_ids(self, ids):
+        if not isinstance(ids, list) or not all(
+                isinstance(pk, int) and not isinstance(pk, bool) for pk in ids):
+            return None, '`ids` must be a list of integers.'
+        return ids, None
 
+    def batch_cds_codes(self, test_year, cds_codes):
+        if not isinstance(test_year, int) or isinstance(test_year, bool):
+            return None, '`test_year` must be an integer.'
+        if not isinstance(cds_codes, list) or not all(
+                isinstance(code, str) and len(code) == 14 and code.isdigit()
+                for code in cds_codes):
+            return None, '`cds_codes` must be a list of 14 digit codes.'
+        return cds_codes, None
 
-class TestViewSet(viewsets.ModelViewSet):
+    @action(detail=False, renderer_classes=tuple(
+        renderer for renderer in (NDJSONRenderer, CSVRenderer, ArrowRenderer) if renderer.available
+    ))
+    def export(self, request):
+        """Stream every entity matching the list filters as NDJSON, CSV or Arrow."""
+        fields = projected_fields(self.export_fields, request.query_params)
+        queryset = self.filter_queryset(self.get_queryset())
+        if not queryset.ordered:
+            queryset = queryset.order_by('pk')
+        rows = queryset.values_list(*fields).iterator(chunk_size=2000)
+        renderer = request.accepted_renderer
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = '{}; charset={}'.format(content_type, renderer.charset)
+        response = StreamingHttpResponse(renderer.stream(fields, rows), content_type=content_type)
+        response['Content-Disposition'] = 'attachment; filename="entities.{}"'.format(
+            renderer.format
+        )
+        return response
+
+
+class TestViewSet(TimingMixin, ConditionalGetMixin, CachedResponseMixin, ValuesReadMixin,
+                  viewsets.ModelViewSet):
     queryset = Test.objects.all()
     serializer_class = TestSerializer
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
 
 
-class GradeViewSet(viewsets.ModelViewSet):
+class GradeViewSet(TimingMixin, ConditionalGetMixin, CachedResponseMixin, ValuesReadMixin,
+                   viewsets.ModelViewSet):
     queryset = Grade.objects.all()
     serializer_class = GradeSerializer
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
 
 
-class SubGroupViewSet(viewsets.ModelViewSet):
+class SubGroupViewSet(TimingMixin, ConditionalGetMixin, CachedResponseMixin, BulkWriteMixin,
+                      ValuesReadMixin, viewsets.ModelViewSet):
     queryset = SubGroup.objects.all()
     serializer_class = SubGroupSerializer
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
+
+
+class ProficiencyRollupViewSet(TimingMixin, ConditionalGetMixin, ValuesReadMixin,
+                               viewsets.ReadOnlyModelViewSet):
+    """Percent met/exceeded rollups, rebuilt by the refresh_rollups command."""
+    queryset = ProficiencyRollup.objects.all()
+    serializer_class = ProficiencyRollupSerializer
+    permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
+    filter_fields = (
+        'test_year',
+        'level',
+        'county_code',
+        'district_code',
+        'school_code',
+        'test',
+        'grade',
+        'subgroup',
+    )
+
+
+def metrics_view(request):
+    """Prometheus metrics aggregated over every worker process."""
+    if metrics.prometheus_client is None:
+        raise Http404('prometheus_client is not installed.')
+    body, content_type = metrics.render_metrics()
+    return HttpResponse(body, content_type=content_type)
@@ -0,0 +1,21 @@
+"""
+ASGI config for config project.
+
+It exposes the ASGI callable as a module-level variable named ``application``,
+see api.asgi. Serve it with an ASGI server such as uvicorn:
+
+    uvicorn config.asgi:application
+"""
+
+import os
+import dotenv
+from django.core.wsgi import get_wsgi_application
+
+dotenv.read_dotenv(os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env'))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+
+wsgi_application = get_wsgi_application()
+
+from api.asgi import ReadApplication  # noqa: E402 needs the app registry
+
+application = ReadApplication(wsgi_application)
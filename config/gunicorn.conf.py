@@ -0,0 +1,24 @@
+"""Gunicorn settings, used with `gunicorn -c config/gunicorn.conf.py config.wsgi`.
+
+When PROMETHEUS_MULTIPROC_DIR is set the directory is emptied at startup and
+the samples of exited workers are merged, so /metrics covers every worker.
+"""
+import os
+import shutil
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+
+
+def on_starting(server):
+    directory = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+
+
+def child_exit(server, worker):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
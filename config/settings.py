@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.0/ref/settings/
 """
 
 import os
+from importlib.util import find_spec
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -37,12 +38,17 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'django_filters',
     'api.apps.ApiConfig',
 ]
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
+    'api.middleware.RequestTimingMiddleware',
+    'api.middleware.CompressionMiddleware',
+    'api.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -76,17 +82,106 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.0/ref/settings/#databases
 
+# DB_ENGINE=pool borrows connections from a pool in every worker process (see
+# api/backends/postgresql_pool). Without it DB_CONN_MAX_AGE keeps a connection
+# per thread open between requests, "none" for no limit. Set DB_PGBOUNCER
+# when connecting through PgBouncer in transaction pooling mode, which cannot
+# hold server side cursors across transactions.
+
+DB_ENGINES = {
+    'postgresql': 'django.db.backends.postgresql',
+    'pool': 'api.backends.postgresql_pool',
+}
+
+DB_ENGINE = os.environ.get('DB_ENGINE', 'postgresql')
+
+DB_CONN_MAX_AGE = os.environ.get('DB_CONN_MAX_AGE', '0' if DB_ENGINE == 'pool' else '60')
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': DB_ENGINES.get(DB_ENGINE, DB_ENGINE),
         'NAME': os.environ.get("DB"),
         'USER': os.environ.get("DB_USER"),
         'PASSWORD': os.environ.get("DB_PWD"),
         'HOST': os.environ.get("DB_HOST"),
-        'PORT': '',
+        'PORT': os.environ.get('DB_PORT', ''),
+        'CONN_MAX_AGE': None if DB_CONN_MAX_AGE.lower() == 'none' else int(DB_CONN_MAX_AGE),
+        'DISABLE_SERVER_SIDE_CURSORS': bool(os.environ.get('DB_PGBOUNCER')),
+        'POOL': {
+            'MIN_SIZE': int(os.environ.get('DB_POOL_MIN_SIZE', 1)),
+            'MAX_SIZE': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            'TIMEOUT': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            'CHECK_INTERVAL': float(os.environ.get('DB_POOL_CHECK_INTERVAL', 30)),
+        },
+    }
+}
+
+# Read replicas, a comma separated list of host[:port] in DB_REPLICAS. They
+# share the other settings of the primary and serve the reads of GET and HEAD
+# requests to the API viewsets, see api.middleware.ReplicaRoutingMiddleware.
+
+DATABASE_REPLICAS = []
+
+for number, replica in enumerate(filter(None, os.environ.get('DB_REPLICAS', '').split(',')), 1):
+    host, _, port = replica.strip().partition(':')
+    alias = 'replica{}'.format(number)
+    DATABASES[alias] = dict(
+        DATABASES['default'], HOST=host, PORT=port or DATABASES['default']['PORT'],
+        TEST={'MIRROR': 'default'},
+    )
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['api.replicas.ReplicaRouter']
+
+# round_robin or least_connections
+DB_REPLICA_SELECTION = os.environ.get('DB_REPLICA_SELECTION', 'round_robin')
+
+DB_REPLICA_PIN_SECONDS = int(os.environ.get('DB_REPLICA_PIN_SECONDS', 5))
+
+# Seconds every client reads from the primary after any dataset change, the
+# replication lag to cover. Needs a CACHE_BACKEND shared by the workers.
+DB_REPLICA_LAG_SECONDS = float(os.environ.get('DB_REPLICA_LAG_SECONDS', 1))
+
+
+# Cache
+# https://docs.djangoproject.com/en/2.0/topics/cache/
+# CACHE_BACKEND is one of the names below or a dotted path to a backend class.
+# The redis backend needs the optional django-redis package.
+
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'memcached': 'django.core.cache.backends.memcached.MemcachedCache',
+    'redis': 'django_redis.cache.RedisCache',
+}
+
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem')
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS.get(CACHE_BACKEND, CACHE_BACKEND),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
     }
 }
 
+API_CACHE_ALIAS = 'default'
+
+API_CACHE_TIMEOUT = int(os.environ.get('API_CACHE_TIMEOUT', 60 * 60 * 24))
+
+# Paginated lists the planner expects to hold at least this many rows report
+# its estimate instead of running COUNT(*), see api.pagination. 0 always counts.
+
+API_COUNT_ESTIMATE_THRESHOLD = int(os.environ.get('API_COUNT_ESTIMATE_THRESHOLD', 100000))
+
+# Worker threads of config.asgi for requests handed to the WSGI application.
+
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 8))
+
+# Share of requests measured by api.middleware.RequestTimingMiddleware. Off
+# unless set, since measured responses expose their timings to every client.
+
+API_TIMING_SAMPLE_RATE = float(os.environ.get('API_TIMING_SAMPLE_RATE', 0))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.0/ref/settings/#auth-password-validators
@@ -126,12 +221,24 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
+# MessagePack and Arrow responses need the optional msgpack and pyarrow
+# packages and are only offered when those are installed.
+
+OPTIONAL_RENDERERS = (
+    ('msgpack', 'api.renderers.MessagePackRenderer'),
+    ('pyarrow', 'api.renderers.ArrowRenderer'),
+)
+
 REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': (
+        'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ) + tuple(renderer for module, renderer in OPTIONAL_RENDERERS if find_spec(module)),
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework.authentication.BasicAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ),
     'DEFAULT_FILTER_BACKENDS': ('django_filters.rest_framework.DjangoFilterBackend',),
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.DefaultPagination',
     'PAGE_SIZE': 100
 }
@@ -25,9 +25,11 @@ router.register('types', api.views.TypeViewSet)
 router.register('tests', api.views.TestViewSet)
 router.register('grades', api.views.GradeViewSet)
 router.register('subgroups', api.views.SubGroupViewSet)
+router.register('rollups', api.views.ProficiencyRollupViewSet)
 
 urlpatterns = [
     url('api/', include(router.urls)),
     url('api-auth/', include('rest_framework.urls', namespace='rest_framework')),
+    path('metrics', api.views.metrics_view, name='metrics'),
     path('admin/', admin.site.urls),
 ]